@@ -2,6 +2,8 @@ import json
 import logging
 import os
 import shutil
+import threading
+import time
 from pathlib import Path
 from typing import Any, Generic, Optional, Self, TypeVar, List
 from urllib.parse import urlparse
@@ -23,6 +25,7 @@ from open_webui.env import (
     log,
     DATABASE_URL,
     CONFIGURATION_REDIS_URL,
+    CONFIG_CACHE_MAX_AGE,
 )
 from .config_migration import migrate_db_config
 
@@ -65,6 +68,171 @@ r = redis.from_url(CONFIGURATION_REDIS_URL)
 hash_name = "config"
 
 
+class ConfigCache:
+    """
+    Worker-local snapshot of the Redis config hash.
+
+    Reads are served from memory. Every write bumps a version counter stored
+    next to the hash and publishes the new version, so all replicas drop their
+    snapshot as soon as the notification arrives. If a notification is missed,
+    the snapshot is revalidated against the version counter once it is older
+    than `max_age` seconds, which bounds how stale a replica can get.
+    """
+
+    def __init__(self, redis_client, name: str, max_age: float):
+        self.redis = redis_client
+        self.name = name
+        self.version_key = f"{name}:version"
+        self.channel = f"{name}:changed"
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._raw: Optional[dict[str, str]] = None
+        # Decoded scalars can be shared safely; lists and dicts are decoded on
+        # every read so callers mutating them cannot corrupt the snapshot.
+        self._scalars: dict[str, Any] = {}
+        self._version = 0
+        self._validated_at = 0.0
+        self._loaded_at = 0.0
+        self._stale = True
+
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.notifications = 0
+
+    def _read_version(self) -> int:
+        return int(self.redis.get(self.version_key) or 0)
+
+    def _reload(self):
+        with self._lock:
+            if not self._stale and self._raw is not None:
+                return
+            pipe = self.redis.pipeline()
+            pipe.get(self.version_key)
+            pipe.hgetall(self.name)
+            version, raw = pipe.execute()
+
+            raw = {k.decode(): v.decode() for k, v in raw.items()}
+            scalars = {}
+            for key, value in raw.items():
+                decoded = json.loads(value)
+                if not isinstance(decoded, (dict, list)):
+                    scalars[key] = decoded
+
+            self._raw = raw
+            self._scalars = scalars
+            self._version = int(version or 0)
+            self._loaded_at = self._validated_at = time.monotonic()
+            self._stale = False
+            self.reloads += 1
+
+    def _snapshot(self) -> dict[str, str]:
+        if not self._stale and self._raw is not None:
+            now = time.monotonic()
+            if now - self._validated_at < self.max_age:
+                return self._raw
+
+            self._validated_at = now
+            if self._read_version() == self._version:
+                return self._raw
+            self._stale = True
+
+        self._reload()
+        return self._raw
+
+    def _bump(self, pipe) -> None:
+        pipe.incr(self.version_key)
+        version = pipe.execute()[-1]
+        self.redis.publish(self.channel, version)
+        self._stale = True
+
+    def get(self, key: str) -> Any:
+        snapshot = self._snapshot()
+        if key in snapshot:
+            self.hits += 1
+            if key in self._scalars:
+                return self._scalars[key]
+            return json.loads(snapshot[key])
+
+        # Not in our snapshot yet, e.g. registered by a newer replica
+        self.misses += 1
+        return json.loads(self.redis.hget(self.name, key))
+
+    def set(self, key: str, value: Any) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, values: dict[str, Any]) -> None:
+        if not values:
+            return
+        pipe = self.redis.pipeline()
+        for key, value in values.items():
+            pipe.hset(self.name, key, json.dumps(value))
+        self._bump(pipe)
+
+    def setnx(self, key: str, value: Any) -> bool:
+        if not self.redis.hsetnx(self.name, key, json.dumps(value)):
+            return False
+        self._bump(self.redis.pipeline())
+        return True
+
+    def clear(self) -> None:
+        pipe = self.redis.pipeline()
+        pipe.delete(self.name)
+        self._bump(pipe)
+
+    def invalidate(self, version: Optional[int] = None) -> None:
+        self.notifications += 1
+        if version is None or version != self._version:
+            self._stale = True
+
+    @property
+    def version(self) -> int:
+        """Version of the current snapshot, revalidated like any read."""
+        self._snapshot()
+        return self._version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self._version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "reloads": self.reloads,
+            "notifications": self.notifications,
+            "stale": self._stale,
+            "snapshot_age": (
+                time.monotonic() - self._loaded_at if self._raw is not None else None
+            ),
+            "max_age": self.max_age,
+        }
+
+
+config_cache = ConfigCache(r, hash_name, CONFIG_CACHE_MAX_AGE)
+
+
+def config_cache_listener():
+    """
+    Listen for config change notifications on the Redis pub/sub channel and
+    invalidate the local snapshot. This is a blocking function, so it should be
+    run in a separate thread.
+    """
+    pubsub = config_cache.redis.pubsub()
+    pubsub.subscribe(config_cache.channel)
+    log.info(f"Subscribed to Redis pub/sub channel: {config_cache.channel}")
+
+    for message in pubsub.listen():
+        if message["type"] != "message":
+            continue
+        try:
+            version = int(message["data"])
+        except (TypeError, ValueError):
+            version = None
+        log.debug(f"Config changed, version: {version}")
+        config_cache.invalidate(version)
+
+
 # TODO: Remove config migration once the config refactor is fully deployed
 migrate_db_config(r, hash_name)
 
@@ -75,14 +243,13 @@ def load_json_config():
 
 
 def reset_config():
-    r.delete(hash_name)
+    config_cache.clear()
 
 
 # When initializing, check if config.json exists and migrate it to the database
 if os.path.exists(f"{DATA_DIR}/config.json"):
     data = load_json_config()
-    for key, value in data.items():
-        r.hset(hash_name, key, json.dumps(value))
+    config_cache.set_many(data)
     os.rename(f"{DATA_DIR}/config.json", f"{DATA_DIR}/old_config.json")
 
 
@@ -92,8 +259,7 @@ def get_config():
 
 
 def save_config(config):
-    for key, value in config.items():
-        r.hset(hash_name, key, json.dumps(value))
+    config_cache.set_many(config)
 
 
 T = TypeVar("T")
@@ -102,8 +268,7 @@ T = TypeVar("T")
 class PersistentConfig(Generic[T]):
     def __init__(self, config_name: str, value: T):
         self.name = config_name
-        result = r.hsetnx(hash_name, config_name, json.dumps(value))
-        if result == 1:
+        if config_cache.setnx(config_name, value):
             log.info(f"'{config_name}' was not in Redis, persisted it")
 
     def __str__(self):
@@ -126,11 +291,11 @@ class PersistentConfig(Generic[T]):
 
     @property
     def value(self) -> T:
-        return json.loads(r.hget(hash_name, self.name))
+        return config_cache.get(self.name)
 
     @value.setter
     def value(self, value: T):
-        r.hset(hash_name, self.name, json.dumps(value))
+        config_cache.set(self.name, value)
 
 
 class AppConfig:
@@ -506,6 +671,8 @@ class WebUIConfig(Config):
         ]
     )
     MODEL_ORDER_LIST: List[str] = Config.persistent([])
+    MODEL_LIST_CACHE_MAX_AGE: float = 10.0
+    MODEL_LIST_CACHE_MAX_USERS: int = 1000
     DEFAULT_USER_ROLE: str = Config.persistent("pending")
     USER_PERMISSIONS_WORKSPACE_MODELS_ACCESS: bool = False
     USER_PERMISSIONS_WORKSPACE_KNOWLEDGE_ACCESS: bool = False
@@ -686,6 +853,16 @@ class VectorDatabaseConfig(Config):
     OPENSEARCH_PASSWORD: Optional[str] = None
     # Pgvector
     PGVECTOR_DB_URL: str = DATABASE_URL
+    # "hnsw", "ivfflat" or "" for exact search only
+    PGVECTOR_INDEX_TYPE: str = "hnsw"
+    # Collections with fewer chunks are searched exactly, without an index
+    PGVECTOR_INDEX_MIN_ROWS: int = 1000
+    PGVECTOR_HNSW_M: int = 16
+    PGVECTOR_HNSW_EF_CONSTRUCTION: int = 64
+    PGVECTOR_HNSW_EF_SEARCH: int = 40
+    # 0 picks the number of lists from the collection size
+    PGVECTOR_IVFFLAT_LISTS: int = 0
+    PGVECTOR_IVFFLAT_PROBES: int = 10
 
     @field_validator("CHROMA_HTTP_HEADERS", mode="before")
     def parse_chroma_http_headers(cls, v: str | dict) -> dict[str, str]:
@@ -738,12 +915,27 @@ class RAGConfig(Config):
     RAG_EMBEDDING_MODEL_AUTO_UPDATE: bool = True
     RAG_EMBEDDING_MODEL_TRUST_REMOTE_CODE: bool = True
     RAG_EMBEDDING_BATCH_SIZE: int = Config.persistent(1)
+    # Query embeddings cached per (engine, model, text), optionally shared via Redis
+    RAG_EMBEDDING_CACHE_SIZE: int = 10000
+    RAG_EMBEDDING_CACHE_TTL: int = 86400
+    ENABLE_RAG_EMBEDDING_CACHE_REDIS: bool = False
     RAG_RERANKING_MODEL: str = Config.persistent("")
     RAG_RERANKING_MODEL_AUTO_UPDATE: bool = True
     RAG_RERANKING_MODEL_TRUST_REMOTE_CODE: bool = True
     RAG_TEXT_SPLITTER: str = Config.persistent("")
     TIKTOKEN_CACHE_DIR: str = f"{CACHE_DIR}/tiktoken"
     TIKTOKEN_ENCODING_NAME: str = Config.persistent("cl100k_base")
+    # Per-collection BM25 indexes used by hybrid search, bounded by document count
+    BM25_INDEX_CACHE_MAX_DOCUMENTS: int = 500000
+    BM25_INDEX_CACHE_DIR: str = f"{CACHE_DIR}/bm25"
+    # Threads shared by all chats for vector/hybrid searches during retrieval
+    RAG_RETRIEVAL_MAX_WORKERS: int = 8
+    # Batch ingestion: loader threads, concurrent embedding requests, chunks per
+    # embedding request and the size of the queues between the stages
+    RAG_INGEST_LOADER_WORKERS: int = 4
+    RAG_INGEST_EMBEDDING_WORKERS: int = 4
+    RAG_INGEST_BATCH_SIZE: int = 64
+    RAG_INGEST_QUEUE_SIZE: int = 16
     CHUNK_SIZE: int = Config.persistent(1000)
     CHUNK_OVERLAP: int = Config.persistent(100)
     DEFAULT_RAG_TEMPLATE: str = Path(
@@ -779,6 +971,12 @@ class RAGConfig(Config):
     BING_SEARCH_V7_SUBSCRIPTION_KEY: str = Config.persistent("")
     RAG_WEB_SEARCH_RESULT_COUNT: int = Config.persistent(3)
     RAG_WEB_SEARCH_CONCURRENT_REQUESTS: int = Config.persistent(10)
+    # Web page fetching for web search and URL RAG
+    RAG_WEB_LOADER_PER_HOST_CONCURRENCY: int = 2
+    RAG_WEB_LOADER_TIMEOUT: int = 10
+    RAG_WEB_LOADER_MAX_RESPONSE_SIZE: int = 5 * 1024 * 1024
+    RAG_WEB_LOADER_CACHE_TTL: int = 300
+    RAG_WEB_LOADER_CACHE_SIZE: int = 256
 
 
 ####################################
@@ -817,6 +1015,13 @@ class AudioConfig(Config):
     WHISPER_MODEL: str = Config.persistent("base")
     WHISPER_MODEL_DIR: str = f"{CACHE_DIR}/whisper/models"
     WHISPER_MODEL_AUTO_UPDATE: bool = False
+    # Local transcriptions run in this many worker processes, each with the
+    # model loaded; at most WHISPER_MAX_QUEUE are accepted at a time, and audio
+    # longer than WHISPER_CHUNK_LENGTH seconds is split to be transcribed in
+    # parallel
+    WHISPER_WORKERS: int = 1
+    WHISPER_MAX_QUEUE: int = 8
+    WHISPER_CHUNK_LENGTH: int = 120
     STT_ENGINE: str = Config.persistent("")
     STT_MODEL: str = Config.persistent("")
     TTS_API_KEY: str = Config.persistent("")
@@ -828,6 +1033,12 @@ class AudioConfig(Config):
     TTS_AZURE_SPEECH_OUTPUT_FORMAT: str = Config.persistent(
         "audio-24khz-160kbitrate-mono-mp3"
     )
+    # Synthesized speech is cached on disk up to this many MB, least recently
+    # used first, and for at most this many seconds; optionally shared through
+    # the S3 bucket of the storage provider
+    AUDIO_SPEECH_CACHE_MAX_SIZE: int = 1024
+    AUDIO_SPEECH_CACHE_MAX_AGE: int = 30 * 86400
+    ENABLE_AUDIO_SPEECH_CACHE_S3: bool = False
 
 
 ####################################
@@ -82,10 +82,18 @@ class ERROR_MESSAGES(str, Enum):
 
     DB_NOT_SQLITE = "This feature is only available when running with SQLite databases."
 
+    VECTOR_DB_NOT_SUPPORTED = (
+        "This operation is not supported by the configured vector database."
+    )
+
     INVALID_URL = (
         "Oops! The URL you provided is invalid. Please double-check and try again."
     )
 
+    INVALID_CURSOR = (
+        "The page cursor provided is invalid. Please start the search again."
+    )
+
     WEB_SEARCH_ERROR = (
         lambda err="": f"{err if err else 'Oops! Something went wrong while searching the web.'}"
     )
@@ -103,6 +111,9 @@ class ERROR_MESSAGES(str, Enum):
     )
     FILE_NOT_PROCESSED = "Extracted content is not available for this file. Please ensure that the file is processed before proceeding."
     FILE_TYPE_ERROR = "Only PDF, DOC, DOCX, TXT, RTF, PNG and JPG file are allowed."
+    TRANSCRIPTION_QUEUE_FULL = (
+        "Too many transcriptions are in progress right now. Please try again later."
+    )
 
 
 class TASKS(str, Enum):
@@ -316,6 +316,43 @@ ENABLE_REALTIME_CHAT_SAVE = (
     os.environ.get("ENABLE_REALTIME_CHAT_SAVE", "True").lower() == "true"
 )
 
+# Streamed responses are written to the database at most every
+# REALTIME_CHAT_SAVE_INTERVAL_MS milliseconds or REALTIME_CHAT_SAVE_TOKENS deltas,
+# whichever comes first, and once more when the response completes or is stopped.
+REALTIME_CHAT_SAVE_INTERVAL_MS = os.environ.get("REALTIME_CHAT_SAVE_INTERVAL_MS", "")
+
+if REALTIME_CHAT_SAVE_INTERVAL_MS == "":
+    REALTIME_CHAT_SAVE_INTERVAL_MS = 1000
+else:
+    try:
+        REALTIME_CHAT_SAVE_INTERVAL_MS = int(REALTIME_CHAT_SAVE_INTERVAL_MS)
+    except Exception:
+        REALTIME_CHAT_SAVE_INTERVAL_MS = 1000
+
+REALTIME_CHAT_SAVE_TOKENS = os.environ.get("REALTIME_CHAT_SAVE_TOKENS", "")
+
+if REALTIME_CHAT_SAVE_TOKENS == "":
+    REALTIME_CHAT_SAVE_TOKENS = 200
+else:
+    try:
+        REALTIME_CHAT_SAVE_TOKENS = int(REALTIME_CHAT_SAVE_TOKENS)
+    except Exception:
+        REALTIME_CHAT_SAVE_TOKENS = 200
+
+# Content deltas received within this window are sent to the client as a single
+# `chat:completion` event. Set to 0 to emit every delta as it arrives.
+CHAT_COMPLETION_EMIT_INTERVAL_MS = os.environ.get(
+    "CHAT_COMPLETION_EMIT_INTERVAL_MS", ""
+)
+
+if CHAT_COMPLETION_EMIT_INTERVAL_MS == "":
+    CHAT_COMPLETION_EMIT_INTERVAL_MS = 50
+else:
+    try:
+        CHAT_COMPLETION_EMIT_INTERVAL_MS = int(CHAT_COMPLETION_EMIT_INTERVAL_MS)
+    except Exception:
+        CHAT_COMPLETION_EMIT_INTERVAL_MS = 50
+
 ####################################
 # REDIS
 ####################################
@@ -392,6 +429,191 @@ else:
     except Exception:
         AIOHTTP_CLIENT_TIMEOUT_OPENAI_MODEL_LIST = 5
 
+AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER = os.environ.get(
+    "AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER", ""
+)
+
+if AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER == "":
+    AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER = 10
+else:
+    try:
+        AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER = int(
+            AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER
+        )
+    except Exception:
+        AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER = 10
+
+# Connection pools shared by requests to the same upstream base URL
+# (see open_webui.utils.sessions). 0 means no limit.
+AIOHTTP_CLIENT_POOL_LIMIT = os.environ.get("AIOHTTP_CLIENT_POOL_LIMIT", "")
+
+if AIOHTTP_CLIENT_POOL_LIMIT == "":
+    AIOHTTP_CLIENT_POOL_LIMIT = 100
+else:
+    try:
+        AIOHTTP_CLIENT_POOL_LIMIT = int(AIOHTTP_CLIENT_POOL_LIMIT)
+    except Exception:
+        AIOHTTP_CLIENT_POOL_LIMIT = 100
+
+AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST = os.environ.get(
+    "AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST", ""
+)
+
+if AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST == "":
+    AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST = 0
+else:
+    try:
+        AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST = int(AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST)
+    except Exception:
+        AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST = 0
+
+AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT = os.environ.get(
+    "AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT", ""
+)
+
+if AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT == "":
+    AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT = 60
+else:
+    try:
+        AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT = int(AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT)
+    except Exception:
+        AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT = 60
+
+AIOHTTP_CLIENT_DNS_CACHE_TTL = os.environ.get("AIOHTTP_CLIENT_DNS_CACHE_TTL", "")
+
+if AIOHTTP_CLIENT_DNS_CACHE_TTL == "":
+    AIOHTTP_CLIENT_DNS_CACHE_TTL = 300
+else:
+    try:
+        AIOHTTP_CLIENT_DNS_CACHE_TTL = int(AIOHTTP_CLIENT_DNS_CACHE_TTL)
+    except Exception:
+        AIOHTTP_CLIENT_DNS_CACHE_TTL = 300
+
+# A pipelines server is skipped by inlet/outlet filtering for
+# PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN seconds after this many consecutive
+# connection failures or timeouts.
+PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD = os.environ.get(
+    "PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD", ""
+)
+
+if PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD == "":
+    PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD = 5
+else:
+    try:
+        PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD = int(
+            PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD
+        )
+    except Exception:
+        PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD = 5
+
+PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN = os.environ.get(
+    "PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN", ""
+)
+
+if PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN == "":
+    PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN = 30
+else:
+    try:
+        PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN = int(
+            PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN
+        )
+    except Exception:
+        PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN = 30
+
+# Ollama upstreams are skipped for OLLAMA_UPSTREAM_EJECT_COOLDOWN seconds after
+# this many consecutive connection failures or 5xx responses
+# (see open_webui.utils.upstreams).
+OLLAMA_UPSTREAM_EJECT_THRESHOLD = os.environ.get("OLLAMA_UPSTREAM_EJECT_THRESHOLD", "")
+
+if OLLAMA_UPSTREAM_EJECT_THRESHOLD == "":
+    OLLAMA_UPSTREAM_EJECT_THRESHOLD = 3
+else:
+    try:
+        OLLAMA_UPSTREAM_EJECT_THRESHOLD = int(OLLAMA_UPSTREAM_EJECT_THRESHOLD)
+    except Exception:
+        OLLAMA_UPSTREAM_EJECT_THRESHOLD = 3
+
+OLLAMA_UPSTREAM_EJECT_COOLDOWN = os.environ.get("OLLAMA_UPSTREAM_EJECT_COOLDOWN", "")
+
+if OLLAMA_UPSTREAM_EJECT_COOLDOWN == "":
+    OLLAMA_UPSTREAM_EJECT_COOLDOWN = 30
+else:
+    try:
+        OLLAMA_UPSTREAM_EJECT_COOLDOWN = int(OLLAMA_UPSTREAM_EJECT_COOLDOWN)
+    except Exception:
+        OLLAMA_UPSTREAM_EJECT_COOLDOWN = 30
+
+# Prefer Ollama upstreams that have the model loaded, and keep a chat on the
+# upstream that served it before
+ENABLE_OLLAMA_UPSTREAM_AFFINITY = (
+    os.environ.get("ENABLE_OLLAMA_UPSTREAM_AFFINITY", "True").lower() == "true"
+)
+
+####################################
+# WEBHOOKS
+####################################
+
+# Webhook notifications are delivered in the background by this many workers
+# (see open_webui.utils.webhook)
+WEBHOOK_CONCURRENCY = os.environ.get("WEBHOOK_CONCURRENCY", "")
+
+if WEBHOOK_CONCURRENCY == "":
+    WEBHOOK_CONCURRENCY = 8
+else:
+    try:
+        WEBHOOK_CONCURRENCY = int(WEBHOOK_CONCURRENCY)
+    except Exception:
+        WEBHOOK_CONCURRENCY = 8
+
+WEBHOOK_TIMEOUT = os.environ.get("WEBHOOK_TIMEOUT", "")
+
+if WEBHOOK_TIMEOUT == "":
+    WEBHOOK_TIMEOUT = 10
+else:
+    try:
+        WEBHOOK_TIMEOUT = int(WEBHOOK_TIMEOUT)
+    except Exception:
+        WEBHOOK_TIMEOUT = 10
+
+WEBHOOK_MAX_RETRIES = os.environ.get("WEBHOOK_MAX_RETRIES", "")
+
+if WEBHOOK_MAX_RETRIES == "":
+    WEBHOOK_MAX_RETRIES = 3
+else:
+    try:
+        WEBHOOK_MAX_RETRIES = int(WEBHOOK_MAX_RETRIES)
+    except Exception:
+        WEBHOOK_MAX_RETRIES = 3
+
+# Notifications to the same chat webhook (Slack, Discord, Google Chat) within
+# this many seconds are sent as one message
+WEBHOOK_BATCH_WINDOW = os.environ.get("WEBHOOK_BATCH_WINDOW", "")
+
+if WEBHOOK_BATCH_WINDOW == "":
+    WEBHOOK_BATCH_WINDOW = 2.0
+else:
+    try:
+        WEBHOOK_BATCH_WINDOW = float(WEBHOOK_BATCH_WINDOW)
+    except Exception:
+        WEBHOOK_BATCH_WINDOW = 2.0
+
+WEBHOOK_QUEUE_SIZE = os.environ.get("WEBHOOK_QUEUE_SIZE", "")
+
+if WEBHOOK_QUEUE_SIZE == "":
+    WEBHOOK_QUEUE_SIZE = 1000
+else:
+    try:
+        WEBHOOK_QUEUE_SIZE = int(WEBHOOK_QUEUE_SIZE)
+    except Exception:
+        WEBHOOK_QUEUE_SIZE = 1000
+
+# Queue notifications in Redis rather than in memory, so they are shared by
+# all instances and kept across restarts
+ENABLE_WEBHOOK_REDIS_QUEUE = (
+    os.environ.get("ENABLE_WEBHOOK_REDIS_QUEUE", "False").lower() == "true"
+)
+WEBHOOK_REDIS_URL = os.environ.get("WEBHOOK_REDIS_URL", REDIS_URL)
+
 ####################################
 # OFFLINE_MODE
 ####################################
@@ -406,3 +628,35 @@ if OFFLINE_MODE:
 ####################################
 
 CONFIGURATION_REDIS_URL = REDIS_URL
+
+# Maximum age, in seconds, of a worker's in-memory config snapshot before it is
+# revalidated against the version counter in Redis. Changes are normally pushed
+# over pub/sub immediately; this only bounds staleness if a notification is lost.
+CONFIG_CACHE_MAX_AGE = os.environ.get("CONFIG_CACHE_MAX_AGE", "5")
+
+try:
+    CONFIG_CACHE_MAX_AGE = float(CONFIG_CACHE_MAX_AGE)
+except Exception:
+    CONFIG_CACHE_MAX_AGE = 5.0
+
+####################################
+# AUTHENTICATED USER CACHE
+####################################
+
+# How long, in seconds, a worker reuses an authenticated user without reading it
+# from the database again. Changes to a user are pushed to all workers over
+# pub/sub; this only bounds staleness if a notification is lost.
+USER_CACHE_TTL = os.environ.get("USER_CACHE_TTL", "10")
+
+try:
+    USER_CACHE_TTL = float(USER_CACHE_TTL)
+except Exception:
+    USER_CACHE_TTL = 10.0
+
+# Interval, in seconds, at which buffered `last_active_at` updates are written
+USER_LAST_ACTIVE_FLUSH_INTERVAL = os.environ.get("USER_LAST_ACTIVE_FLUSH_INTERVAL", "5")
+
+try:
+    USER_LAST_ACTIVE_FLUSH_INTERVAL = float(USER_LAST_ACTIVE_FLUSH_INTERVAL)
+except Exception:
+    USER_LAST_ACTIVE_FLUSH_INTERVAL = 5.0
@@ -87,8 +87,15 @@ from open_webui.routers.retrieval import (
 from open_webui.internal.db import Session
 
 from open_webui.models.functions import Functions
+from open_webui.models.groups import group_membership_listener
 from open_webui.models.models import Models
-from open_webui.models.users import UserModel, Users
+from open_webui.models.users import (
+    UserModel,
+    Users,
+    last_active_buffer,
+    last_active_flusher,
+    user_cache_listener,
+)
 
 from open_webui.config import (
     # WebUI
@@ -102,6 +109,7 @@ from open_webui.config import (
     AppConfig,
     reset_config,
     config,
+    config_cache_listener,
 )
 from open_webui.env import (
     CHANGELOG,
@@ -124,9 +132,9 @@ from open_webui.env import (
 
 
 from open_webui.utils.models import (
+    MODEL_CATALOG,
     get_all_models,
     get_all_base_models,
-    check_model_access,
 )
 from open_webui.utils.chat import (
     generate_chat_completion as chat_completion_handler,
@@ -134,7 +142,6 @@ from open_webui.utils.chat import (
     chat_action as chat_action_handler,
 )
 from open_webui.utils.middleware import process_chat_payload, process_chat_response
-from open_webui.utils.access_control import has_access
 
 from open_webui.utils.auth import (
     decode_token,
@@ -145,6 +152,9 @@ from open_webui.utils.auth import (
 )
 from open_webui.utils.oauth import oauth_manager
 from open_webui.utils.security_headers import SecurityHeadersMiddleware
+from open_webui.utils.sessions import CLIENT_SESSIONS
+from open_webui.utils.transcription import TRANSCRIPTION_POOL
+from open_webui.utils.webhook import WEBHOOK_DISPATCHER
 
 from open_webui.tasks import stop_task, task_channel_listener
 
@@ -191,9 +201,19 @@ async def lifespan(app: FastAPI):
         reset_config()
 
     threading.Thread(target=task_channel_listener, daemon=True).start()
+    threading.Thread(target=config_cache_listener, daemon=True).start()
+    threading.Thread(target=user_cache_listener, daemon=True).start()
+    threading.Thread(target=group_membership_listener, daemon=True).start()
+    threading.Thread(target=last_active_flusher, daemon=True).start()
     asyncio.create_task(periodic_usage_pool_cleanup())
+    await WEBHOOK_DISPATCHER.start()
     yield
 
+    await WEBHOOK_DISPATCHER.stop()
+    await CLIENT_SESSIONS.close()
+    TRANSCRIPTION_POOL.shutdown()
+    last_active_buffer.flush()
+
 
 app = FastAPI(
     docs_url="/docs" if ENV == "dev" else None,
@@ -417,6 +437,7 @@ app.state.EMBEDDING_FUNCTION = get_embedding_function(
         else app.state.config.RAG_OLLAMA_API_KEY
     ),
     app.state.config.RAG_EMBEDDING_BATCH_SIZE,
+    cache=True,
 )
 
 
@@ -474,7 +495,6 @@ app.state.config.TTS_AZURE_SPEECH_REGION = config.TTS_AZURE_SPEECH_REGION
 app.state.config.TTS_AZURE_SPEECH_OUTPUT_FORMAT = config.TTS_AZURE_SPEECH_OUTPUT_FORMAT
 
 
-app.state.faster_whisper_model = None
 app.state.speech_synthesiser = None
 app.state.speech_speaker_embeddings_dataset = None
 
@@ -642,49 +662,10 @@ app.include_router(utils.router, prefix="/api/v1/utils", tags=["utils"])
 
 @app.get("/api/models")
 async def get_models(request: Request, user=Depends(get_verified_user)):
-    def get_filtered_models(models, user):
-        filtered_models = []
-        for model in models:
-            if model.get("arena"):
-                if has_access(
-                    user.id,
-                    type="read",
-                    access_control=model.get("info", {})
-                    .get("meta", {})
-                    .get("access_control", {}),
-                ):
-                    filtered_models.append(model)
-                continue
-
-            model_info = Models.get_model_by_id(model["id"])
-            if model_info:
-                if user.id == model_info.user_id or has_access(
-                    user.id, type="read", access_control=model_info.access_control
-                ):
-                    filtered_models.append(model)
-
-        return filtered_models
-
-    models = await get_all_models(request)
-
-    # Filter out filter pipelines
-    models = [
-        model
-        for model in models
-        if "pipeline" not in model or model["pipeline"].get("type", None) != "filter"
-    ]
-
-    model_order_list = request.app.state.config.MODEL_ORDER_LIST
-    if model_order_list:
-        model_order_dict = {model_id: i for i, model_id in enumerate(model_order_list)}
-        # Sort models by order list priority, with fallback for those not in the list
-        models.sort(
-            key=lambda x: (model_order_dict.get(x["id"], float("inf")), x["name"])
-        )
+    await get_all_models(request)
 
-    # Filter out models that the user does not have access to
-    if user.role == "user" and not BYPASS_MODEL_ACCESS_CONTROL:
-        models = get_filtered_models(models, user)
+    # Filtered to the models accessible to the user, without filter pipelines
+    models = MODEL_CATALOG.get_user_model_list(user)
 
     log.debug(
         f"/api/models returned filtered models accessible to the user: {json.dumps([model['id'] for model in models])}"
@@ -704,22 +685,16 @@ async def chat_completion(
     form_data: dict,
     user=Depends(get_verified_user),
 ):
-    if not request.app.state.MODELS:
-        await get_all_models(request)
+    await get_all_models(request)
 
     tasks = form_data.pop("background_tasks", None)
     try:
         model_id = form_data.get("model", None)
-        if model_id not in request.app.state.MODELS:
+        # Only contains the models the user has access to
+        models = MODEL_CATALOG.get_user_models(user)
+        if model_id not in models:
             raise Exception("Model not found")
-        model = request.app.state.MODELS[model_id]
-
-        # Check if user has access to the model
-        if not BYPASS_MODEL_ACCESS_CONTROL and user.role == "user":
-            try:
-                check_model_access(user, model)
-            except Exception as e:
-                raise e
+        model = models[model_id]
 
         metadata = {
             "user_id": user.id,
@@ -937,6 +912,11 @@ async def update_webhook_url(form_data: UrlForm, user=Depends(get_admin_user)):
     return {"url": app.state.config.WEBHOOK_URL}
 
 
+@app.get("/api/webhook/stats")
+async def get_webhook_stats(user=Depends(get_admin_user)):
+    return WEBHOOK_DISPATCHER.stats()
+
+
 @app.get("/api/version")
 async def get_app_version():
     return {
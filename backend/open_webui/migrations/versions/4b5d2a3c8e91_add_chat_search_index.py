@@ -0,0 +1,195 @@
+"""Add chat search index
+
+Revision ID: 4b5d2a3c8e91
+Revises: 9f0c9cd09105
+Create Date: 2025-01-22 03:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import table, column
+
+revision = "4b5d2a3c8e91"
+down_revision = "9f0c9cd09105"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 500
+
+# Same as CHAT_SEARCH_MAX_CONTENT_LENGTH in open_webui.models.chats
+MAX_CONTENT_LENGTH = 200_000
+
+
+def get_content(chat: dict) -> str:
+    content = "\n".join(
+        message["content"]
+        for message in (chat or {}).get("messages", [])
+        if isinstance(message, dict) and isinstance(message.get("content"), str)
+    )
+    return content[:MAX_CONTENT_LENGTH]
+
+
+def upgrade():
+    conn = op.get_bind()
+    dialect_name = conn.dialect.name
+
+    if dialect_name == "sqlite":
+        conn.execute(
+            sa.text(
+                """
+                CREATE TABLE chat_search (
+                    id INTEGER PRIMARY KEY,
+                    chat_id TEXT NOT NULL UNIQUE,
+                    user_id TEXT NOT NULL,
+                    title TEXT,
+                    content TEXT,
+                    tags TEXT NOT NULL DEFAULT ''
+                )
+                """
+            )
+        )
+        # External content table, the text is only stored once in chat_search
+        conn.execute(
+            sa.text(
+                """
+                CREATE VIRTUAL TABLE chat_search_fts USING fts5(
+                    user_id, title, content, tags,
+                    content='chat_search', content_rowid='id',
+                    tokenize="unicode61 remove_diacritics 2 tokenchars '_'"
+                )
+                """
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                CREATE TRIGGER chat_search_ai AFTER INSERT ON chat_search BEGIN
+                    INSERT INTO chat_search_fts (rowid, user_id, title, content, tags)
+                    VALUES (new.id, new.user_id, new.title, new.content, new.tags);
+                END
+                """
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                CREATE TRIGGER chat_search_ad AFTER DELETE ON chat_search BEGIN
+                    INSERT INTO chat_search_fts (chat_search_fts, rowid, user_id, title, content, tags)
+                    VALUES ('delete', old.id, old.user_id, old.title, old.content, old.tags);
+                END
+                """
+            )
+        )
+        conn.execute(
+            sa.text(
+                """
+                CREATE TRIGGER chat_search_au AFTER UPDATE ON chat_search BEGIN
+                    INSERT INTO chat_search_fts (chat_search_fts, rowid, user_id, title, content, tags)
+                    VALUES ('delete', old.id, old.user_id, old.title, old.content, old.tags);
+                    INSERT INTO chat_search_fts (rowid, user_id, title, content, tags)
+                    VALUES (new.id, new.user_id, new.title, new.content, new.tags);
+                END
+                """
+            )
+        )
+    elif dialect_name == "postgresql":
+        conn.execute(
+            sa.text(
+                """
+                CREATE TABLE chat_search (
+                    chat_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    title TEXT,
+                    content TEXT,
+                    tags TEXT[] NOT NULL DEFAULT '{}',
+                    search_vector tsvector GENERATED ALWAYS AS (
+                        setweight(to_tsvector('simple', coalesce(title, '')), 'A')
+                        || setweight(to_tsvector('simple', coalesce(content, '')), 'B')
+                    ) STORED
+                )
+                """
+            )
+        )
+        op.create_index(
+            "chat_search_search_vector_idx",
+            "chat_search",
+            ["search_vector"],
+            postgresql_using="gin",
+        )
+        op.create_index("chat_search_user_id_idx", "chat_search", ["user_id"])
+        op.create_index(
+            "chat_search_tags_idx", "chat_search", ["tags"], postgresql_using="gin"
+        )
+    else:
+        return
+
+    chat = table(
+        "chat",
+        column("id", sa.String()),
+        column("user_id", sa.String()),
+        column("title", sa.Text()),
+        column("chat", sa.JSON()),
+        column("meta", sa.JSON()),
+    )
+    insert = sa.text(
+        "INSERT INTO chat_search (chat_id, user_id, title, content, tags) "
+        + (
+            "VALUES (:chat_id, :user_id, :title, :content, :tags)"
+            if dialect_name == "sqlite"
+            else "VALUES (:chat_id, :user_id, :title, :content, CAST(:tags AS text[]))"
+        )
+    )
+
+    # Backfill in batches, keyed by id, so large databases aren't loaded at once
+    last_id = None
+    while True:
+        query = (
+            sa.select(chat.c.id, chat.c.user_id, chat.c.title, chat.c.chat, chat.c.meta)
+            # Copies of shared chats aren't searched
+            .where(sa.not_(chat.c.user_id.like("shared-%")))
+            .order_by(chat.c.id)
+            .limit(BATCH_SIZE)
+        )
+        if last_id is not None:
+            query = query.where(chat.c.id > last_id)
+
+        rows = conn.execute(query).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for row in rows:
+            tags = (row.meta or {}).get("tags", [])
+            params.append(
+                {
+                    "chat_id": row.id,
+                    "user_id": row.user_id,
+                    "title": row.title,
+                    "content": get_content(row.chat),
+                    "tags": (
+                        (f" {' '.join(tags)} " if tags else "")
+                        if dialect_name == "sqlite"
+                        else tags
+                    ),
+                }
+            )
+        conn.execute(insert, params)
+        last_id = rows[-1].id
+
+
+def downgrade():
+    conn = op.get_bind()
+    dialect_name = conn.dialect.name
+
+    if dialect_name == "sqlite":
+        conn.execute(sa.text("DROP TRIGGER IF EXISTS chat_search_au"))
+        conn.execute(sa.text("DROP TRIGGER IF EXISTS chat_search_ad"))
+        conn.execute(sa.text("DROP TRIGGER IF EXISTS chat_search_ai"))
+        conn.execute(sa.text("DROP TABLE IF EXISTS chat_search_fts"))
+        conn.execute(sa.text("DROP TABLE IF EXISTS chat_search"))
+    elif dialect_name == "postgresql":
+        op.drop_index("chat_search_tags_idx", table_name="chat_search")
+        op.drop_index("chat_search_user_id_idx", table_name="chat_search")
+        op.drop_index("chat_search_search_vector_idx", table_name="chat_search")
+        op.drop_table("chat_search")
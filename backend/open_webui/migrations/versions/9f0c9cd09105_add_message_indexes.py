@@ -0,0 +1,36 @@
+"""Add message & message_reaction indexes
+
+Revision ID: 9f0c9cd09105
+Revises: 3781e22d8b01
+Create Date: 2025-01-20 03:00:00.000000
+
+"""
+
+from alembic import op
+
+revision = "9f0c9cd09105"
+down_revision = "3781e22d8b01"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Pages of a channel's messages, ordered by creation time
+    op.create_index(
+        "message_channel_id_parent_id_created_at_idx",
+        "message",
+        ["channel_id", "parent_id", "created_at"],
+    )
+    # Replies of a page of messages, counted together
+    op.create_index(
+        "message_parent_id_created_at_idx", "message", ["parent_id", "created_at"]
+    )
+    op.create_index(
+        "message_reaction_message_id_idx", "message_reaction", ["message_id"]
+    )
+
+
+def downgrade():
+    op.drop_index("message_reaction_message_id_idx", table_name="message_reaction")
+    op.drop_index("message_parent_id_created_at_idx", table_name="message")
+    op.drop_index("message_channel_id_parent_id_created_at_idx", table_name="message")
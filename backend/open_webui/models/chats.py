@@ -1,4 +1,6 @@
+import html
 import json
+import re
 import time
 import uuid
 from typing import Optional
@@ -9,7 +11,7 @@ from open_webui.models.tags import TagModel, Tag, Tags
 
 from pydantic import BaseModel, ConfigDict
 from sqlalchemy import BigInteger, Boolean, Column, String, Text, JSON
-from sqlalchemy import or_, func, select, and_, text
+from sqlalchemy import or_, func, select, and_, text, bindparam
 from sqlalchemy.sql import exists
 
 ####################
@@ -100,7 +102,117 @@ class ChatTitleIdResponse(BaseModel):
     created_at: int
 
 
+class ChatSearchResponse(ChatTitleIdResponse):
+    # HTML-escaped message text around the matches, in <mark> tags
+    snippet: Optional[str] = None
+    # Pass as `cursor` to get the results after this one
+    cursor: str
+
+
+def _is_safe_json_path_label(label: str) -> bool:
+    # SQLite JSON paths quote object labels with double quotes and offer no way
+    # to escape them, so such keys have to take the slow path. Colons would be
+    # read as bind parameters in the statement text.
+    return not any(char in label for char in "\"':")
+
+
+####################
+# Chat search index
+####################
+
+# Chats are indexed in `chat_search`, searched through an FTS5 table on SQLite
+# and a tsvector column on PostgreSQL (see migration 4b5d2a3c8e91). Only the
+# beginning of very long chats is indexed.
+CHAT_SEARCH_MAX_CONTENT_LENGTH = 200_000
+
+# Marks matches in snippets, replaced by <mark> tags once the text is escaped
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+
+
+def get_chat_search_content(chat: dict) -> str:
+    content = "\n".join(
+        message["content"]
+        for message in chat.get("messages", [])
+        if isinstance(message, dict) and isinstance(message.get("content"), str)
+    )
+    return content[:CHAT_SEARCH_MAX_CONTENT_LENGTH]
+
+
+def get_search_terms(search_text: str) -> list[str]:
+    return [term for term in re.findall(r"\w+", search_text) if term.strip("_")]
+
+
+def quote_fts5(phrase: str) -> str:
+    return '"' + phrase.replace('"', '""') + '"'
+
+
+def format_snippet(snippet: Optional[str]) -> Optional[str]:
+    if not snippet:
+        return None
+    return (
+        html.escape(snippet)
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
+
+
+def get_search_cursor(score: float, updated_at: int, chat_id: str) -> str:
+    return f"{score!r}:{updated_at}:{chat_id}"
+
+
+def parse_search_cursor(cursor: str) -> tuple[float, int, str]:
+    score, updated_at, chat_id = cursor.split(":", 2)
+    return float(score), int(updated_at), chat_id
+
+
 class ChatTable:
+    def _update_search_index(self, db, chat: Chat):
+        """Adds or updates the chat in the search index, in the same transaction."""
+        dialect_name = db.bind.dialect.name
+        if dialect_name not in ("sqlite", "postgresql"):
+            return
+
+        tags = (chat.meta or {}).get("tags", [])
+        db.execute(
+            text(
+                """
+                INSERT INTO chat_search (chat_id, user_id, title, content, tags)
+                VALUES (:chat_id, :user_id, :title, :content, :tags)
+                ON CONFLICT (chat_id) DO UPDATE SET
+                    user_id = excluded.user_id,
+                    title = excluded.title,
+                    content = excluded.content,
+                    tags = excluded.tags
+                """
+                if dialect_name == "sqlite"
+                else """
+                INSERT INTO chat_search (chat_id, user_id, title, content, tags)
+                VALUES (:chat_id, :user_id, :title, :content, CAST(:tags AS text[]))
+                ON CONFLICT (chat_id) DO UPDATE SET
+                    user_id = excluded.user_id,
+                    title = excluded.title,
+                    content = excluded.content,
+                    tags = excluded.tags
+                """
+            ),
+            {
+                "chat_id": chat.id,
+                "user_id": chat.user_id,
+                "title": chat.title,
+                "content": get_chat_search_content(chat.chat or {}),
+                # Space separated, and around, so single tags can be matched
+                "tags": (
+                    (f" {' '.join(tags)} " if tags else "")
+                    if dialect_name == "sqlite"
+                    else tags
+                ),
+            },
+        )
+
+    def _delete_from_search_index(self, db, where: str, params: dict):
+        if db.bind.dialect.name in ("sqlite", "postgresql"):
+            db.execute(text(f"DELETE FROM chat_search WHERE {where}"), params)
+
     def insert_new_chat(self, user_id: str, form_data: ChatForm) -> Optional[ChatModel]:
         with get_db() as db:
             id = str(uuid.uuid4())
@@ -121,6 +233,7 @@ class ChatTable:
 
             result = Chat(**chat.model_dump())
             db.add(result)
+            self._update_search_index(db, result)
             db.commit()
             db.refresh(result)
             return ChatModel.model_validate(result) if result else None
@@ -150,6 +263,7 @@ class ChatTable:
 
             result = Chat(**chat.model_dump())
             db.add(result)
+            self._update_search_index(db, result)
             db.commit()
             db.refresh(result)
             return ChatModel.model_validate(result) if result else None
@@ -161,6 +275,7 @@ class ChatTable:
                 chat_item.chat = chat
                 chat_item.title = chat["title"] if "title" in chat else "New Chat"
                 chat_item.updated_at = int(time.time())
+                self._update_search_index(db, chat_item)
                 db.commit()
                 db.refresh(chat_item)
 
@@ -215,23 +330,140 @@ class ChatTable:
     def get_message_by_id_and_message_id(
         self, id: str, message_id: str
     ) -> Optional[dict]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
-            return None
+        with get_db() as db:
+            dialect_name = db.bind.dialect.name
+            if dialect_name == "sqlite" and _is_safe_json_path_label(message_id):
+                row = db.execute(
+                    text(
+                        f"SELECT json_extract(chat, '$.history.messages.\"{message_id}\"') "
+                        "FROM chat WHERE id = :id"
+                    ),
+                    {"id": id},
+                ).first()
+            elif dialect_name == "postgresql":
+                row = db.execute(
+                    text(
+                        "SELECT chat #> CAST(:path AS text[]) FROM chat WHERE id = :id"
+                    ),
+                    {"id": id, "path": ["history", "messages", message_id]},
+                ).first()
+            else:
+                chat = self.get_chat_by_id(id)
+                if chat is None:
+                    return None
+                return (
+                    chat.chat.get("history", {}).get("messages", {}).get(message_id, {})
+                )
 
-        return chat.chat.get("history", {}).get("messages", {}).get(message_id, {})
+        if row is None:
+            return None
+        message = row[0]
+        if isinstance(message, str):
+            message = json.loads(message)
+        return message or {}
 
     def upsert_message_to_chat_by_id_and_message_id(
         self, id: str, message_id: str, message: dict
-    ) -> Optional[ChatModel]:
+    ) -> bool:
+        """
+        Shallow-merges `message` into `history.messages[message_id]` and makes
+        it the current message. The update is applied inside the database with
+        `json_set` (SQLite) or `jsonb_set` (PostgreSQL), so the chat blob is no
+        longer loaded, validated and re-serialized in Python on every update.
+        """
+        now = int(time.time())
+        with get_db() as db:
+            dialect_name = db.bind.dialect.name
+            if dialect_name == "sqlite" and all(
+                _is_safe_json_path_label(label) for label in [message_id, *message]
+            ):
+                message_path = f'$.history.messages."{message_id}"'
+                params = {"id": id, "message_id": message_id, "updated_at": now}
+                assignments = ""
+                for idx, (key, value) in enumerate(message.items()):
+                    assignments += f"'{message_path}.\"{key}\"', json(:value_{idx}), "
+                    params[f"value_{idx}"] = json.dumps(value)
+
+                result = db.execute(
+                    text(
+                        f"""
+                        UPDATE chat SET
+                            chat = json_set(
+                                json_insert(
+                                    chat,
+                                    '$.history', json_object(),
+                                    '$.history.messages', json_object(),
+                                    '{message_path}', json_object()
+                                ),
+                                {assignments}'$.history.currentId', :message_id
+                            ),
+                            updated_at = :updated_at
+                        WHERE id = :id
+                        """
+                    ),
+                    params,
+                )
+            elif dialect_name == "postgresql":
+                result = db.execute(
+                    text(
+                        """
+                        UPDATE chat SET
+                            chat = jsonb_set(
+                                jsonb_set(
+                                    -- jsonb_set only creates the last path
+                                    -- element, seed the parents like
+                                    -- json_insert does on SQLite
+                                    jsonb_set(
+                                        jsonb_set(
+                                            chat::jsonb,
+                                            '{history}',
+                                            COALESCE(chat::jsonb -> 'history', '{}'::jsonb)
+                                        ),
+                                        '{history,messages}',
+                                        COALESCE(
+                                            chat::jsonb #> '{history,messages}',
+                                            '{}'::jsonb
+                                        )
+                                    ),
+                                    CAST(:message_path AS text[]),
+                                    COALESCE(
+                                        chat::jsonb #> CAST(:message_path AS text[]),
+                                        '{}'::jsonb
+                                    ) || CAST(:message AS jsonb)
+                                ),
+                                '{history,currentId}',
+                                to_jsonb(CAST(:message_id AS text))
+                            )::json,
+                            updated_at = :updated_at
+                        WHERE id = :id
+                        """
+                    ),
+                    {
+                        "id": id,
+                        "message_id": message_id,
+                        "message_path": ["history", "messages", message_id],
+                        "message": json.dumps(message),
+                        "updated_at": now,
+                    },
+                )
+            else:
+                return self._upsert_message_by_rewrite(id, message_id, message)
+
+            db.commit()
+            return result.rowcount > 0
+
+    def _upsert_message_by_rewrite(
+        self, id: str, message_id: str, message: dict
+    ) -> bool:
         chat = self.get_chat_by_id(id)
         if chat is None:
-            return None
+            return False
 
         chat = chat.chat
         history = chat.get("history", {})
+        history.setdefault("messages", {})
 
-        if message_id in history.get("messages", {}):
+        if message_id in history["messages"]:
             history["messages"][message_id] = {
                 **history["messages"][message_id],
                 **message,
@@ -242,14 +474,79 @@ class ChatTable:
         history["currentId"] = message_id
 
         chat["history"] = history
-        return self.update_chat_by_id(id, chat)
+        return self.update_chat_by_id(id, chat) is not None
 
     def add_message_status_to_chat_by_id_and_message_id(
         self, id: str, message_id: str, status: dict
-    ) -> Optional[ChatModel]:
+    ) -> bool:
+        """
+        Appends `status` to the message's `statusHistory` in place, without
+        loading the chat. Does nothing if the message does not exist.
+        """
+        now = int(time.time())
+        with get_db() as db:
+            dialect_name = db.bind.dialect.name
+            if dialect_name == "sqlite" and _is_safe_json_path_label(message_id):
+                status_path = f'$.history.messages."{message_id}".statusHistory'
+                result = db.execute(
+                    text(
+                        f"""
+                        UPDATE chat SET
+                            chat = json_insert(
+                                json_insert(chat, '{status_path}', json_array()),
+                                '{status_path}[#]',
+                                json(:status)
+                            ),
+                            updated_at = :updated_at
+                        WHERE id = :id
+                        AND json_type(chat, '$.history.messages."{message_id}"') = 'object'
+                        """
+                    ),
+                    {"id": id, "status": json.dumps(status), "updated_at": now},
+                )
+            elif dialect_name == "postgresql":
+                result = db.execute(
+                    text(
+                        """
+                        UPDATE chat SET
+                            chat = jsonb_set(
+                                chat::jsonb,
+                                CAST(:status_path AS text[]),
+                                COALESCE(
+                                    chat::jsonb #> CAST(:status_path AS text[]),
+                                    '[]'::jsonb
+                                ) || jsonb_build_array(CAST(:status AS jsonb))
+                            )::json,
+                            updated_at = :updated_at
+                        WHERE id = :id
+                        AND chat::jsonb #> CAST(:message_path AS text[]) IS NOT NULL
+                        """
+                    ),
+                    {
+                        "id": id,
+                        "status": json.dumps(status),
+                        "message_path": ["history", "messages", message_id],
+                        "status_path": [
+                            "history",
+                            "messages",
+                            message_id,
+                            "statusHistory",
+                        ],
+                        "updated_at": now,
+                    },
+                )
+            else:
+                return self._add_message_status_by_rewrite(id, message_id, status)
+
+            db.commit()
+            return result.rowcount > 0
+
+    def _add_message_status_by_rewrite(
+        self, id: str, message_id: str, status: dict
+    ) -> bool:
         chat = self.get_chat_by_id(id)
         if chat is None:
-            return None
+            return False
 
         chat = chat.chat
         history = chat.get("history", {})
@@ -260,7 +557,7 @@ class ChatTable:
             history["messages"][message_id]["statusHistory"] = status_history
 
         chat["history"] = history
-        return self.update_chat_by_id(id, chat)
+        return self.update_chat_by_id(id, chat) is not None
 
     def insert_shared_chat_by_chat_id(self, chat_id: str) -> Optional[ChatModel]:
         with get_db() as db:
@@ -529,16 +826,17 @@ class ChatTable:
         include_archived: bool = False,
         skip: int = 0,
         limit: int = 60,
-    ) -> list[ChatModel]:
+        cursor: Optional[str] = None,
+    ) -> list[ChatSearchResponse]:
         """
-        Filters chats based on a search query using Python, allowing pagination using skip and limit.
-        """
-        search_text = search_text.lower().strip()
-
-        if not search_text:
-            return self.get_chat_list_by_user_id(user_id, include_archived, skip, limit)
+        Searches the titles and messages of the user's chats through the search
+        index, best matches first. Words match by prefix, `tag:tag_name` words
+        keep only chats with all those tags (`tag:none` chats without tags).
 
-        search_text_words = search_text.split(" ")
+        Pass the `cursor` of the last result to get the next page; `skip` is
+        kept for older clients.
+        """
+        search_text_words = search_text.lower().strip().split(" ")
 
         # search_text might contain 'tag:tag_name' format so we need to extract the tag_name, split the search_text and remove the tags
         tag_ids = [
@@ -547,131 +845,193 @@ class ChatTable:
             if word.startswith("tag:")
         ]
 
-        search_text_words = [
-            word for word in search_text_words if not word.startswith("tag:")
-        ]
-
-        search_text = " ".join(search_text_words)
+        terms = get_search_terms(
+            " ".join(word for word in search_text_words if not word.startswith("tag:"))
+        )
+        after = parse_search_cursor(cursor) if cursor else None
 
         with get_db() as db:
-            query = db.query(Chat).filter(Chat.user_id == user_id)
-
-            if not include_archived:
-                query = query.filter(Chat.archived == False)
-
-            query = query.order_by(Chat.updated_at.desc())
-
-            # Check if the database dialect is either 'sqlite' or 'postgresql'
             dialect_name = db.bind.dialect.name
             if dialect_name == "sqlite":
-                # SQLite case: using JSON1 extension for JSON searching
-                query = query.filter(
-                    (
-                        Chat.title.ilike(
-                            f"%{search_text}%"
-                        )  # Case-insensitive search in title
-                        | text(
-                            """
-                            EXISTS (
-                                SELECT 1 
-                                FROM json_each(Chat.chat, '$.messages') AS message 
-                                WHERE LOWER(message.value->>'content') LIKE '%' || :search_text || '%'
-                            )
-                            """
-                        )
-                    ).params(search_text=search_text)
+                rows = self._search_chats_sqlite(
+                    db, user_id, terms, tag_ids, include_archived, after, skip, limit
                 )
-
-                # Check if there are any tags to filter, it should have all the tags
-                if "none" in tag_ids:
-                    query = query.filter(
-                        text(
-                            """
-                            NOT EXISTS (
-                                SELECT 1
-                                FROM json_each(Chat.meta, '$.tags') AS tag
-                            )
-                            """
-                        )
-                    )
-                elif tag_ids:
-                    query = query.filter(
-                        and_(
-                            *[
-                                text(
-                                    f"""
-                                    EXISTS (
-                                        SELECT 1
-                                        FROM json_each(Chat.meta, '$.tags') AS tag
-                                        WHERE tag.value = :tag_id_{tag_idx}
-                                    )
-                                    """
-                                ).params(**{f"tag_id_{tag_idx}": tag_id})
-                                for tag_idx, tag_id in enumerate(tag_ids)
-                            ]
-                        )
-                    )
-
             elif dialect_name == "postgresql":
-                # PostgreSQL relies on proper JSON query for search
-                query = query.filter(
-                    (
-                        Chat.title.ilike(
-                            f"%{search_text}%"
-                        )  # Case-insensitive search in title
-                        | text(
-                            """
-                            EXISTS (
-                                SELECT 1
-                                FROM json_array_elements(Chat.chat->'messages') AS message
-                                WHERE LOWER(message->>'content') LIKE '%' || :search_text || '%'
-                            )
-                            """
-                        )
-                    ).params(search_text=search_text)
+                rows = self._search_chats_postgresql(
+                    db, user_id, terms, tag_ids, include_archived, after, skip, limit
                 )
-
-                # Check if there are any tags to filter, it should have all the tags
-                if "none" in tag_ids:
-                    query = query.filter(
-                        text(
-                            """
-                            NOT EXISTS (
-                                SELECT 1
-                                FROM json_array_elements_text(Chat.meta->'tags') AS tag
-                            )
-                            """
-                        )
-                    )
-                elif tag_ids:
-                    query = query.filter(
-                        and_(
-                            *[
-                                text(
-                                    f"""
-                                    EXISTS (
-                                        SELECT 1
-                                        FROM json_array_elements_text(Chat.meta->'tags') AS tag
-                                        WHERE tag = :tag_id_{tag_idx}
-                                    )
-                                    """
-                                ).params(**{f"tag_id_{tag_idx}": tag_id})
-                                for tag_idx, tag_id in enumerate(tag_ids)
-                            ]
-                        )
-                    )
             else:
                 raise NotImplementedError(
                     f"Unsupported dialect: {db.bind.dialect.name}"
                 )
 
-            # Perform pagination at the SQL level
-            all_chats = query.offset(skip).limit(limit).all()
+            return [
+                ChatSearchResponse(
+                    id=row["id"],
+                    title=row["title"],
+                    updated_at=row["updated_at"],
+                    created_at=row["created_at"],
+                    snippet=format_snippet(row["snippet"]),
+                    cursor=get_search_cursor(
+                        row["score"], row["updated_at"], row["id"]
+                    ),
+                )
+                for row in rows
+            ]
 
-            print(len(all_chats))
+    def _search_chats_sqlite(
+        self,
+        db,
+        user_id: str,
+        terms: list[str],
+        tag_ids: list[str],
+        include_archived: bool,
+        after: Optional[tuple[float, int, str]],
+        skip: int,
+        limit: int,
+    ) -> list[dict]:
+        # The user filter is part of the full-text query, so only the user's
+        # rows of the index are looked at
+        match = [f"user_id : {quote_fts5(user_id)}"]
+        if terms:
+            match.append(
+                "{title content} : ("
+                + " ".join(f"{quote_fts5(term)}*" for term in terms)
+                + ")"
+            )
 
-            # Validate and return chats
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+        conditions = ["chat_search_fts MATCH :match", "s.user_id = :user_id"]
+        params = {"user_id": user_id, "skip": skip, "limit": limit}
+        if not include_archived:
+            conditions.append("NOT chat.archived")
+        if "none" in tag_ids:
+            conditions.append("s.tags = ''")
+        else:
+            for idx, tag_id in enumerate(tag_ids):
+                if get_search_terms(tag_id):
+                    match.append(f"tags : {quote_fts5(tag_id)}")
+                # Tokens drop punctuation, check the exact tag too
+                conditions.append(f"instr(s.tags, :tag_{idx}) > 0")
+                params[f"tag_{idx}"] = f" {tag_id} "
+        if after is not None:
+            conditions.append(
+                "(score, chat.updated_at, chat.id) < (:after_score, :after_updated_at, :after_id)"
+            )
+            params.update(
+                after_score=after[0], after_updated_at=after[1], after_id=after[2]
+            )
+        params["match"] = " AND ".join(match)
+
+        rows = [
+            dict(row)
+            for row in db.execute(
+                text(
+                    f"""
+                    SELECT
+                        s.id AS rowid, chat.id AS id, chat.title AS title,
+                        chat.created_at AS created_at, chat.updated_at AS updated_at,
+                        -bm25(chat_search_fts, 0.0, 10.0, 1.0, 0.0) AS score
+                    FROM chat_search_fts
+                    JOIN chat_search AS s ON s.id = chat_search_fts.rowid
+                    JOIN chat ON chat.id = s.chat_id
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY score DESC, chat.updated_at DESC, chat.id DESC
+                    LIMIT :limit OFFSET :skip
+                    """
+                ),
+                params,
+            ).mappings()
+        ]
+
+        snippets = {}
+        if terms and rows:
+            # Only for the page, snippets have to re-tokenize the content
+            snippets = dict(
+                db.execute(
+                    text(
+                        """
+                        SELECT rowid, snippet(chat_search_fts, 2, :start, :end, '…', 16)
+                        FROM chat_search_fts
+                        WHERE chat_search_fts MATCH :match AND rowid IN :rowids
+                        """
+                    ).bindparams(bindparam("rowids", expanding=True)),
+                    {
+                        "start": SNIPPET_START,
+                        "end": SNIPPET_END,
+                        "match": params["match"],
+                        "rowids": [row["rowid"] for row in rows],
+                    },
+                ).all()
+            )
+
+        for row in rows:
+            row["snippet"] = snippets.get(row["rowid"])
+        return rows
+
+    def _search_chats_postgresql(
+        self,
+        db,
+        user_id: str,
+        terms: list[str],
+        tag_ids: list[str],
+        include_archived: bool,
+        after: Optional[tuple[float, int, str]],
+        skip: int,
+        limit: int,
+    ) -> list[dict]:
+        conditions = ["s.user_id = :user_id"]
+        params = {"user_id": user_id, "skip": skip, "limit": limit}
+        if terms:
+            conditions.append("s.search_vector @@ q.query")
+            params["query"] = " & ".join(f"{term}:*" for term in terms)
+        if not include_archived:
+            conditions.append("NOT chat.archived")
+        if "none" in tag_ids:
+            conditions.append("s.tags = '{}'")
+        elif tag_ids:
+            conditions.append("s.tags @> CAST(:tags AS text[])")
+            params["tags"] = tag_ids
+
+        after_condition = ""
+        if after is not None:
+            after_condition = "WHERE (score, updated_at, id) < (:after_score, :after_updated_at, :after_id)"
+            params.update(
+                after_score=after[0], after_updated_at=after[1], after_id=after[2]
+            )
+
+        if terms:
+            params["headline_options"] = (
+                f'StartSel="{SNIPPET_START}", StopSel="{SNIPPET_END}", '
+                "MaxWords=24, MinWords=12, MaxFragments=1"
+            )
+
+        return [
+            dict(row)
+            for row in db.execute(
+                text(
+                    f"""
+                    SELECT
+                        id, title, created_at, updated_at, score,
+                        {"ts_headline('simple', content, query, :headline_options)" if terms else "NULL"} AS snippet
+                    FROM (
+                        SELECT
+                            chat.id AS id, chat.title AS title,
+                            chat.created_at AS created_at, chat.updated_at AS updated_at,
+                            s.content AS content,
+                            {"q.query AS query, ts_rank_cd(s.search_vector, q.query)" if terms else "CAST(0 AS real)"} AS score
+                        FROM chat_search AS s
+                        JOIN chat ON chat.id = s.chat_id
+                        {", to_tsquery('simple', :query) AS q(query)" if terms else ""}
+                        WHERE {" AND ".join(conditions)}
+                    ) AS results
+                    {after_condition}
+                    ORDER BY score DESC, updated_at DESC, id DESC
+                    LIMIT :limit OFFSET :skip
+                    """
+                ),
+                params,
+            ).mappings()
+        ]
 
     def get_chats_by_folder_id_and_user_id(
         self, folder_id: str, user_id: str
@@ -769,6 +1129,7 @@ class ChatTable:
                         **chat.meta,
                         "tags": list(set(chat.meta.get("tags", []) + [tag_id])),
                     }
+                    self._update_search_index(db, chat)
 
                 db.commit()
                 db.refresh(chat)
@@ -826,6 +1187,7 @@ class ChatTable:
                     **chat.meta,
                     "tags": list(set(tags)),
                 }
+                self._update_search_index(db, chat)
                 db.commit()
                 return True
         except Exception:
@@ -839,6 +1201,7 @@ class ChatTable:
                     **chat.meta,
                     "tags": [],
                 }
+                self._update_search_index(db, chat)
                 db.commit()
 
                 return True
@@ -849,6 +1212,7 @@ class ChatTable:
         try:
             with get_db() as db:
                 db.query(Chat).filter_by(id=id).delete()
+                self._delete_from_search_index(db, "chat_id = :id", {"id": id})
                 db.commit()
 
                 return True and self.delete_shared_chat_by_chat_id(id)
@@ -859,6 +1223,11 @@ class ChatTable:
         try:
             with get_db() as db:
                 db.query(Chat).filter_by(id=id, user_id=user_id).delete()
+                self._delete_from_search_index(
+                    db,
+                    "chat_id = :id AND user_id = :user_id",
+                    {"id": id, "user_id": user_id},
+                )
                 db.commit()
 
                 return True and self.delete_shared_chat_by_chat_id(id)
@@ -871,6 +1240,9 @@ class ChatTable:
                 self.delete_shared_chats_by_user_id(user_id)
 
                 db.query(Chat).filter_by(user_id=user_id).delete()
+                self._delete_from_search_index(
+                    db, "user_id = :user_id", {"user_id": user_id}
+                )
                 db.commit()
 
                 return True
@@ -882,6 +1254,11 @@ class ChatTable:
     ) -> bool:
         try:
             with get_db() as db:
+                self._delete_from_search_index(
+                    db,
+                    "chat_id IN (SELECT id FROM chat WHERE user_id = :user_id AND folder_id = :folder_id)",
+                    {"user_id": user_id, "folder_id": folder_id},
+                )
                 db.query(Chat).filter_by(user_id=user_id, folder_id=folder_id).delete()
                 db.commit()
 
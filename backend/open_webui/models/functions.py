@@ -3,6 +3,7 @@ import time
 from typing import Optional
 
 from open_webui.internal.db import Base, JSONField, get_db
+from open_webui.models.models import MODEL_LIST_VERSION
 from open_webui.models.users import Users
 from open_webui.env import SRC_LOG_LEVELS
 from pydantic import BaseModel, ConfigDict
@@ -100,6 +101,7 @@ class FunctionsTable:
                 db.add(result)
                 db.commit()
                 db.refresh(result)
+                MODEL_LIST_VERSION.bump()
                 if result:
                     return FunctionModel.model_validate(result)
                 else:
@@ -183,6 +185,7 @@ class FunctionsTable:
                 function.updated_at = int(time.time())
                 db.commit()
                 db.refresh(function)
+                MODEL_LIST_VERSION.bump()
                 return self.get_function_by_id(id)
             except Exception:
                 return None
@@ -238,6 +241,7 @@ class FunctionsTable:
                     }
                 )
                 db.commit()
+                MODEL_LIST_VERSION.bump()
                 return self.get_function_by_id(id)
             except Exception:
                 return None
@@ -252,6 +256,7 @@ class FunctionsTable:
                     }
                 )
                 db.commit()
+                MODEL_LIST_VERSION.bump()
                 return True
             except Exception:
                 return None
@@ -261,6 +266,7 @@ class FunctionsTable:
             try:
                 db.query(Function).filter_by(id=id).delete()
                 db.commit()
+                MODEL_LIST_VERSION.bump()
 
                 return True
             except Exception:
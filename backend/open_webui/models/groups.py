@@ -1,17 +1,20 @@
 import json
 import logging
+import threading
 import time
 from typing import Optional
 import uuid
 
+import redis
+
 from open_webui.internal.db import Base, get_db
-from open_webui.env import SRC_LOG_LEVELS
+from open_webui.env import REDIS_URL, SRC_LOG_LEVELS
 
 from open_webui.models.files import FileMetadataResponse
 
 
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import BigInteger, Column, String, Text, JSON, func
+from sqlalchemy import BigInteger, Column, Text, JSON
 
 
 log = logging.getLogger(__name__)
@@ -88,6 +91,83 @@ class GroupUpdateForm(GroupForm):
     admin_ids: Optional[list[str]] = None
 
 
+class GroupMembershipIndex:
+    """
+    In-memory map of user id -> groups, built from a single query over all
+    groups so that access checks don't scan the JSON `user_ids` column. Every
+    change to a group through `Groups` drops it on all workers via Redis
+    pub/sub, and it is rebuilt on the next lookup.
+    """
+
+    channel = "groups:changed"
+
+    def __init__(self):
+        self.redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._members: Optional[dict[str, list[GroupModel]]] = None
+
+    def _build(self) -> dict[str, list[GroupModel]]:
+        members: dict[str, list[GroupModel]] = {}
+        with get_db() as db:
+            for group in db.query(Group).order_by(Group.updated_at.desc()).all():
+                group = GroupModel.model_validate(group)
+                for user_id in set(group.user_ids or []):
+                    members.setdefault(user_id, []).append(group)
+        return members
+
+    def _get_members(self) -> dict[str, list[GroupModel]]:
+        members = self._members
+        if members is not None:
+            return members
+
+        with self._lock:
+            generation = self._generation
+        members = self._build()
+        with self._lock:
+            # Don't install an index that was invalidated while it was built
+            if generation == self._generation:
+                self._members = members
+        return members
+
+    def get_groups(self, user_id: str) -> list[GroupModel]:
+        return self._get_members().get(user_id, [])
+
+    def get_group_ids(self, user_id: str) -> set[str]:
+        return {group.id for group in self.get_groups(user_id)}
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._members = None
+
+    def invalidate(self):
+        self.clear()
+        try:
+            self.redis.publish(self.channel, "1")
+        except Exception as e:
+            log.warning(f"Failed to publish group invalidation: {e}")
+
+
+def group_membership_listener():
+    """
+    Listen for group change notifications on the Redis pub/sub channel and
+    drop the local membership index. This is a blocking function, so it
+    should be run in a separate thread.
+    """
+    pubsub = group_memberships.redis.pubsub()
+    pubsub.subscribe(group_memberships.channel)
+    log.info(f"Subscribed to Redis pub/sub channel: {group_memberships.channel}")
+
+    for message in pubsub.listen():
+        if message["type"] != "message":
+            continue
+        group_memberships.clear()
+
+
+group_memberships = GroupMembershipIndex()
+
+
 class GroupTable:
     def insert_new_group(
         self, user_id: str, form_data: GroupForm
@@ -108,6 +188,7 @@ class GroupTable:
                 db.add(result)
                 db.commit()
                 db.refresh(result)
+                group_memberships.invalidate()
                 if result:
                     return GroupModel.model_validate(result)
                 else:
@@ -124,19 +205,14 @@ class GroupTable:
             ]
 
     def get_groups_by_member_id(self, user_id: str) -> list[GroupModel]:
-        with get_db() as db:
-            return [
-                GroupModel.model_validate(group)
-                for group in db.query(Group)
-                .filter(
-                    func.json_array_length(Group.user_ids) > 0
-                )  # Ensure array exists
-                .filter(
-                    Group.user_ids.cast(String).like(f'%"{user_id}"%')
-                )  # String-based check
-                .order_by(Group.updated_at.desc())
-                .all()
-            ]
+        # Copies, since callers may modify them
+        return [
+            group.model_copy(deep=True)
+            for group in group_memberships.get_groups(user_id)
+        ]
+
+    def get_group_ids_by_member_id(self, user_id: str) -> set[str]:
+        return group_memberships.get_group_ids(user_id)
 
     def get_group_by_id(self, id: str) -> Optional[GroupModel]:
         try:
@@ -165,6 +241,7 @@ class GroupTable:
                     }
                 )
                 db.commit()
+                group_memberships.invalidate()
                 return self.get_group_by_id(id=id)
         except Exception as e:
             log.exception(e)
@@ -175,6 +252,7 @@ class GroupTable:
             with get_db() as db:
                 db.query(Group).filter_by(id=id).delete()
                 db.commit()
+                group_memberships.invalidate()
                 return True
         except Exception:
             return False
@@ -184,6 +262,7 @@ class GroupTable:
             try:
                 db.query(Group).delete()
                 db.commit()
+                group_memberships.invalidate()
 
                 return True
             except Exception:
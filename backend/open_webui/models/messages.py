@@ -128,17 +128,55 @@ class MessageTable:
             if not message:
                 return None
 
-            reactions = self.get_reactions_by_message_id(id)
-            replies = self.get_replies_by_message_id(id)
-
-            return MessageResponse(
+            return self.get_message_responses([MessageModel.model_validate(message)])[0]
+
+    def get_message_responses(
+        self, messages: list[MessageModel], include_replies: bool = True
+    ) -> list[MessageResponse]:
+        """
+        Adds reply counts and reactions to a page of messages, loaded with one
+        query each for all of them.
+        """
+        ids = [message.id for message in messages]
+        reply_stats = (
+            self.get_reply_stats_by_message_ids(ids) if include_replies else {}
+        )
+        reactions = self.get_reactions_by_message_ids(ids)
+
+        return [
+            MessageResponse(
                 **{
-                    **MessageModel.model_validate(message).model_dump(),
-                    "latest_reply_at": replies[0].created_at if replies else None,
-                    "reply_count": len(replies),
-                    "reactions": reactions,
+                    **message.model_dump(),
+                    "latest_reply_at": reply_stats.get(message.id, (0, None))[1],
+                    "reply_count": reply_stats.get(message.id, (0, None))[0],
+                    "reactions": reactions.get(message.id, []),
                 }
             )
+            for message in messages
+        ]
+
+    def get_reply_stats_by_message_ids(
+        self, ids: list[str]
+    ) -> dict[str, tuple[int, int]]:
+        """Reply count and latest reply time of the messages that have replies."""
+        if not ids:
+            return {}
+
+        with get_db() as db:
+            rows = (
+                db.query(
+                    Message.parent_id,
+                    func.count(Message.id),
+                    func.max(Message.created_at),
+                )
+                .filter(Message.parent_id.in_(ids))
+                .group_by(Message.parent_id)
+                .all()
+            )
+            return {
+                parent_id: (count, latest_reply_at)
+                for parent_id, count, latest_reply_at in rows
+            }
 
     def get_replies_by_message_id(self, id: str) -> list[MessageModel]:
         with get_db() as db:
@@ -158,13 +196,24 @@ class MessageTable:
             ]
 
     def get_messages_by_channel_id(
-        self, channel_id: str, skip: int = 0, limit: int = 50
+        self,
+        channel_id: str,
+        skip: int = 0,
+        limit: int = 50,
+        before: Optional[int] = None,
     ) -> list[MessageModel]:
+        """
+        Newest messages first. Pass the `created_at` of the oldest message
+        loaded as `before` to get the next page, rather than `skip`, so deep
+        pages don't have to scan past all the newer messages.
+        """
         with get_db() as db:
+            query = db.query(Message).filter_by(channel_id=channel_id, parent_id=None)
+            if before is not None:
+                query = query.filter(Message.created_at < before)
+
             all_messages = (
-                db.query(Message)
-                .filter_by(channel_id=channel_id, parent_id=None)
-                .order_by(Message.created_at.desc())
+                query.order_by(Message.created_at.desc())
                 .offset(skip)
                 .limit(limit)
                 .all()
@@ -172,26 +221,42 @@ class MessageTable:
             return [MessageModel.model_validate(message) for message in all_messages]
 
     def get_messages_by_parent_id(
-        self, channel_id: str, parent_id: str, skip: int = 0, limit: int = 50
+        self,
+        channel_id: str,
+        parent_id: str,
+        skip: int = 0,
+        limit: int = 50,
+        before: Optional[int] = None,
     ) -> list[MessageModel]:
+        """
+        Newest replies first, see `get_messages_by_channel_id`. The parent
+        message comes after the oldest reply, on the last page.
+        """
         with get_db() as db:
             message = db.get(Message, parent_id)
 
             if not message:
                 return []
 
+            query = db.query(Message).filter_by(
+                channel_id=channel_id, parent_id=parent_id
+            )
+            if before is not None:
+                query = query.filter(Message.created_at < before)
+
             all_messages = (
-                db.query(Message)
-                .filter_by(channel_id=channel_id, parent_id=parent_id)
-                .order_by(Message.created_at.desc())
+                query.order_by(Message.created_at.desc())
                 .offset(skip)
                 .limit(limit)
                 .all()
             )
 
-            return [
+            messages = [
                 MessageModel.model_validate(message) for message in all_messages
-            ] + [MessageModel.model_validate(message)]
+            ]
+            if len(messages) < limit:
+                messages.append(MessageModel.model_validate(message))
+            return messages
 
     def update_message_by_id(
         self, id: str, form_data: MessageForm
@@ -225,21 +290,40 @@ class MessageTable:
             return MessageReactionModel.model_validate(result) if result else None
 
     def get_reactions_by_message_id(self, id: str) -> list[Reactions]:
+        return self.get_reactions_by_message_ids([id]).get(id, [])
+
+    def get_reactions_by_message_ids(
+        self, ids: list[str]
+    ) -> dict[str, list[Reactions]]:
+        if not ids:
+            return {}
+
         with get_db() as db:
-            all_reactions = db.query(MessageReaction).filter_by(message_id=id).all()
+            all_reactions = (
+                db.query(MessageReaction)
+                .filter(MessageReaction.message_id.in_(ids))
+                .order_by(MessageReaction.created_at)
+                .all()
+            )
 
             reactions = {}
             for reaction in all_reactions:
-                if reaction.name not in reactions:
-                    reactions[reaction.name] = {
+                message_reactions = reactions.setdefault(reaction.message_id, {})
+                if reaction.name not in message_reactions:
+                    message_reactions[reaction.name] = {
                         "name": reaction.name,
                         "user_ids": [],
                         "count": 0,
                     }
-                reactions[reaction.name]["user_ids"].append(reaction.user_id)
-                reactions[reaction.name]["count"] += 1
-
-            return [Reactions(**reaction) for reaction in reactions.values()]
+                message_reactions[reaction.name]["user_ids"].append(reaction.user_id)
+                message_reactions[reaction.name]["count"] += 1
+
+            return {
+                message_id: [
+                    Reactions(**reaction) for reaction in message_reactions.values()
+                ]
+                for message_id, message_reactions in reactions.items()
+            }
 
     def remove_reaction_by_id_and_user_id_and_name(
         self, id: str, user_id: str, name: str
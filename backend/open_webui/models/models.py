@@ -2,8 +2,10 @@ import logging
 import time
 from typing import Optional
 
+import redis
+
 from open_webui.internal.db import Base, JSONField, get_db
-from open_webui.env import SRC_LOG_LEVELS
+from open_webui.env import REDIS_URL, SRC_LOG_LEVELS
 
 from open_webui.models.users import Users, UserResponse
 
@@ -15,7 +17,7 @@ from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy import BigInteger, Column, Text, JSON, Boolean
 
 
-from open_webui.utils.access_control import has_access
+from open_webui.utils.access_control import has_access_many
 
 
 log = logging.getLogger(__name__)
@@ -142,6 +144,31 @@ class ModelForm(BaseModel):
     is_active: bool = True
 
 
+class ModelListVersion:
+    """
+    Global version stamp of the merged model list built by
+    `open_webui.utils.models.get_all_models`. Every change that affects which
+    models exist or how they look bumps it, so all workers rebuild their list.
+    """
+
+    KEY = "models:version"
+
+    def __init__(self):
+        self.redis = redis.Redis.from_url(REDIS_URL)
+
+    def get(self) -> int:
+        return int(self.redis.get(self.KEY) or 0)
+
+    def bump(self):
+        try:
+            self.redis.incr(self.KEY)
+        except Exception as e:
+            log.warning(f"Failed to bump model list version: {e}")
+
+
+MODEL_LIST_VERSION = ModelListVersion()
+
+
 class ModelsTable:
     def insert_new_model(
         self, form_data: ModelForm, user_id: str
@@ -160,6 +187,7 @@ class ModelsTable:
                 db.add(result)
                 db.commit()
                 db.refresh(result)
+                MODEL_LIST_VERSION.bump()
 
                 if result:
                     return ModelModel.model_validate(result)
@@ -199,12 +227,14 @@ class ModelsTable:
         self, user_id: str, permission: str = "write"
     ) -> list[ModelUserResponse]:
         models = self.get_models()
-        return [
-            model
-            for model in models
-            if model.user_id == user_id
-            or has_access(user_id, permission, model.access_control)
-        ]
+        return has_access_many(user_id, models, permission)
+
+    def get_models_by_ids(self, ids: list[str]) -> list[ModelModel]:
+        with get_db() as db:
+            return [
+                ModelModel.model_validate(model)
+                for model in db.query(Model).filter(Model.id.in_(ids)).all()
+            ]
 
     def get_model_by_id(self, id: str) -> Optional[ModelModel]:
         try:
@@ -226,6 +256,7 @@ class ModelsTable:
                     }
                 )
                 db.commit()
+                MODEL_LIST_VERSION.bump()
 
                 return self.get_model_by_id(id)
             except Exception:
@@ -241,6 +272,7 @@ class ModelsTable:
                     .update(model.model_dump(exclude={"id"}))
                 )
                 db.commit()
+                MODEL_LIST_VERSION.bump()
 
                 model = db.get(Model, id)
                 db.refresh(model)
@@ -255,6 +287,7 @@ class ModelsTable:
             with get_db() as db:
                 db.query(Model).filter_by(id=id).delete()
                 db.commit()
+                MODEL_LIST_VERSION.bump()
 
                 return True
         except Exception:
@@ -265,6 +298,7 @@ class ModelsTable:
             with get_db() as db:
                 db.query(Model).delete()
                 db.commit()
+                MODEL_LIST_VERSION.bump()
 
                 return True
         except Exception:
@@ -1,10 +1,24 @@
+import hashlib
+import logging
+import threading
 import time
 from typing import Optional
 
+import redis
+
 from open_webui.internal.db import Base, JSONField, get_db
+from open_webui.env import (
+    REDIS_URL,
+    SRC_LOG_LEVELS,
+    USER_CACHE_TTL,
+    USER_LAST_ACTIVE_FLUSH_INTERVAL,
+)
 from open_webui.models.chats import Chats
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import BigInteger, Column, String, Text, or_
+from sqlalchemy import BigInteger, Column, String, Text, bindparam, or_, update
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MODELS"])
 
 ####################
 # User DB Schema
@@ -89,6 +103,145 @@ class UserUpdateForm(BaseModel):
     password: Optional[str] = None
 
 
+class UserCache:
+    """
+    Short-lived cache of users for request authentication, keyed by user id
+    and by API key hash. Every change to a user through `Users` invalidates it
+    on all workers via Redis pub/sub.
+    """
+
+    channel = "users:changed"
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self._lock = threading.Lock()
+        self._users: dict[str, tuple[float, UserModel]] = {}
+        self._api_keys: dict[str, tuple[float, str]] = {}
+
+    @staticmethod
+    def _hash(api_key: str) -> str:
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    def get(self, id: str) -> Optional[UserModel]:
+        with self._lock:
+            entry = self._users.get(id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._users[id]
+                return None
+            return entry[1]
+
+    def get_by_api_key(self, api_key: str) -> Optional[UserModel]:
+        with self._lock:
+            entry = self._api_keys.get(self._hash(api_key))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+
+        user = self.get(entry[1])
+        # The key may have been rotated since it was cached
+        if user is None or user.api_key != api_key:
+            return None
+        return user
+
+    def set(self, user: UserModel):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._users[user.id] = (expires_at, user)
+            if user.api_key:
+                self._api_keys[self._hash(user.api_key)] = (expires_at, user.id)
+
+    def evict(self, id: str):
+        with self._lock:
+            self._users.pop(id, None)
+            self._api_keys = {
+                key: entry for key, entry in self._api_keys.items() if entry[1] != id
+            }
+
+    def invalidate(self, id: str):
+        self.evict(id)
+        try:
+            self.redis.publish(self.channel, id)
+        except Exception as e:
+            log.warning(f"Failed to publish user invalidation for {id}: {e}")
+
+
+def user_cache_listener():
+    """
+    Listen for user change notifications on the Redis pub/sub channel and
+    evict the users from the local cache. This is a blocking function, so it
+    should be run in a separate thread.
+    """
+    pubsub = user_cache.redis.pubsub()
+    pubsub.subscribe(user_cache.channel)
+    log.info(f"Subscribed to Redis pub/sub channel: {user_cache.channel}")
+
+    for message in pubsub.listen():
+        if message["type"] != "message":
+            continue
+        user_cache.evict(message["data"])
+
+
+class LastActiveBuffer:
+    """
+    Coalesces `last_active_at` updates so that they are written in one bulk
+    UPDATE every `interval` seconds instead of once per request.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending: dict[str, int] = {}
+
+    def touch(self, id: str):
+        with self._lock:
+            self._pending[id] = int(time.time())
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        try:
+            with get_db() as db:
+                # A plain executemany on the table, unlike the ORM bulk update
+                # it doesn't fail on users deleted in the meantime
+                db.execute(
+                    update(User.__table__)
+                    .where(User.__table__.c.id == bindparam("_id"))
+                    .values(last_active_at=bindparam("last_active_at")),
+                    [
+                        {"_id": id, "last_active_at": last_active_at}
+                        for id, last_active_at in pending.items()
+                    ],
+                )
+                db.commit()
+        except Exception as e:
+            # Dropped rather than retried, a batch failing once would likely
+            # keep failing and hold back every later update
+            log.error(f"Failed to write {len(pending)} last active times: {e}")
+
+    def discard(self, id: str):
+        with self._lock:
+            self._pending.pop(id, None)
+
+
+def last_active_flusher():
+    """
+    Periodically write buffered `last_active_at` updates. This is a blocking
+    function, so it should be run in a separate thread.
+    """
+    while True:
+        time.sleep(last_active_buffer.interval)
+        last_active_buffer.flush()
+
+
+user_cache = UserCache(ttl=USER_CACHE_TTL)
+last_active_buffer = LastActiveBuffer(interval=USER_LAST_ACTIVE_FLUSH_INTERVAL)
+
+
 class UsersTable:
     def insert_new_user(
         self,
@@ -138,6 +291,22 @@ class UsersTable:
         except Exception:
             return None
 
+    def get_cached_user_by_id(self, id: str) -> Optional[UserModel]:
+        user = user_cache.get(id)
+        if user is None:
+            user = self.get_user_by_id(id)
+            if user is not None:
+                user_cache.set(user)
+        return user
+
+    def get_cached_user_by_api_key(self, api_key: str) -> Optional[UserModel]:
+        user = user_cache.get_by_api_key(api_key)
+        if user is None:
+            user = self.get_user_by_api_key(api_key)
+            if user is not None:
+                user_cache.set(user)
+        return user
+
     def get_user_by_email(self, email: str) -> Optional[UserModel]:
         try:
             with get_db() as db:
@@ -208,6 +377,7 @@ class UsersTable:
             with get_db() as db:
                 db.query(User).filter_by(id=id).update({"role": role})
                 db.commit()
+                user_cache.invalidate(id)
                 user = db.query(User).filter_by(id=id).first()
                 return UserModel.model_validate(user)
         except Exception:
@@ -222,6 +392,7 @@ class UsersTable:
                     {"profile_image_url": profile_image_url}
                 )
                 db.commit()
+                user_cache.invalidate(id)
 
                 user = db.query(User).filter_by(id=id).first()
                 return UserModel.model_validate(user)
@@ -241,6 +412,10 @@ class UsersTable:
         except Exception:
             return None
 
+    def touch_user_last_active_by_id(self, id: str):
+        """Buffers a `last_active_at` update, written by `last_active_flusher`."""
+        last_active_buffer.touch(id)
+
     def update_user_oauth_sub_by_id(
         self, id: str, oauth_sub: str
     ) -> Optional[UserModel]:
@@ -248,6 +423,7 @@ class UsersTable:
             with get_db() as db:
                 db.query(User).filter_by(id=id).update({"oauth_sub": oauth_sub})
                 db.commit()
+                user_cache.invalidate(id)
 
                 user = db.query(User).filter_by(id=id).first()
                 return UserModel.model_validate(user)
@@ -259,6 +435,7 @@ class UsersTable:
             with get_db() as db:
                 db.query(User).filter_by(id=id).update(updated)
                 db.commit()
+                user_cache.invalidate(id)
 
                 user = db.query(User).filter_by(id=id).first()
                 return UserModel.model_validate(user)
@@ -276,6 +453,8 @@ class UsersTable:
                     # Delete User
                     db.query(User).filter_by(id=id).delete()
                     db.commit()
+                user_cache.invalidate(id)
+                last_active_buffer.discard(id)
 
                 return True
             else:
@@ -288,6 +467,7 @@ class UsersTable:
             with get_db() as db:
                 result = db.query(User).filter_by(id=id).update({"api_key": api_key})
                 db.commit()
+                user_cache.invalidate(id)
                 return True if result == 1 else False
         except Exception:
             return False
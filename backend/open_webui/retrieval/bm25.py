@@ -0,0 +1,340 @@
+import hashlib
+import heapq
+import logging
+import math
+import os
+import pickle
+import threading
+import weakref
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+import redis
+
+from open_webui.config import config
+from open_webui.env import REDIS_URL, SRC_LOG_LEVELS
+from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+def tokenize(text: str) -> list[str]:
+    # Same pre-processing as langchain's BM25Retriever default
+    return text.split()
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over one collection, backed by an inverted index so that
+    documents can be added and removed without rebuilding it. `version` is the
+    collection version the index reflects (see `BM25IndexCache`).
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.version: Optional[tuple[int, int]] = None
+
+        self.documents: dict[str, tuple[str, Any, int]] = {}
+        self.postings: dict[str, dict[str, int]] = {}
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[Any]):
+        with self._lock:
+            for id, text, metadata in zip(ids, texts, metadatas):
+                self._add(id, text, metadata)
+
+    def _add(self, id: str, text: str, metadata: Any):
+        if id in self.documents:
+            self._remove(id)
+
+        tokens = tokenize(text or "")
+        for token, tf in Counter(tokens).items():
+            self.postings.setdefault(token, {})[id] = tf
+
+        self.documents[id] = (text, metadata, len(tokens))
+        self.total_length += len(tokens)
+
+    def remove(self, ids: list[str]):
+        with self._lock:
+            for id in ids:
+                self._remove(id)
+
+    def _remove(self, id: str):
+        document = self.documents.pop(id, None)
+        if document is None:
+            return
+
+        text, _, length = document
+        self.total_length -= length
+        for token in set(tokenize(text or "")):
+            posting = self.postings.get(token)
+            if posting is not None:
+                posting.pop(id, None)
+                if not posting:
+                    del self.postings[token]
+
+    def remove_where(self, filter: dict):
+        with self._lock:
+            ids = [
+                id
+                for id, (_, metadata, _) in self.documents.items()
+                if all(
+                    str((metadata or {}).get(key)) == str(value)
+                    for key, value in filter.items()
+                )
+            ]
+            for id in ids:
+                self._remove(id)
+
+    def search(self, query: str, k: int) -> list[tuple[str, Any, float]]:
+        """Returns up to `k` (text, metadata, score) tuples, best first."""
+        with self._lock:
+            n = len(self.documents)
+            if n == 0:
+                return []
+
+            average_length = self.total_length / n or 1
+            scores: dict[str, float] = {}
+            for token in tokenize(query):
+                posting = self.postings.get(token)
+                if not posting:
+                    continue
+
+                df = len(posting)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for id, tf in posting.items():
+                    length = self.documents[id][2]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[id] = scores.get(id, 0.0) + idf * tf * (self.k1 + 1) / (
+                        tf + norm
+                    )
+
+            return [
+                (self.documents[id][0], self.documents[id][1], score)
+                for id, score in heapq.nlargest(k, scores.items(), key=lambda x: x[1])
+            ]
+
+
+class BM25IndexCache:
+    """
+    Size-bounded LRU of per-collection BM25 indexes, mirrored to disk.
+
+    Each collection has a version counter in Redis which every write bumps, so
+    an index built by one worker is only served while it matches the latest
+    version, and the other workers rebuild theirs from the vector DB on their
+    next lookup. Every write to the vector DB has to be mirrored here (`add`,
+    `delete`, `delete_collection`, `reset`) to be seen at all; the writing
+    worker applies it to its index in place.
+    """
+
+    VERSIONS_KEY = "bm25:versions"
+    EPOCH_KEY = "bm25:epoch"
+
+    def __init__(self, max_documents: int, cache_dir: str):
+        self.max_documents = max_documents
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self.redis = redis.Redis.from_url(REDIS_URL)
+        self._lock = threading.Lock()
+        # Held while loading or building the index of a collection, so others
+        # are still served meanwhile
+        self._collection_locks: weakref.WeakValueDictionary[str, threading.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._indexes: OrderedDict[str, BM25Index] = OrderedDict()
+        self._dirty: set[str] = set()
+        self._size = 0
+
+    def _path(self, collection_name: str) -> Path:
+        digest = hashlib.sha256(collection_name.encode()).hexdigest()
+        return self.cache_dir / f"{digest}.pkl"
+
+    def _get_version(self, collection_name: str) -> tuple[int, int]:
+        pipe = self.redis.pipeline()
+        pipe.get(self.EPOCH_KEY)
+        pipe.hget(self.VERSIONS_KEY, collection_name)
+        epoch, version = pipe.execute()
+        return int(epoch or 0), int(version or 0)
+
+    def _bump_version(self, collection_name: str) -> tuple[int, int]:
+        pipe = self.redis.pipeline()
+        pipe.get(self.EPOCH_KEY)
+        pipe.hincrby(self.VERSIONS_KEY, collection_name, 1)
+        epoch, version = pipe.execute()
+        return int(epoch or 0), int(version)
+
+    def _save(self, collection_name: str, index: BM25Index):
+        path = self._path(collection_name)
+        try:
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.warning(f"Failed to persist BM25 index for {collection_name}: {e}")
+        self._dirty.discard(collection_name)
+
+    def _load(self, collection_name: str, version: tuple[int, int]):
+        path = self._path(collection_name)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                index = pickle.load(f)
+        except Exception as e:
+            log.warning(f"Failed to load BM25 index for {collection_name}: {e}")
+            return None
+        return index if index.version == version else None
+
+    def _build(self, collection_name: str, version: tuple[int, int]):
+        result = VECTOR_DB_CLIENT.get(collection_name=collection_name)
+        if result is None:
+            return None
+
+        index = BM25Index()
+        index.add(result.ids[0], result.documents[0], result.metadatas[0])
+        index.version = version
+        log.info(f"Built BM25 index for {collection_name} with {len(index)} documents")
+        self._save(collection_name, index)
+        return index
+
+    def _put(self, collection_name: str, index: BM25Index):
+        self._evict(collection_name)
+        self._indexes[collection_name] = index
+        self._size += len(index)
+
+        while self._size > self.max_documents and len(self._indexes) > 1:
+            oldest = next(iter(self._indexes))
+            if oldest in self._dirty:
+                self._save(oldest, self._indexes[oldest])
+            self._evict(oldest)
+
+    def _evict(self, collection_name: str):
+        index = self._indexes.pop(collection_name, None)
+        if index is not None:
+            self._size -= len(index)
+
+    def _get_collection_lock(self, collection_name: str) -> threading.Lock:
+        with self._lock:
+            lock = self._collection_locks.get(collection_name)
+            if lock is None:
+                lock = self._collection_locks[collection_name] = threading.Lock()
+            return lock
+
+    def _get_cached(
+        self, collection_name: str, version: tuple[int, int]
+    ) -> Optional[BM25Index]:
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(collection_name)
+                return index
+            return None
+
+    def get(self, collection_name: str) -> Optional[BM25Index]:
+        """Returns an up-to-date index, or None if the collection is empty."""
+        version = self._get_version(collection_name)
+        index = self._get_cached(collection_name, version)
+        if index is not None:
+            return index
+
+        with self._get_collection_lock(collection_name):
+            # Built by another thread while waiting
+            index = self._get_cached(collection_name, version)
+            if index is not None:
+                return index
+
+            index = self._load(collection_name, version) or self._build(
+                collection_name, version
+            )
+            with self._lock:
+                if index is None:
+                    self._evict(collection_name)
+                    return None
+
+                self._put(collection_name, index)
+                return index
+
+    def _update(self, collection_name: str, apply):
+        epoch, version = self._bump_version(collection_name)
+        with self._lock:
+            index = self._indexes.get(collection_name)
+            if index is None:
+                return
+
+            # Only patch in place if nobody else wrote in between
+            if index.version != (epoch, version - 1):
+                self._evict(collection_name)
+                return
+
+            self._size -= len(index)
+            apply(index)
+            self._size += len(index)
+            index.version = (epoch, version)
+            self._dirty.add(collection_name)
+
+    def add(self, collection_name: str, items: list[dict]):
+        self._update(
+            collection_name,
+            lambda index: index.add(
+                [item["id"] for item in items],
+                [item["text"] for item in items],
+                [item["metadata"] for item in items],
+            ),
+        )
+
+    def delete(
+        self,
+        collection_name: str,
+        ids: Optional[list[str]] = None,
+        filter: Optional[dict] = None,
+    ):
+        def apply(index: BM25Index):
+            if ids:
+                index.remove(ids)
+            if filter:
+                index.remove_where(filter)
+
+        self._update(collection_name, apply)
+
+    def delete_collection(self, collection_name: str):
+        self._bump_version(collection_name)
+        with self._lock:
+            self._evict(collection_name)
+            self._dirty.discard(collection_name)
+            self._path(collection_name).unlink(missing_ok=True)
+
+    def reset(self):
+        pipe = self.redis.pipeline()
+        pipe.incr(self.EPOCH_KEY)
+        pipe.delete(self.VERSIONS_KEY)
+        pipe.execute()
+        with self._lock:
+            self._indexes.clear()
+            self._dirty.clear()
+            self._size = 0
+            for path in self.cache_dir.glob("*.pkl"):
+                path.unlink(missing_ok=True)
+
+
+BM25_INDEXES = BM25IndexCache(
+    max_documents=config.BM25_INDEX_CACHE_MAX_DOCUMENTS,
+    cache_dir=config.BM25_INDEX_CACHE_DIR,
+)
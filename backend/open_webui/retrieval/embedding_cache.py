@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+
+from open_webui.config import config
+from open_webui.env import REDIS_URL, SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of text embeddings, keyed by (engine, model, text)
+    so that switching the embedding model never serves stale vectors.
+
+    Vectors are stored as packed float32. Entries live in a size-bounded LRU
+    in this process and, if enabled, in Redis so that workers share them.
+    """
+
+    KEY_PREFIX = "embedding:"
+
+    def __init__(self, max_size: int, ttl: int, use_redis: bool):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis = redis.Redis.from_url(REDIS_URL) if use_redis else None
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_key(engine: str, model: str, text: str) -> str:
+        return hashlib.sha256(f"{engine}\0{model}\0{text}".encode()).hexdigest()
+
+    @staticmethod
+    def pack(vector: list[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def unpack(data: bytes) -> list[float]:
+        vector = array("f")
+        vector.frombytes(data)
+        return vector.tolist()
+
+    def _get_local(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, data = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return data
+
+    def _set_local(self, key: str, data: bytes):
+        self._entries[key] = (time.monotonic() + self.ttl, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self._lock:
+            for key in keys:
+                data = self._get_local(key)
+                if data is not None:
+                    found[key] = data
+            self.hits += len(found)
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.redis is not None:
+            try:
+                values = self.redis.mget([self.KEY_PREFIX + key for key in missing])
+            except Exception as e:
+                log.warning(f"Failed to read embeddings from Redis: {e}")
+                values = [None] * len(missing)
+
+            with self._lock:
+                for key, data in zip(missing, values):
+                    if data is not None:
+                        found[key] = data
+                        self._set_local(key, data)
+                        self.redis_hits += 1
+
+        with self._lock:
+            self.misses += len(keys) - len(found)
+
+        return {key: self.unpack(data) for key, data in found.items()}
+
+    def set_many(self, items: dict[str, list[float]]):
+        packed = {key: self.pack(vector) for key, vector in items.items()}
+        with self._lock:
+            for key, data in packed.items():
+                self._set_local(key, data)
+
+        if self.redis is not None:
+            try:
+                pipe = self.redis.pipeline()
+                for key, data in packed.items():
+                    pipe.set(self.KEY_PREFIX + key, data, ex=self.ttl)
+                pipe.execute()
+            except Exception as e:
+                log.warning(f"Failed to write embeddings to Redis: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+            }
+
+    def wrap(self, engine: str, model: str, embedding_function):
+        """
+        Returns `embedding_function` with caching in front of it. Like the
+        wrapped function, it accepts a single text or a list of texts.
+        """
+
+        def cached_embedding_function(query):
+            texts = [query] if isinstance(query, str) else list(query)
+            keys = [self.get_key(engine, model, text) for text in texts]
+            vectors = self.get_many(keys)
+
+            missing = {
+                key: text for key, text in zip(keys, texts) if key not in vectors
+            }
+            if missing:
+                embeddings = embedding_function(list(missing.values()))
+                if embeddings is None:
+                    return None
+
+                embeddings = dict(zip(missing.keys(), embeddings))
+                self.set_many(embeddings)
+                vectors.update(embeddings)
+
+            if isinstance(query, str):
+                return vectors[keys[0]]
+            return [vectors[key] for key in keys]
+
+        return cached_embedding_function
+
+
+EMBEDDING_CACHE = EmbeddingCache(
+    max_size=config.RAG_EMBEDDING_CACHE_SIZE,
+    ttl=config.RAG_EMBEDDING_CACHE_TTL,
+    use_redis=config.ENABLE_RAG_EMBEDDING_CACHE_REDIS,
+)
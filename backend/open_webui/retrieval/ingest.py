@@ -0,0 +1,303 @@
+import logging
+import threading
+import uuid
+from queue import Empty, Queue
+from typing import Callable, Optional
+
+import redis
+from langchain_core.documents import Document
+
+from open_webui.env import REDIS_URL, SRC_LOG_LEVELS
+from open_webui.retrieval.bm25 import BM25_INDEXES
+from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class IngestJobStore:
+    """
+    Per-file status of batch ingestion jobs, kept in Redis so that a job that
+    was interrupted can be resumed by id without redoing finished files.
+    """
+
+    KEY_PREFIX = "ingest:job:"
+
+    def __init__(self, ttl: int = 24 * 60 * 60):
+        self.redis = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+        self.ttl = ttl
+
+    def create(self, collection_name: str, file_ids: list[str]) -> str:
+        job_id = str(uuid.uuid4())
+        key = self.KEY_PREFIX + job_id
+        pipe = self.redis.pipeline()
+        pipe.hset(
+            key,
+            mapping={
+                "collection_name": collection_name,
+                **{f"file:{file_id}": "pending" for file_id in file_ids},
+            },
+        )
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        data = self.redis.hgetall(self.KEY_PREFIX + job_id)
+        if not data:
+            return None
+        return {
+            "id": job_id,
+            "collection_name": data.get("collection_name"),
+            "files": {
+                key.removeprefix("file:"): status
+                for key, status in data.items()
+                if key.startswith("file:")
+            },
+        }
+
+    def set_status(self, job_id: str, file_id: str, status: str):
+        key = self.KEY_PREFIX + job_id
+        pipe = self.redis.pipeline()
+        pipe.hset(key, f"file:{file_id}", status)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+
+INGEST_JOBS = IngestJobStore()
+
+
+DONE = object()
+
+
+class IngestionPipeline:
+    """
+    Loads, splits, embeds and stores the documents of many files at once.
+
+    Stages run in their own threads and are connected by bounded queues, so a
+    slow stage holds back the ones before it instead of everything piling up
+    in memory:
+
+        loaders (N) -> splitter -> embedders (M) -> writer (calling thread)
+
+    The splitter packs chunks from different files into embedding batches,
+    and up to M batches are embedded concurrently. Vector DB writes and
+    progress callbacks happen on the calling thread.
+
+    `on_progress(file_id, status, error)` is called with status "processing"
+    once a file is split, then "completed" or "failed". Chunks of files that
+    fail half way are removed from the collection again.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        load: Callable[[str], list[Document]],
+        split: Callable[[list[Document]], list[Document]],
+        embedding_function,
+        on_progress: Optional[Callable[[str, str, Optional[str]], None]] = None,
+        loader_workers: int = 4,
+        embedding_workers: int = 4,
+        batch_size: int = 64,
+        queue_size: int = 16,
+    ):
+        self.collection_name = collection_name
+        self.load = load
+        self.split = split
+        self.embedding_function = embedding_function
+        self.on_progress = on_progress
+
+        self.loader_workers = max(loader_workers, 1)
+        self.embedding_workers = max(embedding_workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.queue_size = queue_size
+
+    def _loader(self, file_ids: Queue, docs: Queue, results: Queue):
+        while True:
+            try:
+                file_id = file_ids.get_nowait()
+            except Empty:
+                break
+
+            try:
+                docs.put((file_id, self.load(file_id)))
+            except Exception as e:
+                log.exception(f"Error loading file {file_id}: {e}")
+                results.put(("failed", file_id, str(e)))
+
+        docs.put(DONE)
+
+    def _splitter(self, docs: Queue, batches: Queue, results: Queue):
+        batch = []
+        remaining_loaders = self.loader_workers
+
+        while remaining_loaders:
+            try:
+                item = docs.get(timeout=0.5)
+            except Empty:
+                # Don't hold a partial batch back while loaders are busy
+                if batch:
+                    batches.put(batch)
+                    batch = []
+                continue
+
+            if item is DONE:
+                remaining_loaders -= 1
+                continue
+
+            file_id, file_docs = item
+            try:
+                chunks = self.split(file_docs)
+                if not chunks:
+                    raise ValueError("No content to embed")
+            except Exception as e:
+                log.exception(f"Error splitting file {file_id}: {e}")
+                results.put(("failed", file_id, str(e)))
+                continue
+
+            # Sent ahead of the chunks, so the writer knows when a file is done
+            results.put(("split", file_id, len(chunks)))
+            for chunk in chunks:
+                batch.append((file_id, chunk))
+                if len(batch) >= self.batch_size:
+                    batches.put(batch)
+                    batch = []
+
+        if batch:
+            batches.put(batch)
+        for _ in range(self.embedding_workers):
+            batches.put(DONE)
+
+    def _embedder(self, batches: Queue, results: Queue):
+        while True:
+            batch = batches.get()
+            if batch is DONE:
+                results.put(("done", None, None))
+                return
+
+            try:
+                embeddings = self.embedding_function(
+                    [chunk.page_content.replace("\n", " ") for _, chunk in batch]
+                )
+                if embeddings is None or len(embeddings) != len(batch):
+                    raise ValueError("Embedding failed")
+                results.put(("embedded", batch, embeddings))
+            except Exception as e:
+                log.exception(f"Error embedding batch: {e}")
+                results.put(("embedding_failed", batch, str(e)))
+
+    def _progress(self, file_id: str, status: str, error: Optional[str] = None):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(file_id, status, error)
+        except Exception as e:
+            log.warning(f"Error reporting ingestion progress: {e}")
+
+    def _write(self, items: list[dict]):
+        VECTOR_DB_CLIENT.insert(collection_name=self.collection_name, items=items)
+        BM25_INDEXES.add(self.collection_name, items)
+
+    def _discard(self, file_id: str):
+        try:
+            VECTOR_DB_CLIENT.delete(
+                collection_name=self.collection_name, filter={"file_id": file_id}
+            )
+            BM25_INDEXES.delete(self.collection_name, filter={"file_id": file_id})
+        except Exception as e:
+            log.warning(f"Error removing chunks of failed file {file_id}: {e}")
+
+    def run(self, file_ids: list[str]) -> dict[str, Optional[str]]:
+        """Returns the error per file id, None for files that were stored."""
+        if not file_ids:
+            return {}
+
+        file_queue = Queue()
+        for file_id in file_ids:
+            file_queue.put(file_id)
+
+        docs = Queue(maxsize=self.queue_size)
+        batches = Queue(maxsize=self.queue_size)
+        results = Queue(maxsize=self.queue_size)
+
+        threads = [
+            threading.Thread(
+                target=self._loader, args=(file_queue, docs, results), daemon=True
+            )
+            for _ in range(self.loader_workers)
+        ]
+        threads.append(
+            threading.Thread(
+                target=self._splitter, args=(docs, batches, results), daemon=True
+            )
+        )
+        threads.extend(
+            threading.Thread(
+                target=self._embedder, args=(batches, results), daemon=True
+            )
+            for _ in range(self.embedding_workers)
+        )
+        for thread in threads:
+            thread.start()
+
+        remaining: dict[str, int] = {}
+        written: set[str] = set()
+        outcomes: dict[str, Optional[str]] = {}
+
+        def fail(file_id: str, error: str):
+            if file_id not in outcomes:
+                outcomes[file_id] = error
+                self._progress(file_id, "failed", error)
+
+        remaining_embedders = self.embedding_workers
+        while remaining_embedders:
+            kind, payload, value = results.get()
+
+            if kind == "done":
+                remaining_embedders -= 1
+            elif kind == "failed":
+                fail(payload, value)
+            elif kind == "split":
+                remaining[payload] = value
+                self._progress(payload, "processing")
+            elif kind == "embedding_failed":
+                for file_id, _ in payload:
+                    fail(file_id, value)
+            elif kind == "embedded":
+                items = [
+                    {
+                        "id": str(uuid.uuid4()),
+                        "text": chunk.page_content,
+                        "vector": embedding,
+                        "metadata": chunk.metadata,
+                    }
+                    for (file_id, chunk), embedding in zip(payload, value)
+                    if file_id not in outcomes
+                ]
+
+                try:
+                    if items:
+                        self._write(items)
+                except Exception as e:
+                    log.exception(f"Error writing to {self.collection_name}: {e}")
+                    for file_id, _ in payload:
+                        fail(file_id, str(e))
+                    continue
+
+                for file_id, _ in payload:
+                    if file_id in outcomes:
+                        continue
+                    written.add(file_id)
+                    remaining[file_id] -= 1
+                    if remaining[file_id] == 0:
+                        outcomes[file_id] = None
+                        self._progress(file_id, "completed")
+
+        for thread in threads:
+            thread.join()
+
+        for file_id, error in outcomes.items():
+            if error is not None and file_id in written:
+                self._discard(file_id)
+
+        return {file_id: outcomes.get(file_id) for file_id in file_ids}
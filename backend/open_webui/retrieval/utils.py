@@ -5,20 +5,27 @@ from typing import Optional, Union
 
 import asyncio
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
 from huggingface_hub import snapshot_download
 from langchain.retrievers import ContextualCompressionRetriever, EnsembleRetriever
-from langchain_community.retrievers import BM25Retriever
 from langchain_core.documents import Document
 
+from open_webui.retrieval.bm25 import BM25_INDEXES
+from open_webui.retrieval.embedding_cache import EMBEDDING_CACHE
 from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
 from open_webui.utils.misc import get_last_user_message
 
+from open_webui.config import config
 from open_webui.env import SRC_LOG_LEVELS, OFFLINE_MODE
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
 
+RETRIEVAL_EXECUTOR = ThreadPoolExecutor(
+    max_workers=config.RAG_RETRIEVAL_MAX_WORKERS, thread_name_prefix="retrieval"
+)
+
 
 from typing import Any
 
@@ -58,6 +65,23 @@ class VectorSearchRetriever(BaseRetriever):
         return results
 
 
+class BM25IndexRetriever(BaseRetriever):
+    index: Any
+    top_k: int
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        # Copy metadata, the reranker annotates it with scores
+        return [
+            Document(metadata={**(metadata or {})}, page_content=text)
+            for text, metadata, _ in self.index.search(query, self.top_k)
+        ]
+
+
 def query_doc(
     collection_name: str,
     query_embedding: list[float],
@@ -98,8 +122,8 @@ def query_doc_with_hybrid_search(
             "query_doc_with_hybrid_search for collection: "
             + f"{collection_name} and query {query} with k {k}"
         )
-        result = VECTOR_DB_CLIENT.get(collection_name=collection_name)
-        if result is None:
+        index = BM25_INDEXES.get(collection_name)
+        if index is None:
             log.error(
                 f"Error in query_doc_with_hybrid_search collection {collection_name} does not exist in the vector database."  # noqa: E501
             )
@@ -107,11 +131,7 @@ def query_doc_with_hybrid_search(
                 f"Collection {collection_name} does not exist in the vector database."
             )
 
-        bm25_retriever = BM25Retriever.from_texts(
-            texts=result.documents[0],
-            metadatas=result.metadatas[0],
-        )
-        bm25_retriever.k = k
+        bm25_retriever = BM25IndexRetriever(index=index, top_k=k)
 
         vector_search_retriever = VectorSearchRetriever(
             collection_name=collection_name,
@@ -199,23 +219,29 @@ def query_collection(
     embedding_function,
     k: int,
 ) -> dict:
-    results = []
-    for query in queries:
-        query_embedding = embedding_function(query)
-        for collection_name in collection_names:
-            if collection_name:
-                try:
-                    result = query_doc(
-                        collection_name=collection_name,
-                        k=k,
-                        query_embedding=query_embedding,
-                    )
-                    if result is not None:
-                        results.append(result.model_dump())
-                except Exception as e:
-                    log.exception(f"Error when querying the collection: {e}")
-            else:
-                pass
+    embedding_function = get_cached_embedding_function(embedding_function, queries)
+    query_embeddings = [embedding_function(query) for query in queries]
+
+    def search(job):
+        collection_name, query_embedding = job
+        try:
+            result = query_doc(
+                collection_name=collection_name,
+                k=k,
+                query_embedding=query_embedding,
+            )
+            if result is not None:
+                return result.model_dump()
+        except Exception as e:
+            log.exception(f"Error when querying the collection: {e}")
+
+    jobs = [
+        (collection_name, query_embedding)
+        for query_embedding in query_embeddings
+        for collection_name in collection_names
+        if collection_name
+    ]
+    results = [result for result in RETRIEVAL_EXECUTOR.map(search, jobs) if result]
 
     return merge_and_sort_query_results(results, k=k)
 
@@ -228,27 +254,32 @@ def query_collection_with_hybrid_search(
     reranking_function,
     r: float,
 ) -> dict:
-    results = []
-    error = False
-    for collection_name in collection_names:
+    embedding_function = get_cached_embedding_function(embedding_function, queries)
+
+    def search(job):
+        collection_name, query = job
         try:
-            for query in queries:
-                result = query_doc_with_hybrid_search(
-                    collection_name=collection_name,
-                    query=query,
-                    embedding_function=embedding_function,
-                    k=k,
-                    reranking_function=reranking_function,
-                    r=r,
-                )
-                results.append(result)
+            return query_doc_with_hybrid_search(
+                collection_name=collection_name,
+                query=query,
+                embedding_function=embedding_function,
+                k=k,
+                reranking_function=reranking_function,
+                r=r,
+            )
         except Exception as e:
             log.exception(
                 "Error when querying the collection with " f"hybrid_search: {e}"
             )
-            error = True
 
-    if error:
+    jobs = [
+        (collection_name, query)
+        for collection_name in collection_names
+        for query in queries
+    ]
+    results = list(RETRIEVAL_EXECUTOR.map(search, jobs))
+
+    if any(result is None for result in results):
         raise Exception(
             "Hybrid search failed for all collections. Using Non hybrid search as fallback."
         )
@@ -256,6 +287,37 @@ def query_collection_with_hybrid_search(
     return merge_and_sort_query_results(results, k=k, reverse=True)
 
 
+def embed_queries(queries: list[str], embedding_function) -> list:
+    """Embeds all queries in one batched call where the engine allows it."""
+    embeddings = embedding_function(queries) if queries else []
+    if embeddings is None or len(embeddings) != len(queries):
+        embeddings = [embedding_function(query) for query in queries]
+    return embeddings
+
+
+def get_cached_embedding_function(embedding_function, queries: list[str]):
+    """
+    Wraps `embedding_function` so that `queries` are embedded up front in one
+    batch and looked up afterwards; any other text is embedded as before.
+    """
+    if getattr(embedding_function, "embeddings", None) is not None:
+        return embedding_function
+
+    try:
+        embeddings = dict(zip(queries, embed_queries(queries, embedding_function)))
+    except Exception as e:
+        log.exception(f"Error when embedding queries: {e}")
+        return embedding_function
+
+    def cached_embedding_function(query):
+        if isinstance(query, str) and query in embeddings:
+            return embeddings[query]
+        return embedding_function(query)
+
+    cached_embedding_function.embeddings = embeddings
+    return cached_embedding_function
+
+
 def get_embedding_function(
     embedding_engine,
     embedding_model,
@@ -263,7 +325,23 @@ def get_embedding_function(
     url,
     key,
     embedding_batch_size,
+    cache: bool = False,
 ):
+    if cache:
+        # Queries repeat a lot, e.g. RerankCompressor re-embeds the query
+        return EMBEDDING_CACHE.wrap(
+            embedding_engine,
+            embedding_model,
+            get_embedding_function(
+                embedding_engine,
+                embedding_model,
+                embedding_function,
+                url,
+                key,
+                embedding_batch_size,
+            ),
+        )
+
     if embedding_engine == "":
         return lambda query: embedding_function.encode(query).tolist()
     elif embedding_engine in ["ollama", "openai"]:
@@ -301,6 +379,37 @@ def get_sources_from_files(
     extracted_collections = []
     relevant_contexts = []
 
+    def query_collections(collection_names):
+        context = None
+        try:
+            if hybrid_search:
+                try:
+                    context = query_collection_with_hybrid_search(
+                        collection_names=collection_names,
+                        queries=queries,
+                        embedding_function=embedding_function,
+                        k=k,
+                        reranking_function=reranking_function,
+                        r=r,
+                    )
+                except Exception as e:
+                    log.debug(
+                        "Error when using hybrid search, using"
+                        " non hybrid search as fallback."
+                    )
+
+            if (not hybrid_search) or (context is None):
+                context = query_collection(
+                    collection_names=collection_names,
+                    queries=queries,
+                    embedding_function=embedding_function,
+                    k=k,
+                )
+        except Exception as e:
+            log.exception(e)
+        return context
+
+    pending = []
     for file in files:
         if file.get("context") == "full":
             context = {
@@ -329,43 +438,35 @@ def get_sources_from_files(
                 log.debug(f"skipping {file} as it has already been extracted")
                 continue
 
-            try:
-                context = None
-                if file.get("type") == "text":
-                    context = file["content"]
-                else:
-                    if hybrid_search:
-                        try:
-                            context = query_collection_with_hybrid_search(
-                                collection_names=collection_names,
-                                queries=queries,
-                                embedding_function=embedding_function,
-                                k=k,
-                                reranking_function=reranking_function,
-                                r=r,
-                            )
-                        except Exception as e:
-                            log.debug(
-                                "Error when using hybrid search, using"
-                                " non hybrid search as fallback."
-                            )
-
-                    if (not hybrid_search) or (context is None):
-                        context = query_collection(
-                            collection_names=collection_names,
-                            queries=queries,
-                            embedding_function=embedding_function,
-                            k=k,
-                        )
-            except Exception as e:
-                log.exception(e)
+            if file.get("type") == "text":
+                context = file["content"]
+            else:
+                pending.append((len(relevant_contexts), collection_names))
 
             extracted_collections.extend(collection_names)
 
-        if context:
-            if "data" in file:
-                del file["data"]
-            relevant_contexts.append({**context, "file": file})
+        relevant_contexts.append([file, context])
+
+    # Files are searched concurrently; the searches themselves share
+    # RETRIEVAL_EXECUTOR, which bounds the load on the vector DB
+    if pending:
+        # Embed the queries once for every collection searched
+        embedding_function = get_cached_embedding_function(embedding_function, queries)
+
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            contexts = executor.map(
+                query_collections,
+                [collection_names for _, collection_names in pending],
+            )
+            for (idx, _), context in zip(pending, contexts):
+                relevant_contexts[idx][1] = context
+
+    relevant_contexts = [
+        {**context, "file": file} for file, context in relevant_contexts if context
+    ]
+    for context in relevant_contexts:
+        if "data" in context["file"]:
+            del context["file"]["data"]
 
     sources = []
     for context in relevant_contexts:
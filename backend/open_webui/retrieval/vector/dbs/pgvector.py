@@ -1,21 +1,22 @@
 import contextlib
+import hashlib
 import logging
+import math
+import time
 from typing import Optional, List, Dict, Any
 from sqlalchemy import (
-    cast,
-    column,
+    BigInteger,
     create_engine,
     Column,
     Integer,
+    PrimaryKeyConstraint,
     select,
     text,
     Text,
-    values,
 )
-from sqlalchemy.sql import true
 
 from sqlalchemy.orm import declarative_base, Session, sessionmaker
-from sqlalchemy.dialects.postgresql import JSONB, array
+from sqlalchemy.dialects.postgresql import JSONB, insert
 from pgvector.sqlalchemy import Vector
 from sqlalchemy.ext.mutable import MutableDict
 
@@ -27,21 +28,62 @@ log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
 
 
-VECTOR_LENGTH = 1536
+# Length all vectors were padded to before collections had their own dimensions
+LEGACY_VECTOR_LENGTH = 1536
+# Most dimensions hnsw and ivfflat indexes support on the vector type
+MAX_INDEX_DIMENSIONS = 2000
+INDEX_TYPES = ("hnsw", "ivfflat")
 Base = declarative_base()
 
 
 class DocumentChunk(Base):
     __tablename__ = "document_chunk"
-
-    id = Column(Text, primary_key=True)
-    vector = Column(Vector(dim=VECTOR_LENGTH), nullable=True)
+    __table_args__ = (
+        PrimaryKeyConstraint("collection_name", "id"),
+        # A partition per collection, so searches and their index stay in it
+        {"postgresql_partition_by": "LIST (collection_name)"},
+    )
+
+    id = Column(Text, nullable=False)
+    # No fixed dimensions, each collection has those of its embedding model
+    vector = Column(Vector(), nullable=True)
     collection_name = Column(Text, nullable=False)
     text = Column(Text, nullable=True)
     vmetadata = Column(MutableDict.as_mutable(JSONB), nullable=True)
 
 
+class DocumentChunkCollection(Base):
+    __tablename__ = "document_chunk_collection"
+
+    collection_name = Column(Text, primary_key=True)
+    table_name = Column(Text, nullable=False)
+    dimensions = Column(Integer, nullable=False)
+    # The ANN index built on the partition, none while it's searched exactly
+    index_type = Column(Text, nullable=True)
+    index_params = Column(JSONB, nullable=True)
+    created_at = Column(BigInteger, nullable=False)
+
+
+def get_ivfflat_lists(rows: int) -> int:
+    # As recommended by pgvector
+    return max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+
+
+def to_vector_literal(vector: List[float]) -> str:
+    return "[" + ",".join(str(float(value)) for value in vector) + "]"
+
+
 class PgvectorClient:
+    """
+    Chunks are stored in `document_chunk`, partitioned by collection. Each
+    collection keeps the dimensions of its first vectors and gets an hnsw or
+    ivfflat index (`PGVECTOR_INDEX_TYPE`) once it has
+    `PGVECTOR_INDEX_MIN_ROWS` chunks; smaller ones are searched exactly.
+
+    Indexes keep the parameters they were built with, `reindex` rebuilds them
+    with the current settings and `evaluate` measures their recall.
+    """
+
     def __init__(self) -> None:
 
         # if no pgvector uri, use the existing database connection
@@ -61,27 +103,75 @@ class PgvectorClient:
                 # Ensure the pgvector extension is available
                 session.execute(text("CREATE EXTENSION IF NOT EXISTS vector;"))
 
-                # Create the tables if they do not exist
-                Base.metadata.create_all(bind=session.connection())
-
-                # Create an index on the vector column if it doesn't exist
+                # Workers starting together set up the tables one at a time
                 session.execute(
-                    text(
-                        "CREATE INDEX IF NOT EXISTS idx_document_chunk_vector "
-                        "ON document_chunk USING ivfflat (vector vector_cosine_ops) WITH (lists = 100);"
-                    )
+                    text("SELECT pg_advisory_xact_lock(hashtext('document_chunk'))")
                 )
-                session.execute(
-                    text(
-                        "CREATE INDEX IF NOT EXISTS idx_document_chunk_collection_name "
-                        "ON document_chunk (collection_name);"
-                    )
+
+                # Before collections were partitioned, all chunks were in one table
+                legacy = (
+                    session.execute(
+                        text(
+                            "SELECT relkind FROM pg_class "
+                            "WHERE oid = to_regclass('document_chunk')"
+                        )
+                    ).scalar()
+                    == "r"
                 )
+                if legacy:
+                    session.execute(
+                        text("DROP INDEX IF EXISTS idx_document_chunk_vector")
+                    )
+                    session.execute(
+                        text("DROP INDEX IF EXISTS idx_document_chunk_collection_name")
+                    )
+                    session.execute(
+                        text(
+                            "ALTER TABLE document_chunk RENAME TO document_chunk_legacy"
+                        )
+                    )
+                    session.execute(
+                        text(
+                            "ALTER INDEX IF EXISTS document_chunk_pkey "
+                            "RENAME TO document_chunk_legacy_pkey"
+                        )
+                    )
+
+                # Create the tables if they do not exist
+                Base.metadata.create_all(bind=session.connection())
+
+                if legacy:
+                    self._migrate_legacy_table(session)
                 log.info("Initialization complete.")
         except Exception as e:
             log.error(e, stack_info=True, exc_info=True)
             raise
 
+    def _migrate_legacy_table(self, session: Session) -> None:
+        collection_names = (
+            session.execute(
+                text("SELECT DISTINCT collection_name FROM document_chunk_legacy")
+            )
+            .scalars()
+            .all()
+        )
+        for collection_name in collection_names:
+            collection = self._create_collection(
+                session, collection_name, LEGACY_VECTOR_LENGTH
+            )
+            session.execute(
+                text(
+                    f'INSERT INTO "{collection.table_name}" '
+                    "(id, vector, collection_name, text, vmetadata) "
+                    "SELECT id, vector, collection_name, text, vmetadata "
+                    "FROM document_chunk_legacy WHERE collection_name = :collection_name"
+                ),
+                {"collection_name": collection_name},
+            )
+            self._update_index(session, collection)
+        session.execute(text("DROP TABLE document_chunk_legacy"))
+        log.info(f"Moved {len(collection_names)} collections to their own partitions.")
+
     @contextlib.contextmanager
     def get_session(self) -> Session:
         """Manage session in context manager to ensure liefcycle is handled correctly"""
@@ -96,62 +186,247 @@ class PgvectorClient:
         finally:
             session.close()
 
-    def adjust_vector_length(self, vector: List[float]) -> List[float]:
-        # Adjust vector to have length VECTOR_LENGTH
+    @staticmethod
+    def get_table_name(collection_name: str) -> str:
+        # Collection names can be longer than identifiers, or need quoting
+        return (
+            "document_chunk_"
+            + hashlib.sha256(collection_name.encode()).hexdigest()[:32]
+        )
+
+    def _get_collection(
+        self, session: Session, collection_name: str
+    ) -> Optional[DocumentChunkCollection]:
+        return session.get(DocumentChunkCollection, collection_name)
+
+    def _create_collection(
+        self, session: Session, collection_name: str, dimensions: int
+    ) -> DocumentChunkCollection:
+        # Serializes the creation of the same collection by concurrent inserts
+        session.execute(
+            text("SELECT pg_advisory_xact_lock(hashtext(:collection_name))"),
+            {"collection_name": collection_name},
+        )
+        collection = session.get(
+            DocumentChunkCollection, collection_name, populate_existing=True
+        )
+        if collection is not None:
+            return collection
+
+        table_name = self.get_table_name(collection_name)
+        # Partition bounds can't be bound parameters
+        value = collection_name.replace("'", "''").replace(":", "\\:")
+        session.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS "{table_name}" '
+                f"PARTITION OF document_chunk FOR VALUES IN ('{value}')"
+            )
+        )
+        collection = DocumentChunkCollection(
+            collection_name=collection_name,
+            table_name=table_name,
+            dimensions=dimensions,
+            created_at=int(time.time()),
+        )
+        session.add(collection)
+        session.flush()
+        log.debug(
+            f"Created collection '{collection_name}' with {dimensions} dimensions."
+        )
+        return collection
+
+    def _get_or_create_collection(
+        self, session: Session, collection_name: str, items: List[VectorItem]
+    ) -> DocumentChunkCollection:
+        return self._get_collection(
+            session, collection_name
+        ) or self._create_collection(session, collection_name, len(items[0]["vector"]))
+
+    def _drop_collection(self, session: Session, collection_name: str) -> None:
+        collection = self._get_collection(session, collection_name)
+        if collection is not None:
+            session.execute(text(f'DROP TABLE IF EXISTS "{collection.table_name}"'))
+            session.delete(collection)
+
+    @staticmethod
+    def _get_vector_expression(collection: DocumentChunkCollection) -> str:
+        # The column has no dimensions, the index is on the typed expression
+        return f"vector::vector({collection.dimensions})"
+
+    def _update_index(self, session: Session, collection: DocumentChunkCollection):
+        """Builds the collection's index once it has enough chunks."""
+        if collection.index_type or config.PGVECTOR_INDEX_TYPE not in INDEX_TYPES:
+            return
+
+        rows = session.execute(
+            text(
+                f'SELECT count(*) FROM (SELECT 1 FROM "{collection.table_name}" '
+                "LIMIT :min_rows) AS chunks"
+            ),
+            {"min_rows": config.PGVECTOR_INDEX_MIN_ROWS},
+        ).scalar()
+        if rows >= config.PGVECTOR_INDEX_MIN_ROWS:
+            self._create_index(session, collection)
+
+    def _create_index(self, session: Session, collection: DocumentChunkCollection):
+        if collection.dimensions > MAX_INDEX_DIMENSIONS:
+            log.warning(
+                f"Collection '{collection.collection_name}' has {collection.dimensions} "
+                f"dimensions, more than can be indexed; it is searched exactly."
+            )
+            return
+
+        index_type = config.PGVECTOR_INDEX_TYPE
+        if index_type == "hnsw":
+            index_params = {
+                "m": config.PGVECTOR_HNSW_M,
+                "ef_construction": config.PGVECTOR_HNSW_EF_CONSTRUCTION,
+            }
+        else:
+            lists = config.PGVECTOR_IVFFLAT_LISTS
+            if not lists:
+                lists = get_ivfflat_lists(
+                    session.execute(
+                        text(f'SELECT count(*) FROM "{collection.table_name}"')
+                    ).scalar()
+                )
+            index_params = {"lists": lists}
+
+        start = time.perf_counter()
+        session.execute(
+            text(
+                f'CREATE INDEX IF NOT EXISTS "{collection.table_name}_vector_idx" '
+                f'ON "{collection.table_name}" USING {index_type} '
+                f"(({self._get_vector_expression(collection)}) vector_cosine_ops) "
+                "WITH ("
+                + ", ".join(
+                    f"{key} = {int(value)}" for key, value in index_params.items()
+                )
+                + ")"
+            )
+        )
+        collection.index_type = index_type
+        collection.index_params = index_params
+        log.info(
+            f"Built {index_type} index {index_params} for collection "
+            f"'{collection.collection_name}' in {time.perf_counter() - start:.2f}s."
+        )
+
+    def _set_search_params(
+        self,
+        session: Session,
+        collection: DocumentChunkCollection,
+        limit: Optional[int],
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ):
+        # Only for the transaction of the search
+        if collection.index_type == "hnsw":
+            # Less candidates than the limit would return less results
+            ef_search = max(ef_search or config.PGVECTOR_HNSW_EF_SEARCH, limit or 0)
+            session.execute(
+                text(f"SET LOCAL hnsw.ef_search = {min(int(ef_search), 1000)}")
+            )
+        elif collection.index_type == "ivfflat":
+            probes = probes or config.PGVECTOR_IVFFLAT_PROBES
+            session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+
+    def _get_search_statement(
+        self,
+        collection: DocumentChunkCollection,
+        num_queries: int,
+        limit: Optional[int],
+    ):
+        vector = self._get_vector_expression(collection)
+        query_vectors = ", ".join(
+            f"({idx}, CAST(:vector_{idx} AS vector({collection.dimensions})))"
+            for idx in range(num_queries)
+        )
+        # A lateral subquery per query vector, each ordered by the index
+        return text(
+            f"""
+            SELECT query_vectors.qid, result.id, result.text, result.vmetadata, result.distance
+            FROM (VALUES {query_vectors}) AS query_vectors (qid, q_vector)
+            JOIN LATERAL (
+                SELECT id, text, vmetadata, {vector} <=> query_vectors.q_vector AS distance
+                FROM "{collection.table_name}"
+                ORDER BY {vector} <=> query_vectors.q_vector
+                {"LIMIT :limit" if limit is not None else ""}
+            ) AS result ON true
+            ORDER BY query_vectors.qid, result.distance
+            """
+        )
+
+    def adjust_vector_length(self, vector: List[float], dimensions: int) -> List[float]:
+        # Adjust vector to have length of the collection's vectors
         current_length = len(vector)
-        if current_length < VECTOR_LENGTH:
-            # Pad the vector with zeros
-            vector += [0.0] * (VECTOR_LENGTH - current_length)
-        elif current_length > VECTOR_LENGTH:
+        if current_length < dimensions:
+            # Pad the vector with zeros, as collections moved from the single
+            # table still have all vectors padded to its length
+            vector = vector + [0.0] * (dimensions - current_length)
+        elif current_length > dimensions:
             raise Exception(
-                f"Vector length {current_length} not supported. Max length must be <= {VECTOR_LENGTH}"
+                f"Vector length {current_length} not supported. Max length must be <= {dimensions}"
             )
         return vector
 
     def insert(self, collection_name: str, items: List[VectorItem]) -> None:
-        new_items = []
-        for item in items:
-            vector = self.adjust_vector_length(item["vector"])
-            new_chunk = DocumentChunk(
-                id=item["id"],
-                vector=vector,
-                collection_name=collection_name,
-                text=item["text"],
-                vmetadata=item["metadata"],
-            )
-            new_items.append(new_chunk)
+        if not items:
+            return
+
         with self.get_session() as session:
+            collection = self._get_or_create_collection(session, collection_name, items)
+            new_items = []
+            for item in items:
+                vector = self.adjust_vector_length(
+                    item["vector"], collection.dimensions
+                )
+                new_chunk = DocumentChunk(
+                    id=item["id"],
+                    vector=vector,
+                    collection_name=collection_name,
+                    text=item["text"],
+                    vmetadata=item["metadata"],
+                )
+                new_items.append(new_chunk)
             session.bulk_save_objects(new_items)
+            self._update_index(session, collection)
 
         log.debug(
             f"Inserted {len(new_items)} items into collection '{collection_name}'."
         )
 
     def upsert(self, collection_name: str, items: List[VectorItem]) -> None:
+        if not items:
+            return
+
         with self.get_session() as session:
-            for item in items:
-                vector = self.adjust_vector_length(item["vector"])
-                existing = (
-                    session.query(DocumentChunk)
-                    .filter(DocumentChunk.id == item["id"])
-                    .first()
+            collection = self._get_or_create_collection(session, collection_name, items)
+            stmt = insert(DocumentChunk).values(
+                [
+                    {
+                        "id": item["id"],
+                        "vector": self.adjust_vector_length(
+                            item["vector"], collection.dimensions
+                        ),
+                        "collection_name": collection_name,
+                        "text": item["text"],
+                        "vmetadata": item["metadata"],
+                    }
+                    for item in items
+                ]
+            )
+            session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["collection_name", "id"],
+                    set_={
+                        "vector": stmt.excluded.vector,
+                        "text": stmt.excluded.text,
+                        "vmetadata": stmt.excluded.vmetadata,
+                    },
                 )
-                if existing:
-                    existing.vector = vector
-                    existing.text = item["text"]
-                    existing.vmetadata = item["metadata"]
-                    existing.collection_name = (
-                        collection_name  # Update collection_name if necessary
-                    )
-                else:
-                    new_chunk = DocumentChunk(
-                        id=item["id"],
-                        vector=vector,
-                        collection_name=collection_name,
-                        text=item["text"],
-                        vmetadata=item["metadata"],
-                    )
-                    session.add(new_chunk)
+            )
+            self._update_index(session, collection)
             log.debug(
                 f"Upserted {len(items)} items into collection '{collection_name}'."
             )
@@ -165,61 +440,30 @@ class PgvectorClient:
         if not vectors:
             return None
 
-        # Adjust query vectors to VECTOR_LENGTH
-        vectors = [self.adjust_vector_length(vector) for vector in vectors]
         num_queries = len(vectors)
-
-        def vector_expr(vector):
-            return cast(array(vector), Vector(VECTOR_LENGTH))
-
-        # Create the values for query vectors
-        qid_col = column("qid", Integer)
-        q_vector_col = column("q_vector", Vector(VECTOR_LENGTH))
-        query_vectors = (
-            values(qid_col, q_vector_col)
-            .data([(idx, vector_expr(vector)) for idx, vector in enumerate(vectors)])
-            .alias("query_vectors")
-        )
-
-        # Build the lateral subquery for each query vector
-        subq = (
-            select(
-                DocumentChunk.id,
-                DocumentChunk.text,
-                DocumentChunk.vmetadata,
-                (DocumentChunk.vector.cosine_distance(query_vectors.c.q_vector)).label(
-                    "distance"
-                ),
-            )
-            .where(DocumentChunk.collection_name == collection_name)
-            .order_by((DocumentChunk.vector.cosine_distance(query_vectors.c.q_vector)))
-        )
-        if limit is not None:
-            subq = subq.limit(limit)
-        subq = subq.lateral("result")
-
-        # Build the main query by joining query_vectors and the lateral subquery
-        stmt = (
-            select(
-                query_vectors.c.qid,
-                subq.c.id,
-                subq.c.text,
-                subq.c.vmetadata,
-                subq.c.distance,
-            )
-            .select_from(query_vectors)
-            .join(subq, true())
-            .order_by(query_vectors.c.qid, subq.c.distance)
-        )
-        with self.get_session() as session:
-            result_proxy = session.execute(stmt)
-            results = result_proxy.all()
-
         ids = [[] for _ in range(num_queries)]
         distances = [[] for _ in range(num_queries)]
         documents = [[] for _ in range(num_queries)]
         metadatas = [[] for _ in range(num_queries)]
 
+        with self.get_session() as session:
+            collection = self._get_collection(session, collection_name)
+            if collection is None:
+                results = []
+            else:
+                self._set_search_params(session, collection, limit)
+                params = {
+                    f"vector_{idx}": to_vector_literal(
+                        self.adjust_vector_length(vector, collection.dimensions)
+                    )
+                    for idx, vector in enumerate(vectors)
+                }
+                if limit is not None:
+                    params["limit"] = limit
+                results = session.execute(
+                    self._get_search_statement(collection, num_queries, limit), params
+                ).all()
+
         if not results:
             return SearchResult(
                 ids=ids,
@@ -311,9 +555,15 @@ class PgvectorClient:
 
     def reset(self) -> None:
         with self.get_session() as session:
-            deleted = session.query(DocumentChunk).delete()
+            collection_names = (
+                session.execute(select(DocumentChunkCollection.collection_name))
+                .scalars()
+                .all()
+            )
+            for collection_name in collection_names:
+                self._drop_collection(session, collection_name)
         log.debug(
-            f"Reset complete. Deleted {deleted} items from 'document_chunk' table."
+            f"Reset complete. Dropped {len(collection_names)} collections from 'document_chunk' table."
         )
 
     def close(self) -> None:
@@ -330,5 +580,116 @@ class PgvectorClient:
             return exists
 
     def delete_collection(self, collection_name: str) -> None:
-        self.delete(collection_name)
+        # Dropping the partition is faster than deleting its rows
+        with self.get_session() as session:
+            self._drop_collection(session, collection_name)
         log.debug(f"Collection '{collection_name}' deleted.")
+
+    def reindex(self, collection_name: Optional[str] = None) -> List[dict]:
+        """
+        Rebuilds the index of the collection, or of all of them, with the
+        current settings.
+        """
+        if collection_name is None:
+            with self.get_session() as session:
+                collection_names = (
+                    session.execute(select(DocumentChunkCollection.collection_name))
+                    .scalars()
+                    .all()
+                )
+        else:
+            collection_names = [collection_name]
+
+        collections = []
+        # A transaction per collection, only its partition is locked meanwhile
+        for collection_name in collection_names:
+            with self.get_session() as session:
+                collection = self._get_collection(session, collection_name)
+                if collection is None:
+                    continue
+
+                session.execute(
+                    text(f'DROP INDEX IF EXISTS "{collection.table_name}_vector_idx"')
+                )
+                collection.index_type = None
+                collection.index_params = None
+                self._update_index(session, collection)
+                collections.append(
+                    {
+                        "collection_name": collection.collection_name,
+                        "dimensions": collection.dimensions,
+                        "index_type": collection.index_type,
+                        "index_params": collection.index_params,
+                    }
+                )
+        return collections
+
+    def evaluate(
+        self,
+        collection_name: str,
+        sample_size: int = 20,
+        limit: int = 10,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None,
+    ) -> Optional[dict]:
+        """
+        Measures the recall and latency of searches through the collection's
+        index against exact searches, querying with a sample of its chunks.
+        """
+        with self.get_session() as session:
+            collection = self._get_collection(session, collection_name)
+            if collection is None:
+                return None
+
+            queries = (
+                session.execute(
+                    text(
+                        f'SELECT vector::text FROM "{collection.table_name}" '
+                        "WHERE vector IS NOT NULL ORDER BY random() LIMIT :sample_size"
+                    ),
+                    {"sample_size": sample_size},
+                )
+                .scalars()
+                .all()
+            )
+            statement = self._get_search_statement(collection, 1, limit)
+
+            def run_searches() -> tuple[list[set], list[float]]:
+                results, latencies = [], []
+                for vector in queries:
+                    start = time.perf_counter()
+                    rows = session.execute(
+                        statement, {"vector_0": vector, "limit": limit}
+                    ).all()
+                    latencies.append(time.perf_counter() - start)
+                    results.append({row.id for row in rows})
+                return results, latencies
+
+            self._set_search_params(session, collection, limit, ef_search, probes)
+            results, latencies = run_searches()
+            # Without index scans the search is exact
+            session.execute(text("SET LOCAL enable_indexscan = off"))
+            exact_results, exact_latencies = run_searches()
+
+        recalls = [
+            len(result & exact_result) / len(exact_result)
+            for result, exact_result in zip(results, exact_results)
+            if exact_result
+        ]
+        return {
+            "collection_name": collection.collection_name,
+            "dimensions": collection.dimensions,
+            "index_type": collection.index_type,
+            "index_params": collection.index_params,
+            "queries": len(queries),
+            "limit": limit,
+            "recall": sum(recalls) / len(recalls) if recalls else None,
+            "latency_ms": (
+                1000 * sum(latencies) / len(latencies) if latencies else None
+            ),
+            "exact_latency_ms": (
+                1000 * sum(exact_latencies) / len(exact_latencies)
+                if exact_latencies
+                else None
+            ),
+        }
@@ -1,11 +1,17 @@
+import asyncio
+import codecs
+import os
 import socket
+import threading
+import time
 import urllib.parse
 import validators
-from typing import Union, Sequence, Iterator
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Optional, Union, Sequence, Iterator
 
-from langchain_community.document_loaders import (
-    WebBaseLoader,
-)
+import aiohttp
+from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document
 
 
@@ -18,6 +24,8 @@ import logging
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
 
+USER_AGENT = os.environ.get("USER_AGENT", "Mozilla/5.0 (compatible; Open WebUI)")
+
 
 def validate_url(url: Union[str, Sequence[str]]):
     if isinstance(url, str):
@@ -54,31 +62,231 @@ def resolve_hostname(hostname):
     return ipv4_addresses, ipv6_addresses
 
 
-class SafeWebBaseLoader(WebBaseLoader):
-    """WebBaseLoader with enhanced error handling for URLs."""
+class HTMLTextExtractor(HTMLParser):
+    """
+    Incremental HTML to text conversion, fed chunk by chunk as the page is
+    downloaded. Also picks up the title, description and language metadata.
+    """
 
-    def lazy_load(self) -> Iterator[Document]:
-        """Lazy load text from the url(s) in web_path with error handling."""
-        for path in self.web_paths:
+    SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg"}
+    BLOCK_TAGS = {
+        "title",
+        "p",
+        "div",
+        "br",
+        "li",
+        "tr",
+        "section",
+        "article",
+        "header",
+        "footer",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "pre",
+        "blockquote",
+    }
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts: list[str] = []
+        self.skip_depth = 0
+        self.in_title = False
+        self.title: Optional[str] = None
+        self.description: Optional[str] = None
+        self.language: Optional[str] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIPPED_TAGS:
+            self.skip_depth += 1
+        elif tag == "title":
+            self.in_title = True
+        elif tag == "meta":
+            attrs = dict(attrs)
+            if attrs.get("name", "").lower() == "description" and not self.description:
+                self.description = attrs.get("content") or "No description found."
+        elif tag == "html":
+            self.language = dict(attrs).get("lang") or "No language found."
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIPPED_TAGS:
+            self.skip_depth = max(self.skip_depth - 1, 0)
+        elif tag == "title":
+            self.in_title = False
+
+        if tag in self.BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.in_title:
+            self.title = (self.title or "") + data
+        self.parts.append(data)
+
+    def get_text(self) -> str:
+        lines = (line.strip() for line in "".join(self.parts).splitlines())
+        return "\n".join(line for line in lines if line)
+
+
+class WebContentCache:
+    """
+    Short-lived cache of loaded pages, keyed by URL. Shared by loaders running
+    in different threads, so access is locked.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Document]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[Document]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            expires_at, doc = entry
+            if expires_at < time.monotonic():
+                self._entries.pop(url, None)
+                return None
+            self._entries.move_to_end(url)
+        return Document(page_content=doc.page_content, metadata={**doc.metadata})
+
+    def set(self, url: str, doc: Document):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[url] = (time.monotonic() + self.ttl, doc)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+WEB_CONTENT_CACHE = WebContentCache(
+    max_size=config.RAG_WEB_LOADER_CACHE_SIZE, ttl=config.RAG_WEB_LOADER_CACHE_TTL
+)
+
+
+class SafeWebBaseLoader(BaseLoader):
+    """
+    Fetches the url(s) concurrently with aiohttp, skipping those that fail.
+
+    At most `concurrency` pages are downloaded at once and at most
+    `per_host_concurrency` from the same host. Bodies are converted to text as
+    they stream in and cut off after `max_response_size` bytes.
+    """
+
+    def __init__(
+        self,
+        web_paths: Sequence[str],
+        verify_ssl: bool = True,
+        concurrency: int = 10,
+        per_host_concurrency: int = 2,
+        timeout: int = 10,
+        max_response_size: int = 5 * 1024 * 1024,
+    ):
+        self.web_paths = list(web_paths)
+        self.verify_ssl = verify_ssl
+        self.concurrency = max(concurrency, 1)
+        self.per_host_concurrency = max(per_host_concurrency, 1)
+        self.timeout = timeout
+        self.max_response_size = max_response_size
+
+    async def _fetch(self, session: aiohttp.ClientSession, path: str) -> Document:
+        async with session.get(path, ssl=None if self.verify_ssl else False) as r:
+            r.raise_for_status()
+
+            content_type = r.headers.get("Content-Type", "").lower()
+            is_html = (
+                not content_type or "html" in content_type or "xml" in content_type
+            )
+            if not is_html and not content_type.startswith("text/"):
+                raise ValueError(f"Unsupported content type {content_type}")
+
+            decoder = codecs.getincrementaldecoder(r.charset or "utf-8")(
+                errors="replace"
+            )
+            extractor = HTMLTextExtractor()
+            parts = []
+            size = 0
+
+            async for chunk in r.content.iter_chunked(64 * 1024):
+                size += len(chunk)
+                if size > self.max_response_size:
+                    log.warning(f"Truncating {path} at {self.max_response_size} bytes")
+                    chunk = chunk[: len(chunk) - (size - self.max_response_size)]
+
+                text = decoder.decode(chunk)
+                if is_html:
+                    extractor.feed(text)
+                else:
+                    parts.append(text)
+
+                if size >= self.max_response_size:
+                    break
+
+            text = decoder.decode(b"", final=True)
+            if not is_html:
+                return Document(
+                    page_content="".join(parts) + text, metadata={"source": path}
+                )
+
+            extractor.feed(text)
+            extractor.close()
+
+            metadata = {"source": path}
+            if extractor.title is not None:
+                metadata["title"] = extractor.title.strip()
+            if extractor.description is not None:
+                metadata["description"] = extractor.description
+            if extractor.language is not None:
+                metadata["language"] = extractor.language
+
+            return Document(page_content=extractor.get_text(), metadata=metadata)
+
+    async def aload(self) -> list[Document]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        host_semaphores: dict[str, asyncio.Semaphore] = {}
+
+        async def load_path(session, path: str) -> Optional[Document]:
+            doc = WEB_CONTENT_CACHE.get(path)
+            if doc is not None:
+                return doc
+
+            host = urllib.parse.urlparse(path).netloc
+            host_semaphore = host_semaphores.setdefault(
+                host, asyncio.Semaphore(self.per_host_concurrency)
+            )
             try:
-                soup = self._scrape(path, bs_kwargs=self.bs_kwargs)
-                text = soup.get_text(**self.bs_get_text_kwargs)
-
-                # Build metadata
-                metadata = {"source": path}
-                if title := soup.find("title"):
-                    metadata["title"] = title.get_text()
-                if description := soup.find("meta", attrs={"name": "description"}):
-                    metadata["description"] = description.get(
-                        "content", "No description found."
-                    )
-                if html := soup.find("html"):
-                    metadata["language"] = html.get("lang", "No language found.")
-
-                yield Document(page_content=text, metadata=metadata)
+                async with semaphore, host_semaphore:
+                    doc = await self._fetch(session, path)
             except Exception as e:
                 # Log the error and continue with the next URL
                 log.error(f"Error loading {path}: {e}")
+                return None
+
+            WEB_CONTENT_CACHE.set(path, doc)
+            return doc
+
+        async with aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"User-Agent": USER_AGENT},
+            trust_env=True,
+        ) as session:
+            docs = await asyncio.gather(
+                *[load_path(session, path) for path in self.web_paths]
+            )
+
+        return [doc for doc in docs if doc is not None]
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Lazy load text from the url(s) in web_path with error handling."""
+        # Called from worker threads, which have no event loop of their own
+        yield from asyncio.run(self.aload())
 
 
 def get_web_loader(
@@ -90,8 +298,10 @@ def get_web_loader(
     if not validate_url(urls):
         raise ValueError(ERROR_MESSAGES.INVALID_URL)
     return SafeWebBaseLoader(
-        urls,
+        [urls] if isinstance(urls, str) else urls,
         verify_ssl=verify_ssl,
-        requests_per_second=requests_per_second,
-        continue_on_failure=True,
+        concurrency=requests_per_second,
+        per_host_concurrency=config.RAG_WEB_LOADER_PER_HOST_CONCURRENCY,
+        timeout=config.RAG_WEB_LOADER_TIMEOUT,
+        max_response_size=config.RAG_WEB_LOADER_MAX_RESPONSE_SIZE,
     )
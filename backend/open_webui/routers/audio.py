@@ -1,15 +1,15 @@
 import hashlib
+import io
 import json
 import logging
 import os
 import uuid
 from functools import lru_cache
 from pathlib import Path
+from typing import AsyncIterator
 from pydub import AudioSegment
 from pydub.silence import split_on_silence
 
-import aiohttp
-import aiofiles
 import requests
 
 from fastapi import (
@@ -23,11 +23,19 @@ from fastapi import (
     APIRouter,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 
 from open_webui.utils.auth import get_admin_user, get_verified_user
+from open_webui.utils.sessions import CLIENT_SESSIONS
+from open_webui.utils.speech_cache import SpeechCache
+from open_webui.utils.transcription import (
+    TRANSCRIPT_CACHE,
+    TRANSCRIPTION_POOL,
+    TranscriptionQueueFull,
+)
 from open_webui.config import (
     CACHE_DIR,
     config,
@@ -37,7 +45,6 @@ from open_webui.constants import ERROR_MESSAGES
 from open_webui.env import (
     ENV,
     SRC_LOG_LEVELS,
-    DEVICE_TYPE,
     ENABLE_FORWARD_USER_INFO_HEADERS,
 )
 
@@ -54,6 +61,13 @@ log.setLevel(SRC_LOG_LEVELS["AUDIO"])
 SPEECH_CACHE_DIR = Path(CACHE_DIR).joinpath("./audio/speech/")
 SPEECH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
+SPEECH_CACHE = SpeechCache(
+    SPEECH_CACHE_DIR,
+    max_size=config.AUDIO_SPEECH_CACHE_MAX_SIZE * 1024 * 1024,
+    max_age=config.AUDIO_SPEECH_CACHE_MAX_AGE,
+    use_s3=config.ENABLE_AUDIO_SPEECH_CACHE_S3,
+)
+
 
 ##########################################
 #
@@ -88,30 +102,6 @@ def convert_mp4_to_wav(file_path, output_path):
     print(f"Converted {file_path} to {output_path}")
 
 
-def set_faster_whisper_model(model: str, auto_update: bool = False):
-    whisper_model = None
-    if model:
-        from faster_whisper import WhisperModel
-
-        faster_whisper_kwargs = {
-            "model_size_or_path": model,
-            "device": DEVICE_TYPE if DEVICE_TYPE and DEVICE_TYPE == "cuda" else "cpu",
-            "compute_type": "int8",
-            "download_root": config.WHISPER_MODEL_DIR,
-            "local_files_only": not auto_update,
-        }
-
-        try:
-            whisper_model = WhisperModel(**faster_whisper_kwargs)
-        except Exception:
-            log.warning(
-                "WhisperModel initialization failed, attempting download with local_files_only=False"
-            )
-            faster_whisper_kwargs["local_files_only"] = False
-            whisper_model = WhisperModel(**faster_whisper_kwargs)
-    return whisper_model
-
-
 ##########################################
 #
 # Audio API
@@ -191,9 +181,12 @@ async def update_audio_config(
     request.app.state.config.WHISPER_MODEL = form_data.stt.WHISPER_MODEL
 
     if request.app.state.config.STT_ENGINE == "":
-        request.app.state.faster_whisper_model = set_faster_whisper_model(
+        # Start the workers with the new model
+        TRANSCRIPTION_POOL.get_executor(
             form_data.stt.WHISPER_MODEL, config.WHISPER_MODEL_AUTO_UPDATE
         )
+    else:
+        TRANSCRIPTION_POOL.shutdown()
 
     return {
         "tts": {
@@ -232,6 +225,70 @@ def load_speech_pipeline(request):
         )
 
 
+async def stream_tts_response(url: str, **kwargs) -> AsyncIterator[bytes]:
+    """
+    Streams the audio of a TTS request. Errors are raised as HTTPException
+    before any audio is yielded.
+    """
+    try:
+        r = await CLIENT_SESSIONS.get(url).post(url, **kwargs)
+    except Exception as e:
+        log.exception(e)
+        raise HTTPException(
+            status_code=500, detail="Open WebUI: Server Connection Error"
+        )
+
+    try:
+        if r.status != 200:
+            detail = None
+            try:
+                res = await r.json()
+                if "error" in res:
+                    detail = f"External: {res['error'].get('message', '')}"
+            except Exception as e:
+                detail = f"External: {e}"
+
+            raise HTTPException(
+                status_code=r.status,
+                detail=detail if detail else "Open WebUI: Server Connection Error",
+            )
+
+        async for chunk in r.content.iter_any():
+            yield chunk
+    finally:
+        r.close()
+
+
+def synthesize_transformers(request: Request, payload: dict) -> bytes:
+    import torch
+    import soundfile as sf
+
+    load_speech_pipeline(request)
+
+    embeddings_dataset = request.app.state.speech_speaker_embeddings_dataset
+
+    speaker_index = 6799
+    try:
+        speaker_index = embeddings_dataset["filename"].index(
+            request.app.state.config.TTS_MODEL
+        )
+    except Exception:
+        pass
+
+    speaker_embedding = torch.tensor(
+        embeddings_dataset[speaker_index]["xvector"]
+    ).unsqueeze(0)
+
+    speech = request.app.state.speech_synthesiser(
+        payload["input"],
+        forward_params={"speaker_embeddings": speaker_embedding},
+    )
+
+    buffer = io.BytesIO()
+    sf.write(buffer, speech["audio"], samplerate=speech["sampling_rate"], format="MP3")
+    return buffer.getvalue()
+
+
 @router.post("/speech")
 async def speech(request: Request, user=Depends(get_verified_user)):
     body = await request.body()
@@ -241,12 +298,10 @@ async def speech(request: Request, user=Depends(get_verified_user)):
         + str(request.app.state.config.TTS_MODEL).encode("utf-8")
     ).hexdigest()
 
-    file_path = SPEECH_CACHE_DIR.joinpath(f"{name}.mp3")
-    file_body_path = SPEECH_CACHE_DIR.joinpath(f"{name}.json")
-
     # Check if the file already exists in the cache
-    if file_path.is_file():
-        return FileResponse(file_path)
+    response = SPEECH_CACHE.get_cached_response(name)
+    if response is not None:
+        return response
 
     payload = None
     try:
@@ -258,53 +313,24 @@ async def speech(request: Request, user=Depends(get_verified_user)):
     if request.app.state.config.TTS_ENGINE == "openai":
         payload["model"] = request.app.state.config.TTS_MODEL
 
-        try:
-            # print(payload)
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    url=f"{request.app.state.config.TTS_OPENAI_API_BASE_URL}/audio/speech",
-                    json=payload,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {request.app.state.config.TTS_OPENAI_API_KEY}",
-                        **(
-                            {
-                                "X-OpenWebUI-User-Name": user.name,
-                                "X-OpenWebUI-User-Id": user.id,
-                                "X-OpenWebUI-User-Email": user.email,
-                                "X-OpenWebUI-User-Role": user.role,
-                            }
-                            if ENABLE_FORWARD_USER_INFO_HEADERS
-                            else {}
-                        ),
-                    },
-                ) as r:
-                    r.raise_for_status()
-
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(await r.read())
-
-                    async with aiofiles.open(file_body_path, "w") as f:
-                        await f.write(json.dumps(payload))
-
-            return FileResponse(file_path)
-
-        except Exception as e:
-            log.exception(e)
-            detail = None
-
-            try:
-                if r.status != 200:
-                    res = await r.json()
-
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-            except Exception:
-                detail = f"External: {e}"
-
-            raise HTTPException(
-                status_code=getattr(r, "status", 500),
-                detail=detail if detail else "Open WebUI: Server Connection Error",
+        def synthesize():
+            return stream_tts_response(
+                f"{request.app.state.config.TTS_OPENAI_API_BASE_URL}/audio/speech",
+                json=payload,
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {request.app.state.config.TTS_OPENAI_API_KEY}",
+                    **(
+                        {
+                            "X-OpenWebUI-User-Name": user.name,
+                            "X-OpenWebUI-User-Id": user.id,
+                            "X-OpenWebUI-User-Email": user.email,
+                            "X-OpenWebUI-User-Role": user.role,
+                        }
+                        if ENABLE_FORWARD_USER_INFO_HEADERS
+                        else {}
+                    ),
+                },
             )
 
     elif request.app.state.config.TTS_ENGINE == "elevenlabs":
@@ -316,214 +342,159 @@ async def speech(request: Request, user=Depends(get_verified_user)):
                 detail="Invalid voice id",
             )
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}",
-                    json={
-                        "text": payload["input"],
-                        "model_id": request.app.state.config.TTS_MODEL,
-                        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
-                    },
-                    headers={
-                        "Accept": "audio/mpeg",
-                        "Content-Type": "application/json",
-                        "xi-api-key": request.app.state.config.TTS_API_KEY,
-                    },
-                ) as r:
-                    r.raise_for_status()
-
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(await r.read())
-
-                    async with aiofiles.open(file_body_path, "w") as f:
-                        await f.write(json.dumps(payload))
-
-            return FileResponse(file_path)
-
-        except Exception as e:
-            log.exception(e)
-            detail = None
-
-            try:
-                if r.status != 200:
-                    res = await r.json()
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-            except Exception:
-                detail = f"External: {e}"
-
-            raise HTTPException(
-                status_code=getattr(r, "status", 500),
-                detail=detail if detail else "Open WebUI: Server Connection Error",
+        def synthesize():
+            return stream_tts_response(
+                f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}",
+                json={
+                    "text": payload["input"],
+                    "model_id": request.app.state.config.TTS_MODEL,
+                    "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
+                },
+                headers={
+                    "Accept": "audio/mpeg",
+                    "Content-Type": "application/json",
+                    "xi-api-key": request.app.state.config.TTS_API_KEY,
+                },
             )
 
     elif request.app.state.config.TTS_ENGINE == "azure":
-        try:
-            payload = json.loads(body.decode("utf-8"))
-        except Exception as e:
-            log.exception(e)
-            raise HTTPException(status_code=400, detail="Invalid JSON payload")
-
         region = request.app.state.config.TTS_AZURE_SPEECH_REGION
         language = request.app.state.config.TTS_VOICE
         locale = "-".join(request.app.state.config.TTS_VOICE.split("-")[:1])
         output_format = request.app.state.config.TTS_AZURE_SPEECH_OUTPUT_FORMAT
 
-        try:
-            data = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{locale}">
+        data = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{locale}">
                 <voice name="{language}">{payload["input"]}</voice>
             </speak>"""
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"https://{region}.tts.speech.microsoft.com/cognitiveservices/v1",
-                    headers={
-                        "Ocp-Apim-Subscription-Key": request.app.state.config.TTS_API_KEY,
-                        "Content-Type": "application/ssml+xml",
-                        "X-Microsoft-OutputFormat": output_format,
-                    },
-                    data=data,
-                ) as r:
-                    r.raise_for_status()
-
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(await r.read())
-
-                    async with aiofiles.open(file_body_path, "w") as f:
-                        await f.write(json.dumps(payload))
-
-                    return FileResponse(file_path)
-
-        except Exception as e:
-            log.exception(e)
-            detail = None
 
-            try:
-                if r.status != 200:
-                    res = await r.json()
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-            except Exception:
-                detail = f"External: {e}"
-
-            raise HTTPException(
-                status_code=getattr(r, "status", 500),
-                detail=detail if detail else "Open WebUI: Server Connection Error",
+        def synthesize():
+            return stream_tts_response(
+                f"https://{region}.tts.speech.microsoft.com/cognitiveservices/v1",
+                headers={
+                    "Ocp-Apim-Subscription-Key": request.app.state.config.TTS_API_KEY,
+                    "Content-Type": "application/ssml+xml",
+                    "X-Microsoft-OutputFormat": output_format,
+                },
+                data=data,
             )
 
     elif request.app.state.config.TTS_ENGINE == "transformers":
-        payload = None
-        try:
-            payload = json.loads(body.decode("utf-8"))
-        except Exception as e:
-            log.exception(e)
-            raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
-        import torch
-        import soundfile as sf
+        async def synthesize():
+            yield await run_in_threadpool(synthesize_transformers, request, payload)
 
-        load_speech_pipeline(request)
+    else:
+        return None
 
-        embeddings_dataset = request.app.state.speech_speaker_embeddings_dataset
+    return await SPEECH_CACHE.get_response(name, synthesize, payload)
 
-        speaker_index = 6799
-        try:
-            speaker_index = embeddings_dataset["filename"].index(
-                request.app.state.config.TTS_MODEL
-            )
-        except Exception:
-            pass
 
-        speaker_embedding = torch.tensor(
-            embeddings_dataset[speaker_index]["xvector"]
-        ).unsqueeze(0)
+@router.get("/speech/cache")
+async def get_speech_cache_stats(user=Depends(get_admin_user)):
+    return SPEECH_CACHE.stats()
+
 
-        speech = request.app.state.speech_synthesiser(
-            payload["input"],
-            forward_params={"speaker_embeddings": speaker_embedding},
+def transcribe_openai(request: Request, file_path) -> dict:
+    filename = os.path.basename(file_path)
+    if is_mp4_audio(file_path):
+        os.rename(file_path, file_path.replace(".wav", ".mp4"))
+        # Convert MP4 audio file to WAV format
+        convert_mp4_to_wav(file_path.replace(".wav", ".mp4"), file_path)
+
+    r = None
+    try:
+        r = requests.post(
+            url=f"{request.app.state.config.STT_OPENAI_API_BASE_URL}/audio/transcriptions",
+            headers={
+                "Authorization": f"Bearer {request.app.state.config.STT_OPENAI_API_KEY}"
+            },
+            files={"file": (filename, open(file_path, "rb"))},
+            data={"model": request.app.state.config.STT_MODEL},
         )
 
-        sf.write(file_path, speech["audio"], samplerate=speech["sampling_rate"])
+        r.raise_for_status()
+        return r.json()
+    except Exception as e:
+        log.exception(e)
 
-        async with aiofiles.open(file_body_path, "w") as f:
-            await f.write(json.dumps(payload))
+        detail = None
+        if r is not None:
+            try:
+                res = r.json()
+                if "error" in res:
+                    detail = f"External: {res['error'].get('message', '')}"
+            except Exception:
+                detail = f"External: {e}"
 
-        return FileResponse(file_path)
+        raise Exception(detail if detail else "Open WebUI: Server Connection Error")
 
 
-def transcribe(request: Request, file_path):
-    print("transcribe", file_path)
-    filename = os.path.basename(file_path)
-    file_dir = os.path.dirname(file_path)
-    id = filename.split(".")[0]
+def transcribe_chunks(request: Request, file_path) -> AsyncIterator[dict]:
+    return TRANSCRIPTION_POOL.transcribe(
+        file_path,
+        request.app.state.config.WHISPER_MODEL,
+        config.WHISPER_MODEL_AUTO_UPDATE,
+    )
 
-    if request.app.state.config.STT_ENGINE == "":
-        if request.app.state.faster_whisper_model is None:
-            request.app.state.faster_whisper_model = set_faster_whisper_model(
-                request.app.state.config.WHISPER_MODEL
-            )
 
-        model = request.app.state.faster_whisper_model
-        segments, info = model.transcribe(file_path, beam_size=5)
-        log.info(
-            "Detected language '%s' with probability %f"
-            % (info.language, info.language_probability)
-        )
+def join_transcripts(texts: list[str]) -> str:
+    return " ".join(text.strip() for text in texts if text.strip())
 
-        transcript = "".join([segment.text for segment in list(segments)])
-        data = {"text": transcript.strip()}
 
-        # save the transcript to a json file
-        transcript_file = f"{file_dir}/{id}.json"
-        with open(transcript_file, "w") as f:
-            json.dump(data, f)
+async def transcribe(request: Request, file_path) -> dict:
+    log.info(f"transcribe {file_path}")
 
-        log.debug(data)
-        return data
+    if request.app.state.config.STT_ENGINE == "":
+        texts = [chunk["text"] async for chunk in transcribe_chunks(request, file_path)]
+        return {"text": join_transcripts(texts)}
     elif request.app.state.config.STT_ENGINE == "openai":
-        if is_mp4_audio(file_path):
-            os.rename(file_path, file_path.replace(".wav", ".mp4"))
-            # Convert MP4 audio file to WAV format
-            convert_mp4_to_wav(file_path.replace(".wav", ".mp4"), file_path)
-
-        r = None
-        try:
-            r = requests.post(
-                url=f"{request.app.state.config.STT_OPENAI_API_BASE_URL}/audio/transcriptions",
-                headers={
-                    "Authorization": f"Bearer {request.app.state.config.STT_OPENAI_API_KEY}"
-                },
-                files={"file": (filename, open(file_path, "rb"))},
-                data={"model": request.app.state.config.STT_MODEL},
-            )
+        file_path = await run_in_threadpool(compress_audio, file_path)
+        return await run_in_threadpool(transcribe_openai, request, file_path)
+    else:
+        raise Exception(
+            f"Unsupported STT engine: {request.app.state.config.STT_ENGINE}"
+        )
 
-            r.raise_for_status()
-            data = r.json()
 
-            # save the transcript to a json file
-            transcript_file = f"{file_dir}/{id}.json"
-            with open(transcript_file, "w") as f:
-                json.dump(data, f)
+def save_transcript(file_path, data: dict, cache_key: str):
+    # save the transcript to a json file
+    transcript_file = f"{os.path.splitext(file_path)[0]}.json"
+    with open(transcript_file, "w") as f:
+        json.dump(data, f)
 
-            return data
-        except Exception as e:
-            log.exception(e)
+    TRANSCRIPT_CACHE.set(cache_key, data)
+    log.debug(data)
 
-            detail = None
-            if r is not None:
-                try:
-                    res = r.json()
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-                except Exception:
-                    detail = f"External: {e}"
 
-            raise Exception(detail if detail else "Open WebUI: Server Connection Error")
+async def stream_transcription(
+    request: Request, file_path, cache_key: str
+) -> AsyncIterator[str]:
+    """
+    Server-sent events with the transcript of each chunk of the audio as it is
+    ready (`{"index", "count", "text"}`), then the whole transcript with
+    `"done": true`, or `{"error"}`.
+    """
+    try:
+        if request.app.state.config.STT_ENGINE == "":
+            texts = []
+            async for chunk in transcribe_chunks(request, file_path):
+                texts.append(chunk["text"])
+                yield f"data: {json.dumps(chunk)}\n\n"
+            data = {"text": join_transcripts(texts)}
+        else:
+            data = await transcribe(request, file_path)
+
+        save_transcript(file_path, data, cache_key)
+        yield f"data: {json.dumps({**data, 'filename': os.path.basename(file_path), 'done': True})}\n\n"
+    except Exception as e:
+        log.exception(e)
+        yield f"data: {json.dumps({'error': ERROR_MESSAGES.DEFAULT(e)})}\n\n"
 
 
 def compress_audio(file_path):
     if os.path.getsize(file_path) > MAX_FILE_SIZE:
         file_dir = os.path.dirname(file_path)
+        id = os.path.splitext(os.path.basename(file_path))[0]
         audio = AudioSegment.from_file(file_path)
         audio = audio.set_frame_rate(16000).set_channels(1)  # Compress audio
         compressed_path = f"{file_dir}/{id}_compressed.opus"
@@ -540,9 +511,10 @@ def compress_audio(file_path):
 
 
 @router.post("/transcriptions")
-def transcription(
+async def transcription(
     request: Request,
     file: UploadFile = File(...),
+    stream: bool = False,
     user=Depends(get_verified_user),
 ):
     log.info(f"file.content_type: {file.content_type}")
@@ -558,7 +530,7 @@ def transcription(
         id = uuid.uuid4()
 
         filename = f"{id}.{ext}"
-        contents = file.file.read()
+        contents = await file.read()
 
         file_dir = f"{CACHE_DIR}/audio/transcriptions"
         os.makedirs(file_dir, exist_ok=True)
@@ -566,29 +538,56 @@ def transcription(
 
         with open(file_path, "wb") as f:
             f.write(contents)
+    except Exception as e:
+        log.exception(e)
 
-        try:
-            try:
-                file_path = compress_audio(file_path)
-            except Exception as e:
-                log.exception(e)
-
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=ERROR_MESSAGES.DEFAULT(e),
-                )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.DEFAULT(e),
+        )
 
-            data = transcribe(request, file_path)
-            file_path = file_path.split("/")[-1]
-            return {**data, "filename": file_path}
-        except Exception as e:
-            log.exception(e)
+    engine = request.app.state.config.STT_ENGINE
+    cache_key = TRANSCRIPT_CACHE.get_key(
+        contents,
+        engine,
+        (
+            request.app.state.config.WHISPER_MODEL
+            if engine == ""
+            else request.app.state.config.STT_MODEL
+        ),
+    )
 
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=ERROR_MESSAGES.DEFAULT(e),
+    data = TRANSCRIPT_CACHE.get(cache_key)
+    if data is not None:
+        data = {**data, "filename": filename}
+        if stream:
+            return StreamingResponse(
+                iter([f"data: {json.dumps({**data, 'done': True})}\n\n"]),
+                media_type="text/event-stream",
             )
+        return data
+
+    if engine == "" and TRANSCRIPTION_POOL.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=ERROR_MESSAGES.TRANSCRIPTION_QUEUE_FULL,
+        )
 
+    if stream:
+        return StreamingResponse(
+            stream_transcription(request, file_path, cache_key),
+            media_type="text/event-stream",
+        )
+
+    try:
+        data = await transcribe(request, file_path)
+        save_transcript(file_path, data, cache_key)
+        return {**data, "filename": os.path.basename(file_path)}
+    except TranscriptionQueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=ERROR_MESSAGES.TRANSCRIPTION_QUEUE_FULL,
+        )
     except Exception as e:
         log.exception(e)
 
@@ -598,6 +597,11 @@ def transcription(
         )
 
 
+@router.get("/transcriptions/stats")
+async def get_transcription_stats(user=Depends(get_admin_user)):
+    return TRANSCRIPTION_POOL.stats()
+
+
 def get_available_models(request: Request) -> list[dict]:
     available_models = []
     if request.app.state.config.TTS_ENGINE == "openai":
@@ -143,9 +143,35 @@ class MessageUserResponse(MessageResponse):
     user: UserNameResponse
 
 
+def get_message_user_responses(
+    message_list: list[MessageModel], include_replies: bool = True
+) -> list[MessageUserResponse]:
+    users = {
+        user.id: user
+        for user in Users.get_users_by_user_ids(
+            list({message.user_id for message in message_list})
+        )
+    }
+
+    return [
+        MessageUserResponse(
+            **{
+                **message.model_dump(),
+                "user": UserNameResponse(**users[message.user_id].model_dump()),
+            }
+        )
+        for message in Messages.get_message_responses(message_list, include_replies)
+        if message.user_id in users
+    ]
+
+
 @router.get("/{id}/messages", response_model=list[MessageUserResponse])
 async def get_channel_messages(
-    id: str, skip: int = 0, limit: int = 50, user=Depends(get_verified_user)
+    id: str,
+    skip: int = 0,
+    limit: int = 50,
+    before: Optional[int] = None,
+    user=Depends(get_verified_user),
 ):
     channel = Channels.get_channel_by_id(id)
     if not channel:
@@ -160,31 +186,8 @@ async def get_channel_messages(
             status_code=status.HTTP_403_FORBIDDEN, detail=ERROR_MESSAGES.DEFAULT()
         )
 
-    message_list = Messages.get_messages_by_channel_id(id, skip, limit)
-    users = {}
-
-    messages = []
-    for message in message_list:
-        if message.user_id not in users:
-            user = Users.get_user_by_id(message.user_id)
-            users[message.user_id] = user
-
-        replies = Messages.get_replies_by_message_id(message.id)
-        latest_reply_at = replies[0].created_at if replies else None
-
-        messages.append(
-            MessageUserResponse(
-                **{
-                    **message.model_dump(),
-                    "reply_count": len(replies),
-                    "latest_reply_at": latest_reply_at,
-                    "reactions": Messages.get_reactions_by_message_id(message.id),
-                    "user": UserNameResponse(**users[message.user_id].model_dump()),
-                }
-            )
-        )
-
-    return messages
+    message_list = Messages.get_messages_by_channel_id(id, skip, limit, before)
+    return get_message_user_responses(message_list)
 
 
 ############################
@@ -298,7 +301,7 @@ async def post_new_message(
                         to=f"channel:{channel.id}",
                     )
 
-            active_user_ids = get_user_ids_from_room(f"channel:{channel.id}")
+            active_user_ids = await get_user_ids_from_room(f"channel:{channel.id}")
 
             background_tasks.add_task(
                 send_notification,
@@ -372,6 +375,7 @@ async def get_channel_thread_messages(
     message_id: str,
     skip: int = 0,
     limit: int = 50,
+    before: Optional[int] = None,
     user=Depends(get_verified_user),
 ):
     channel = Channels.get_channel_by_id(id)
@@ -387,28 +391,10 @@ async def get_channel_thread_messages(
             status_code=status.HTTP_403_FORBIDDEN, detail=ERROR_MESSAGES.DEFAULT()
         )
 
-    message_list = Messages.get_messages_by_parent_id(id, message_id, skip, limit)
-    users = {}
-
-    messages = []
-    for message in message_list:
-        if message.user_id not in users:
-            user = Users.get_user_by_id(message.user_id)
-            users[message.user_id] = user
-
-        messages.append(
-            MessageUserResponse(
-                **{
-                    **message.model_dump(),
-                    "reply_count": 0,
-                    "latest_reply_at": None,
-                    "reactions": Messages.get_reactions_by_message_id(message.id),
-                    "user": UserNameResponse(**users[message.user_id].model_dump()),
-                }
-            )
-        )
-
-    return messages
+    message_list = Messages.get_messages_by_parent_id(
+        id, message_id, skip, limit, before
+    )
+    return get_message_user_responses(message_list, include_replies=False)
 
 
 ############################
@@ -8,6 +8,7 @@ from open_webui.models.chats import (
     ChatResponse,
     Chats,
     ChatTitleIdResponse,
+    ChatSearchResponse,
 )
 from open_webui.models.tags import TagModel, Tags
 from open_webui.models.folders import Folders
@@ -138,26 +139,32 @@ async def import_chat(form_data: ChatImportForm, user=Depends(get_verified_user)
 ############################
 
 
-@router.get("/search", response_model=list[ChatTitleIdResponse])
+@router.get("/search", response_model=list[ChatSearchResponse])
 async def search_user_chats(
-    text: str, page: Optional[int] = None, user=Depends(get_verified_user)
+    text: str,
+    page: Optional[int] = None,
+    cursor: Optional[str] = None,
+    user=Depends(get_verified_user),
 ):
     if page is None:
         page = 1
 
     limit = 60
-    skip = (page - 1) * limit
+    skip = (page - 1) * limit if cursor is None else 0
 
-    chat_list = [
-        ChatTitleIdResponse(**chat.model_dump())
-        for chat in Chats.get_chats_by_user_id_and_search_text(
-            user.id, text, skip=skip, limit=limit
+    try:
+        chat_list = Chats.get_chats_by_user_id_and_search_text(
+            user.id, text, skip=skip, limit=limit, cursor=cursor
+        )
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.INVALID_CURSOR,
         )
-    ]
 
     # Delete tag if no chat is found
     words = text.strip().split(" ")
-    if page == 1 and len(words) == 1 and words[0].startswith("tag:"):
+    if page == 1 and cursor is None and len(words) == 1 and words[0].startswith("tag:"):
         tag_id = words[0].replace("tag:", "")
         if len(chat_list) == 0:
             if Tags.get_tag_by_name_and_user_id(tag_id, user.id):
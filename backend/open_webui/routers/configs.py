@@ -4,7 +4,7 @@ from pydantic import BaseModel
 from typing import Optional
 
 from open_webui.utils.auth import get_admin_user, get_verified_user
-from open_webui.config import get_config, save_config
+from open_webui.config import config_cache, get_config, save_config
 from open_webui.config import BannerModel
 
 
@@ -36,6 +36,16 @@ async def export_config(user=Depends(get_admin_user)):
     return get_config()
 
 
+############################
+# ConfigCacheStats
+############################
+
+
+@router.get("/cache", response_model=dict)
+async def get_config_cache_stats(user=Depends(get_admin_user)):
+    return config_cache.stats()
+
+
 ############################
 # SetDefaultModels
 ############################
@@ -11,6 +11,7 @@ from open_webui.models.knowledge import (
 )
 from open_webui.models.files import Files, FileModel
 from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
+from open_webui.retrieval.bm25 import BM25_INDEXES
 from open_webui.routers.retrieval import (
     process_file,
     ProcessFileForm,
@@ -363,6 +364,7 @@ def update_file_from_knowledge_by_id(
     VECTOR_DB_CLIENT.delete(
         collection_name=knowledge.id, filter={"file_id": form_data.file_id}
     )
+    BM25_INDEXES.delete(knowledge.id, filter={"file_id": form_data.file_id})
 
     # Add content to the vector database
     try:
@@ -427,6 +429,7 @@ def remove_file_from_knowledge_by_id(
     VECTOR_DB_CLIENT.delete(
         collection_name=knowledge.id, filter={"file_id": form_data.file_id}
     )
+    BM25_INDEXES.delete(knowledge.id, filter={"file_id": form_data.file_id})
 
     if knowledge:
         data = knowledge.data or {}
@@ -484,6 +487,7 @@ async def delete_knowledge_by_id(id: str, user=Depends(get_verified_user)):
 
     try:
         VECTOR_DB_CLIENT.delete_collection(collection_name=id)
+        BM25_INDEXES.delete_collection(id)
     except Exception as e:
         log.debug(e)
         pass
@@ -513,6 +517,7 @@ async def reset_knowledge_by_id(id: str, user=Depends(get_verified_user)):
 
     try:
         VECTOR_DB_CLIENT.delete_collection(collection_name=id)
+        BM25_INDEXES.delete_collection(id)
     except Exception as e:
         log.debug(e)
         pass
@@ -532,10 +537,12 @@ def add_files_to_knowledge_batch(
     request: Request,
     id: str,
     form_data: list[KnowledgeFileIdForm],
+    job_id: Optional[str] = None,
     user=Depends(get_verified_user),
 ):
     """
-    Add multiple files to a knowledge base
+    Add multiple files to a knowledge base. Pass the `job_id` from the
+    `ingest-events` of an interrupted call to resume it.
     """
     knowledge = Knowledges.get_knowledge_by_id(id=id)
     if not knowledge:
@@ -566,7 +573,9 @@ def add_files_to_knowledge_batch(
     try:
         result = process_files_batch(
             request=request,
-            form_data=BatchProcessFilesForm(files=files, collection_name=id),
+            form_data=BatchProcessFilesForm(
+                files=files, collection_name=id, job_id=job_id
+            ),
             user=user,
         )
     except Exception as e:
@@ -4,6 +4,7 @@ import logging
 from typing import Optional
 
 from open_webui.models.memories import Memories, MemoryModel
+from open_webui.retrieval.bm25 import BM25_INDEXES
 from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
 from open_webui.utils.auth import get_verified_user
 from open_webui.env import SRC_LOG_LEVELS
@@ -51,17 +52,16 @@ async def add_memory(
 ):
     memory = Memories.insert_new_memory(user.id, form_data.content)
 
-    VECTOR_DB_CLIENT.upsert(
-        collection_name=f"user-memory-{user.id}",
-        items=[
-            {
-                "id": memory.id,
-                "text": memory.content,
-                "vector": request.app.state.EMBEDDING_FUNCTION(memory.content),
-                "metadata": {"created_at": memory.created_at},
-            }
-        ],
-    )
+    items = [
+        {
+            "id": memory.id,
+            "text": memory.content,
+            "vector": request.app.state.EMBEDDING_FUNCTION(memory.content),
+            "metadata": {"created_at": memory.created_at},
+        }
+    ]
+    VECTOR_DB_CLIENT.upsert(collection_name=f"user-memory-{user.id}", items=items)
+    BM25_INDEXES.add(f"user-memory-{user.id}", items)
 
     return memory
 
@@ -97,23 +97,23 @@ async def reset_memory_from_vector_db(
     request: Request, user=Depends(get_verified_user)
 ):
     VECTOR_DB_CLIENT.delete_collection(f"user-memory-{user.id}")
+    BM25_INDEXES.delete_collection(f"user-memory-{user.id}")
 
     memories = Memories.get_memories_by_user_id(user.id)
-    VECTOR_DB_CLIENT.upsert(
-        collection_name=f"user-memory-{user.id}",
-        items=[
-            {
-                "id": memory.id,
-                "text": memory.content,
-                "vector": request.app.state.EMBEDDING_FUNCTION(memory.content),
-                "metadata": {
-                    "created_at": memory.created_at,
-                    "updated_at": memory.updated_at,
-                },
-            }
-            for memory in memories
-        ],
-    )
+    items = [
+        {
+            "id": memory.id,
+            "text": memory.content,
+            "vector": request.app.state.EMBEDDING_FUNCTION(memory.content),
+            "metadata": {
+                "created_at": memory.created_at,
+                "updated_at": memory.updated_at,
+            },
+        }
+        for memory in memories
+    ]
+    VECTOR_DB_CLIENT.upsert(collection_name=f"user-memory-{user.id}", items=items)
+    BM25_INDEXES.add(f"user-memory-{user.id}", items)
 
     return True
 
@@ -130,6 +130,7 @@ async def delete_memory_by_user_id(user=Depends(get_verified_user)):
     if result:
         try:
             VECTOR_DB_CLIENT.delete_collection(f"user-memory-{user.id}")
+            BM25_INDEXES.delete_collection(f"user-memory-{user.id}")
         except Exception as e:
             log.error(e)
         return True
@@ -154,20 +155,19 @@ async def update_memory_by_id(
         raise HTTPException(status_code=404, detail="Memory not found")
 
     if form_data.content is not None:
-        VECTOR_DB_CLIENT.upsert(
-            collection_name=f"user-memory-{user.id}",
-            items=[
-                {
-                    "id": memory.id,
-                    "text": memory.content,
-                    "vector": request.app.state.EMBEDDING_FUNCTION(memory.content),
-                    "metadata": {
-                        "created_at": memory.created_at,
-                        "updated_at": memory.updated_at,
-                    },
-                }
-            ],
-        )
+        items = [
+            {
+                "id": memory.id,
+                "text": memory.content,
+                "vector": request.app.state.EMBEDDING_FUNCTION(memory.content),
+                "metadata": {
+                    "created_at": memory.created_at,
+                    "updated_at": memory.updated_at,
+                },
+            }
+        ]
+        VECTOR_DB_CLIENT.upsert(collection_name=f"user-memory-{user.id}", items=items)
+        BM25_INDEXES.add(f"user-memory-{user.id}", items)
 
     return memory
 
@@ -185,6 +185,7 @@ async def delete_memory_by_id(memory_id: str, user=Depends(get_verified_user)):
         VECTOR_DB_CLIENT.delete(
             collection_name=f"user-memory-{user.id}", ids=[memory_id]
         )
+        BM25_INDEXES.delete(f"user-memory-{user.id}", ids=[memory_id])
         return True
 
     return False
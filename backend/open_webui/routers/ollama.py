@@ -1,12 +1,7 @@
-# TODO: Implement a more intelligent load balancing mechanism for distributing requests among multiple backend instances.
-# Current implementation uses a simple round-robin approach (random.choice). Consider incorporating algorithms like weighted round-robin,
-# least connections, or least response time for better resource utilization and performance optimization.
-
 import asyncio
 import json
 import logging
 import os
-import random
 import re
 import time
 from typing import Optional, Union
@@ -32,7 +27,7 @@ from pydantic import BaseModel, ConfigDict
 from starlette.background import BackgroundTask
 
 
-from open_webui.models.models import Models
+from open_webui.models.models import MODEL_LIST_VERSION, Models
 from open_webui.utils.misc import (
     calculate_sha256,
 )
@@ -42,7 +37,9 @@ from open_webui.utils.payload import (
     apply_model_system_prompt_to_body,
 )
 from open_webui.utils.auth import get_admin_user, get_verified_user
-from open_webui.utils.access_control import has_access
+from open_webui.utils.access_control import has_access, has_access_many
+from open_webui.utils.sessions import CLIENT_SESSIONS
+from open_webui.utils.upstreams import OLLAMA_UPSTREAMS, UpstreamRequest
 
 
 from open_webui.config import (
@@ -71,11 +68,12 @@ log.setLevel(SRC_LOG_LEVELS["OLLAMA"])
 async def send_get_request(url, key=None):
     timeout = aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT_OPENAI_MODEL_LIST)
     try:
-        async with aiohttp.ClientSession(timeout=timeout, trust_env=True) as session:
-            async with session.get(
-                url, headers={**({"Authorization": f"Bearer {key}"} if key else {})}
-            ) as response:
-                return await response.json()
+        async with CLIENT_SESSIONS.get(url).get(
+            url,
+            headers={**({"Authorization": f"Bearer {key}"} if key else {})},
+            timeout=timeout,
+        ) as response:
+            return await response.json()
     except Exception as e:
         # Handle connection error here
         log.error(f"Connection error: {e}")
@@ -85,11 +83,30 @@ async def send_get_request(url, key=None):
 async def cleanup_response(
     response: Optional[aiohttp.ClientResponse],
     session: Optional[aiohttp.ClientSession],
+    upstream_request: Optional[UpstreamRequest] = None,
 ):
     if response:
         response.close()
     if session:
         await session.close()
+    if upstream_request:
+        upstream_request.release()
+
+
+class CleanupStreamingResponse(StreamingResponse):
+    """
+    Streaming response running its background task however the stream ends.
+    Starlette skips it when sending fails, e.g. when the upstream connection
+    drops partway through the body.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        background, self.background = self.background, None
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if background is not None:
+                await background()
 
 
 async def send_post_request(
@@ -98,22 +115,27 @@ async def send_post_request(
     stream: bool = True,
     key: Optional[str] = None,
     content_type: Optional[str] = None,
+    upstream: Optional[str] = None,
 ):
+    """
+    Pass the base URL the request was routed to as `upstream` to count it
+    towards the upstream's load, latency and health (see `get_ollama_url`).
+    """
 
     r = None
+    upstream_request = OLLAMA_UPSTREAMS.start(upstream) if upstream else None
     try:
-        session = aiohttp.ClientSession(
-            trust_env=True, timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
-        )
-
-        r = await session.post(
+        r = await CLIENT_SESSIONS.get(url).post(
             url,
             data=payload,
             headers={
                 "Content-Type": "application/json",
                 **({"Authorization": f"Bearer {key}"} if key else {}),
             },
+            timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT),
         )
+        if upstream_request:
+            upstream_request.responded(r.status)
         r.raise_for_status()
 
         if stream:
@@ -122,21 +144,27 @@ async def send_post_request(
             if content_type:
                 response_headers["Content-Type"] = content_type
 
-            return StreamingResponse(
+            return CleanupStreamingResponse(
                 r.content,
                 status_code=r.status,
                 headers=response_headers,
                 background=BackgroundTask(
-                    cleanup_response, response=r, session=session
+                    cleanup_response,
+                    response=r,
+                    session=None,
+                    upstream_request=upstream_request,
                 ),
             )
         else:
             res = await r.json()
-            await cleanup_response(r, session)
+            await cleanup_response(r, None, upstream_request)
             return res
 
     except Exception as e:
         detail = None
+        if upstream_request:
+            upstream_request.failed()
+            upstream_request.release()
 
         if r is not None:
             try:
@@ -145,6 +173,7 @@ async def send_post_request(
                     detail = f"Ollama: {res.get('error', 'Unknown error')}"
             except Exception:
                 detail = f"Ollama: {e}"
+            r.close()
 
         raise HTTPException(
             status_code=r.status if r else 500,
@@ -327,15 +356,16 @@ async def get_all_models(request: Request):
 
 async def get_filtered_models(models, user):
     # Filter models based on user access control
-    filtered_models = []
-    for model in models.get("models", []):
-        model_info = Models.get_model_by_id(model["model"])
-        if model_info:
-            if user.id == model_info.user_id or has_access(
-                user.id, type="read", access_control=model_info.access_control
-            ):
-                filtered_models.append(model)
-    return filtered_models
+    models = models.get("models", [])
+    accessible_model_ids = {
+        model_info.id
+        for model_info in has_access_many(
+            user.id,
+            Models.get_models_by_ids([model["model"] for model in models]),
+            "read",
+        )
+    }
+    return [model for model in models if model["model"] in accessible_model_ids]
 
 
 @router.get("/api/tags")
@@ -467,6 +497,12 @@ async def get_ollama_loaded_models(request: Request, user=Depends(get_verified_u
         return {}
 
 
+@router.get("/upstreams")
+async def get_upstreams(user=Depends(get_admin_user)):
+    """Load, latency and health of each upstream as seen by this worker."""
+    return OLLAMA_UPSTREAMS.stats()
+
+
 class ModelNameForm(BaseModel):
     name: str
 
@@ -592,6 +628,7 @@ async def copy_model(
             data=form_data.model_dump_json(exclude_none=True).encode(),
         )
         r.raise_for_status()
+        MODEL_LIST_VERSION.bump()
 
         log.debug(f"r.text: {r.text}")
         return True
@@ -647,6 +684,7 @@ async def delete_model(
             },
         )
         r.raise_for_status()
+        MODEL_LIST_VERSION.bump()
 
         log.debug(f"r.text: {r.text}")
         return True
@@ -673,17 +711,8 @@ async def show_model_info(
     request: Request, form_data: ModelNameForm, user=Depends(get_verified_user)
 ):
     await get_all_models(request)
-    models = request.app.state.OLLAMA_MODELS
-
-    if form_data.name not in models:
-        raise HTTPException(
-            status_code=400,
-            detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.name),
-        )
-
-    url_idx = random.choice(models[form_data.name]["urls"])
 
-    url = request.app.state.config.OLLAMA_BASE_URLS[url_idx]
+    url = await get_ollama_url(request, form_data.name)
     key = get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS)
 
     try:
@@ -737,54 +766,20 @@ async def embed(
 
     if url_idx is None:
         await get_all_models(request)
-        models = request.app.state.OLLAMA_MODELS
-
-        model = form_data.model
-
-        if ":" not in model:
-            model = f"{model}:latest"
-
-        if model in models:
-            url_idx = random.choice(models[model]["urls"])
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
-            )
-
-    url = request.app.state.config.OLLAMA_BASE_URLS[url_idx]
-    key = get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS)
 
-    try:
-        r = requests.request(
-            method="POST",
-            url=f"{url}/api/embed",
-            headers={
-                "Content-Type": "application/json",
-                **({"Authorization": f"Bearer {key}"} if key else {}),
-            },
-            data=form_data.model_dump_json(exclude_none=True).encode(),
-        )
-        r.raise_for_status()
+    model = form_data.model
+    if ":" not in model:
+        model = f"{model}:latest"
 
-        data = r.json()
-        return data
-    except Exception as e:
-        log.exception(e)
+    url = await get_ollama_url(request, model, url_idx)
 
-        detail = None
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    detail = f"Ollama: {res['error']}"
-            except Exception:
-                detail = f"Ollama: {e}"
-
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=detail if detail else "Open WebUI: Server Connection Error",
-        )
+    return await send_post_request(
+        url=f"{url}/api/embed",
+        payload=form_data.model_dump_json(exclude_none=True).encode(),
+        stream=False,
+        key=get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS),
+        upstream=url,
+    )
 
 
 class GenerateEmbeddingsForm(BaseModel):
@@ -806,54 +801,20 @@ async def embeddings(
 
     if url_idx is None:
         await get_all_models(request)
-        models = request.app.state.OLLAMA_MODELS
-
-        model = form_data.model
 
-        if ":" not in model:
-            model = f"{model}:latest"
+    model = form_data.model
+    if ":" not in model:
+        model = f"{model}:latest"
 
-        if model in models:
-            url_idx = random.choice(models[model]["urls"])
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
-            )
+    url = await get_ollama_url(request, model, url_idx)
 
-    url = request.app.state.config.OLLAMA_BASE_URLS[url_idx]
-    key = get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS)
-
-    try:
-        r = requests.request(
-            method="POST",
-            url=f"{url}/api/embeddings",
-            headers={
-                "Content-Type": "application/json",
-                **({"Authorization": f"Bearer {key}"} if key else {}),
-            },
-            data=form_data.model_dump_json(exclude_none=True).encode(),
-        )
-        r.raise_for_status()
-
-        data = r.json()
-        return data
-    except Exception as e:
-        log.exception(e)
-
-        detail = None
-        if r is not None:
-            try:
-                res = r.json()
-                if "error" in res:
-                    detail = f"Ollama: {res['error']}"
-            except Exception:
-                detail = f"Ollama: {e}"
-
-        raise HTTPException(
-            status_code=r.status_code if r else 500,
-            detail=detail if detail else "Open WebUI: Server Connection Error",
-        )
+    return await send_post_request(
+        url=f"{url}/api/embeddings",
+        payload=form_data.model_dump_json(exclude_none=True).encode(),
+        stream=False,
+        key=get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS),
+        upstream=url,
+    )
 
 
 class GenerateCompletionForm(BaseModel):
@@ -881,22 +842,12 @@ async def generate_completion(
 ):
     if url_idx is None:
         await get_all_models(request)
-        models = request.app.state.OLLAMA_MODELS
-
-        model = form_data.model
 
-        if ":" not in model:
-            model = f"{model}:latest"
+    model = form_data.model
+    if ":" not in model:
+        model = f"{model}:latest"
 
-        if model in models:
-            url_idx = random.choice(models[model]["urls"])
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail=ERROR_MESSAGES.MODEL_NOT_FOUND(form_data.model),
-            )
-
-    url = request.app.state.config.OLLAMA_BASE_URLS[url_idx]
+    url = await get_ollama_url(request, model, url_idx)
     api_config = request.app.state.config.OLLAMA_API_CONFIGS.get(url, {})
 
     prefix_id = api_config.get("prefix_id", None)
@@ -907,6 +858,7 @@ async def generate_completion(
         url=f"{url}/api/generate",
         payload=form_data.model_dump_json(exclude_none=True).encode(),
         key=get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS),
+        upstream=url,
     )
 
 
@@ -926,7 +878,50 @@ class GenerateChatCompletionForm(BaseModel):
     keep_alive: Optional[Union[int, str]] = None
 
 
-async def get_ollama_url(request: Request, model: str, url_idx: Optional[int] = None):
+def refresh_loaded_models(request: Request):
+    """Updates which upstreams have which models loaded, in the background."""
+    if not OLLAMA_UPSTREAMS.should_refresh_loaded_models():
+        return
+
+    urls = list(request.app.state.config.OLLAMA_BASE_URLS)
+    configs = request.app.state.config.OLLAMA_API_CONFIGS
+
+    async def refresh():
+        responses = await asyncio.gather(
+            *[
+                send_get_request(f"{url}/api/ps", configs.get(url, {}).get("key"))
+                for url in urls
+            ]
+        )
+        for url, response in zip(urls, responses):
+            if not response:
+                OLLAMA_UPSTREAMS.set_loaded_models(url, None)
+                continue
+
+            # Use the same model names as OLLAMA_MODELS
+            prefix_id = configs.get(url, {}).get("prefix_id")
+            OLLAMA_UPSTREAMS.set_loaded_models(
+                url,
+                [
+                    f"{prefix_id}.{model['model']}" if prefix_id else model["model"]
+                    for model in response.get("models", [])
+                ],
+            )
+
+    asyncio.create_task(refresh())
+
+
+async def get_ollama_url(
+    request: Request,
+    model: str,
+    url_idx: Optional[int] = None,
+    affinity_key: Optional[str] = None,
+):
+    """
+    Returns the base URL of the upstream to send a request for `model` to,
+    chosen by `OLLAMA_UPSTREAMS` unless `url_idx` is given. Requests with the
+    same `affinity_key` (e.g. a chat id) are kept on the same upstream.
+    """
     if url_idx is None:
         models = request.app.state.OLLAMA_MODELS
         if model not in models:
@@ -934,7 +929,16 @@ async def get_ollama_url(request: Request, model: str, url_idx: Optional[int] =
                 status_code=400,
                 detail=ERROR_MESSAGES.MODEL_NOT_FOUND(model),
             )
-        url_idx = random.choice(models[model].get("urls", []))
+
+        refresh_loaded_models(request)
+        return OLLAMA_UPSTREAMS.select(
+            [
+                request.app.state.config.OLLAMA_BASE_URLS[idx]
+                for idx in models[model].get("urls", [])
+            ],
+            model=model,
+            affinity_key=affinity_key,
+        )
     url = request.app.state.config.OLLAMA_BASE_URLS[url_idx]
     return url
 
@@ -951,6 +955,7 @@ async def generate_chat_completion(
     if BYPASS_MODEL_ACCESS_CONTROL:
         bypass_filter = True
 
+    metadata = form_data.get("metadata") or {}
     try:
         form_data = GenerateChatCompletionForm(**form_data)
     except Exception as e:
@@ -1004,7 +1009,9 @@ async def generate_chat_completion(
     if ":" not in payload["model"]:
         payload["model"] = f"{payload['model']}:latest"
 
-    url = await get_ollama_url(request, payload["model"], url_idx)
+    url = await get_ollama_url(
+        request, payload["model"], url_idx, affinity_key=metadata.get("chat_id")
+    )
     api_config = request.app.state.config.OLLAMA_API_CONFIGS.get(url, {})
 
     prefix_id = api_config.get("prefix_id", None)
@@ -1017,6 +1024,7 @@ async def generate_chat_completion(
         stream=form_data.stream,
         key=get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS),
         content_type="application/x-ndjson",
+        upstream=url,
     )
 
 
@@ -1116,6 +1124,7 @@ async def generate_openai_completion(
         payload=json.dumps(payload),
         stream=payload.get("stream", False),
         key=get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS),
+        upstream=url,
     )
 
 
@@ -1189,6 +1198,7 @@ async def generate_openai_chat_completion(
         payload=json.dumps(payload),
         stream=payload.get("stream", False),
         key=get_api_key(url, request.app.state.config.OLLAMA_API_CONFIGS),
+        upstream=url,
     )
 
 
@@ -1248,15 +1258,15 @@ async def get_openai_models(
 
     if user.role == "user" and not BYPASS_MODEL_ACCESS_CONTROL:
         # Filter models based on user access control
-        filtered_models = []
-        for model in models:
-            model_info = Models.get_model_by_id(model["id"])
-            if model_info:
-                if user.id == model_info.user_id or has_access(
-                    user.id, type="read", access_control=model_info.access_control
-                ):
-                    filtered_models.append(model)
-        models = filtered_models
+        accessible_model_ids = {
+            model_info.id
+            for model_info in has_access_many(
+                user.id,
+                Models.get_models_by_ids([model["id"] for model in models]),
+                "read",
+            )
+        }
+        models = [model for model in models if model["id"] in accessible_model_ids]
 
     return {
         "data": models,
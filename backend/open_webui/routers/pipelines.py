@@ -10,14 +10,23 @@ from fastapi import (
     APIRouter,
 )
 import os
+import asyncio
+import itertools
 import logging
 import shutil
+import time
+import aiohttp
 import requests
 from pydantic import BaseModel
 from starlette.responses import FileResponse
 from typing import Optional
 
-from open_webui.env import SRC_LOG_LEVELS
+from open_webui.env import (
+    AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER,
+    PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN,
+    PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD,
+    SRC_LOG_LEVELS,
+)
 from open_webui.config import CACHE_DIR
 from open_webui.constants import ERROR_MESSAGES
 
@@ -25,6 +34,7 @@ from open_webui.constants import ERROR_MESSAGES
 from open_webui.routers.openai import get_all_models_responses
 
 from open_webui.utils.auth import get_admin_user
+from open_webui.utils.sessions import CLIENT_SESSIONS
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["MAIN"])
@@ -56,98 +66,192 @@ def get_sorted_filters(model_id, models):
     return sorted_filters
 
 
-def process_pipeline_inlet_filter(request, payload, user, models):
-    user = {"id": user.id, "email": user.email, "name": user.name, "role": user.role}
-    model_id = payload["model"]
+class CircuitBreaker:
+    """
+    Tracks consecutive failures per pipelines server. Once `threshold` is
+    reached the server is skipped for `cooldown` seconds, after which a single
+    request is let through to probe it again.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures: dict[str, int] = {}
+        self.opened_at: dict[str, float] = {}
+
+    def allow(self, url: str) -> bool:
+        opened_at = self.opened_at.get(url)
+        if opened_at is None:
+            return True
+        if time.monotonic() - opened_at < self.cooldown:
+            return False
+
+        # Half-open: let this request through, re-open straight away if it fails
+        self.opened_at[url] = time.monotonic()
+        self.failures[url] = self.threshold - 1
+        return True
+
+    def record_success(self, url: str):
+        self.failures.pop(url, None)
+        self.opened_at.pop(url, None)
+
+    def record_failure(self, url: str):
+        self.failures[url] = self.failures.get(url, 0) + 1
+        if self.failures[url] >= self.threshold:
+            if url not in self.opened_at:
+                log.warning(
+                    f"Pipelines server {url} failed {self.failures[url]} times, "
+                    f"skipping its filters for {self.cooldown}s"
+                )
+            self.opened_at[url] = time.monotonic()
 
-    sorted_filters = get_sorted_filters(model_id, models)
-    model = models[model_id]
 
-    if "pipeline" in model:
-        sorted_filters.append(model)
+circuit_breaker = CircuitBreaker(
+    threshold=PIPELINE_FILTER_CIRCUIT_BREAKER_THRESHOLD,
+    cooldown=PIPELINE_FILTER_CIRCUIT_BREAKER_COOLDOWN,
+)
 
-    for filter in sorted_filters:
-        r = None
-        try:
-            urlIdx = filter["urlIdx"]
 
-            url = request.app.state.config.OPENAI_API_BASE_URLS[urlIdx]
-            key = request.app.state.config.OPENAI_API_KEYS[urlIdx]
+async def call_pipeline_filter(request, filter, user, payload, stage):
+    """
+    Posts `payload` to the `stage` ("inlet" or "outlet") endpoint of a filter.
+    Returns the filtered payload, or None if the filter was skipped or could
+    not be reached. Raises if the filter rejected the request with a detail.
+    """
+    try:
+        urlIdx = filter["urlIdx"]
 
-            if key == "":
-                continue
+        url = request.app.state.config.OPENAI_API_BASE_URLS[urlIdx]
+        key = request.app.state.config.OPENAI_API_KEYS[urlIdx]
+    except (KeyError, IndexError) as e:
+        log.error(f"Pipeline {stage} filter {filter.get('id')} has no connection: {e}")
+        return None
 
-            headers = {"Authorization": f"Bearer {key}"}
-            r = requests.post(
-                f"{url}/{filter['id']}/filter/inlet",
-                headers=headers,
-                json={
-                    "user": user,
-                    "body": payload,
-                },
-            )
+    if key == "" or not circuit_breaker.allow(url):
+        return None
 
-            r.raise_for_status()
-            payload = r.json()
-        except Exception as e:
-            # Handle connection error here
-            print(f"Connection error: {e}")
+    try:
+        async with CLIENT_SESSIONS.get(url).post(
+            f"{url}/{filter['id']}/filter/{stage}",
+            headers={"Authorization": f"Bearer {key}"},
+            json={
+                "user": user,
+                "body": payload,
+            },
+            timeout=aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT_PIPELINE_FILTER),
+        ) as r:
+            if r.ok:
+                circuit_breaker.record_success(url)
+                try:
+                    return await r.json(content_type=None)
+                except ValueError as e:
+                    # Not JSON, skip the filter rather than fail the request
+                    log.error(
+                        f"Pipeline {stage} filter {filter['id']} returned an invalid body: {e}"
+                    )
+                    return None
+
+            if r.status >= 500:
+                circuit_breaker.record_failure(url)
+            else:
+                circuit_breaker.record_success(url)
 
-            if r is not None:
-                res = r.json()
-                if "detail" in res:
-                    raise Exception(r.status_code, res["detail"])
+            try:
+                res = await r.json(content_type=None)
+            except Exception:
+                res = None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # Handle connection error here
+        log.error(f"Connection error: {e}")
+        circuit_breaker.record_failure(url)
+        return None
+
+    log.error(f"Pipeline {stage} filter {filter['id']} returned {r.status}")
+    if isinstance(res, dict) and "detail" in res:
+        raise Exception(r.status, res["detail"])
+    return None
+
+
+def group_filters(filters):
+    """
+    Splits the sorted filters into groups that are applied one after another.
+    Filters run in order, each on the output of the previous one, except that
+    consecutive filters sharing a priority which declare `parallel` (they
+    don't depend on each other's output) run together on the same input.
+    """
+    groups = []
+    for (_, parallel), group in itertools.groupby(
+        filters,
+        key=lambda x: (
+            x["pipeline"].get("priority", 0),
+            x["pipeline"].get("parallel", False),
+        ),
+    ):
+        if parallel:
+            groups.append(list(group))
+        else:
+            groups.extend([filter] for filter in group)
+    return groups
+
+
+async def apply_pipeline_filters(request, groups, user, payload, stage):
+    user = {"id": user.id, "email": user.email, "name": user.name, "role": user.role}
+
+    for group in groups:
+        if len(group) == 1:
+            result = await call_pipeline_filter(request, group[0], user, payload, stage)
+            if result is not None:
+                payload = result
+            continue
+
+        results = await asyncio.gather(
+            *[
+                call_pipeline_filter(request, filter, user, payload, stage)
+                for filter in group
+            ],
+            return_exceptions=True,
+        )
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+        # Each filter saw the same input; combine the top-level keys they
+        # changed, parallel filters are expected not to change the same ones
+        merged = {**payload}
+        for result in results:
+            if not isinstance(result, dict):
+                continue
+            for key in payload.keys() - result.keys():
+                merged.pop(key, None)
+            for key, value in result.items():
+                if key not in payload or payload[key] != value:
+                    merged[key] = value
+        payload = merged
 
     return payload
 
 
-def process_pipeline_outlet_filter(request, payload, user, models):
-    user = {"id": user.id, "email": user.email, "name": user.name, "role": user.role}
+async def process_pipeline_inlet_filter(request, payload, user, models):
     model_id = payload["model"]
-
-    sorted_filters = get_sorted_filters(model_id, models)
     model = models[model_id]
 
+    groups = group_filters(get_sorted_filters(model_id, models))
     if "pipeline" in model:
-        sorted_filters = [model] + sorted_filters
-
-    for filter in sorted_filters:
-        r = None
-        try:
-            urlIdx = filter["urlIdx"]
-
-            url = request.app.state.config.OPENAI_API_BASE_URLS[urlIdx]
-            key = request.app.state.config.OPENAI_API_KEYS[urlIdx]
-
-            if key != "":
-                r = requests.post(
-                    f"{url}/{filter['id']}/filter/outlet",
-                    headers={"Authorization": f"Bearer {key}"},
-                    json={
-                        "user": user,
-                        "body": payload,
-                    },
-                )
+        groups.append([model])
 
-                r.raise_for_status()
-                data = r.json()
-                payload = data
-        except Exception as e:
-            # Handle connection error here
-            print(f"Connection error: {e}")
+    return await apply_pipeline_filters(request, groups, user, payload, "inlet")
 
-            if r is not None:
-                try:
-                    res = r.json()
-                    if "detail" in res:
-                        return Exception(r.status_code, res)
-                except Exception:
-                    pass
 
-            else:
-                pass
+async def process_pipeline_outlet_filter(request, payload, user, models):
+    model_id = payload["model"]
+    model = models[model_id]
 
-    return payload
+    groups = group_filters(get_sorted_filters(model_id, models))
+    if "pipeline" in model:
+        groups = [[model]] + groups
+
+    return await apply_pipeline_filters(request, groups, user, payload, "outlet")
 
 
 ##################################
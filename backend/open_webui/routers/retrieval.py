@@ -22,6 +22,7 @@ from fastapi import (
 )
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
+import anyio
 import tiktoken
 
 
@@ -34,6 +35,9 @@ from open_webui.storage.provider import Storage
 
 
 from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
+from open_webui.retrieval.bm25 import BM25_INDEXES
+from open_webui.retrieval.embedding_cache import EMBEDDING_CACHE
+from open_webui.retrieval.ingest import INGEST_JOBS, IngestionPipeline
 
 # Document loaders
 from open_webui.retrieval.loaders.main import Loader
@@ -69,6 +73,7 @@ from open_webui.utils.misc import (
     calculate_sha256_string,
 )
 from open_webui.utils.auth import get_admin_user, get_verified_user
+from open_webui.socket.main import emit_to_user
 
 
 from open_webui.config import (
@@ -201,6 +206,11 @@ async def get_embedding_config(request: Request, user=Depends(get_admin_user)):
     }
 
 
+@router.get("/embedding/cache")
+async def get_embedding_cache_stats(user=Depends(get_admin_user)):
+    return EMBEDDING_CACHE.stats()
+
+
 @router.get("/reranking")
 async def get_reraanking_config(request: Request, user=Depends(get_admin_user)):
     return {
@@ -279,7 +289,9 @@ async def update_embedding_config(
                 else request.app.state.config.RAG_OLLAMA_API_KEY
             ),
             request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
+            cache=True,
         )
+        EMBEDDING_CACHE.clear()
 
         return {
             "status": True,
@@ -650,6 +662,71 @@ async def update_query_settings(
 ####################################
 
 
+def get_text_splitter(request: Request):
+    if request.app.state.config.TEXT_SPLITTER in ["", "character"]:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=request.app.state.config.CHUNK_SIZE,
+            chunk_overlap=request.app.state.config.CHUNK_OVERLAP,
+            add_start_index=True,
+        )
+    elif request.app.state.config.TEXT_SPLITTER == "token":
+        log.info(
+            f"Using token text splitter: {request.app.state.config.TIKTOKEN_ENCODING_NAME}"
+        )
+
+        tiktoken.get_encoding(str(request.app.state.config.TIKTOKEN_ENCODING_NAME))
+        return TokenTextSplitter(
+            encoding_name=str(request.app.state.config.TIKTOKEN_ENCODING_NAME),
+            chunk_size=request.app.state.config.CHUNK_SIZE,
+            chunk_overlap=request.app.state.config.CHUNK_OVERLAP,
+            add_start_index=True,
+        )
+    else:
+        raise ValueError(ERROR_MESSAGES.DEFAULT("Invalid text splitter"))
+
+
+def get_chunk_metadata(
+    request: Request, chunk_metadata: dict, metadata: Optional[dict] = None
+) -> dict:
+    chunk_metadata = {
+        **chunk_metadata,
+        **(metadata if metadata else {}),
+        "embedding_config": json.dumps(
+            {
+                "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
+                "model": request.app.state.config.RAG_EMBEDDING_MODEL,
+            }
+        ),
+    }
+
+    # ChromaDB does not like datetime formats
+    # for meta-data so convert them to string.
+    for key, value in chunk_metadata.items():
+        if isinstance(value, datetime):
+            chunk_metadata[key] = str(value)
+
+    return chunk_metadata
+
+
+def get_document_embedding_function(request: Request):
+    return get_embedding_function(
+        request.app.state.config.RAG_EMBEDDING_ENGINE,
+        request.app.state.config.RAG_EMBEDDING_MODEL,
+        request.app.state.ef,
+        (
+            request.app.state.config.RAG_OPENAI_API_BASE_URL
+            if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
+            else request.app.state.config.RAG_OLLAMA_BASE_URL
+        ),
+        (
+            request.app.state.config.RAG_OPENAI_API_KEY
+            if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
+            else request.app.state.config.RAG_OLLAMA_API_KEY
+        ),
+        request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
+    )
+
+
 def save_docs_to_vector_db(
     request: Request,
     docs,
@@ -693,53 +770,13 @@ def save_docs_to_vector_db(
                 raise ValueError(ERROR_MESSAGES.DUPLICATE_CONTENT)
 
     if split:
-        if request.app.state.config.TEXT_SPLITTER in ["", "character"]:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=request.app.state.config.CHUNK_SIZE,
-                chunk_overlap=request.app.state.config.CHUNK_OVERLAP,
-                add_start_index=True,
-            )
-        elif request.app.state.config.TEXT_SPLITTER == "token":
-            log.info(
-                f"Using token text splitter: {request.app.state.config.TIKTOKEN_ENCODING_NAME}"
-            )
-
-            tiktoken.get_encoding(str(request.app.state.config.TIKTOKEN_ENCODING_NAME))
-            text_splitter = TokenTextSplitter(
-                encoding_name=str(request.app.state.config.TIKTOKEN_ENCODING_NAME),
-                chunk_size=request.app.state.config.CHUNK_SIZE,
-                chunk_overlap=request.app.state.config.CHUNK_OVERLAP,
-                add_start_index=True,
-            )
-        else:
-            raise ValueError(ERROR_MESSAGES.DEFAULT("Invalid text splitter"))
-
-        docs = text_splitter.split_documents(docs)
+        docs = get_text_splitter(request).split_documents(docs)
 
     if len(docs) == 0:
         raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
 
     texts = [doc.page_content for doc in docs]
-    metadatas = [
-        {
-            **doc.metadata,
-            **(metadata if metadata else {}),
-            "embedding_config": json.dumps(
-                {
-                    "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
-                    "model": request.app.state.config.RAG_EMBEDDING_MODEL,
-                }
-            ),
-        }
-        for doc in docs
-    ]
-
-    # ChromaDB does not like datetime formats
-    # for meta-data so convert them to string.
-    for metadata in metadatas:
-        for key, value in metadata.items():
-            if isinstance(value, datetime):
-                metadata[key] = str(value)
+    metadatas = [get_chunk_metadata(request, doc.metadata, metadata) for doc in docs]
 
     try:
         if VECTOR_DB_CLIENT.has_collection(collection_name=collection_name):
@@ -747,6 +784,7 @@ def save_docs_to_vector_db(
 
             if overwrite:
                 VECTOR_DB_CLIENT.delete_collection(collection_name=collection_name)
+                BM25_INDEXES.delete_collection(collection_name)
                 log.info(f"deleting existing collection {collection_name}")
             elif add is False:
                 log.info(
@@ -755,22 +793,7 @@ def save_docs_to_vector_db(
                 return True
 
         log.info(f"adding to collection {collection_name}")
-        embedding_function = get_embedding_function(
-            request.app.state.config.RAG_EMBEDDING_ENGINE,
-            request.app.state.config.RAG_EMBEDDING_MODEL,
-            request.app.state.ef,
-            (
-                request.app.state.config.RAG_OPENAI_API_BASE_URL
-                if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
-                else request.app.state.config.RAG_OLLAMA_BASE_URL
-            ),
-            (
-                request.app.state.config.RAG_OPENAI_API_KEY
-                if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
-                else request.app.state.config.RAG_OLLAMA_API_KEY
-            ),
-            request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
-        )
+        embedding_function = get_document_embedding_function(request)
 
         embeddings = embedding_function(
             list(map(lambda x: x.replace("\n", " "), texts))
@@ -790,6 +813,7 @@ def save_docs_to_vector_db(
             collection_name=collection_name,
             items=items,
         )
+        BM25_INDEXES.add(collection_name, items)
 
         return True
     except Exception as e:
@@ -822,6 +846,7 @@ def process_file(
             # Usage: /files/{file_id}/data/content/update
 
             VECTOR_DB_CLIENT.delete_collection(collection_name=f"file-{file.id}")
+            BM25_INDEXES.delete_collection(f"file-{file.id}")
 
             docs = [
                 Document(
@@ -1394,6 +1419,7 @@ def delete_entries_from_collection(form_data: DeleteForm, user=Depends(get_admin
                 collection_name=form_data.collection_name,
                 metadata={"hash": hash},
             )
+            BM25_INDEXES.delete(form_data.collection_name, filter={"hash": hash})
             return {"status": True}
         else:
             return {"status": False}
@@ -1405,9 +1431,57 @@ def delete_entries_from_collection(form_data: DeleteForm, user=Depends(get_admin
 @router.post("/reset/db")
 def reset_vector_db(user=Depends(get_admin_user)):
     VECTOR_DB_CLIENT.reset()
+    BM25_INDEXES.reset()
     Knowledges.delete_all_knowledge()
 
 
+class ReindexForm(BaseModel):
+    collection_name: Optional[str] = None
+
+
+@router.post("/reindex")
+def reindex_vector_db(form_data: ReindexForm, user=Depends(get_admin_user)):
+    if not hasattr(VECTOR_DB_CLIENT, "reindex"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.VECTOR_DB_NOT_SUPPORTED,
+        )
+    return VECTOR_DB_CLIENT.reindex(collection_name=form_data.collection_name)
+
+
+class EvaluateIndexForm(BaseModel):
+    collection_name: str
+    sample_size: int = 20
+    k: int = 10
+    ef_search: Optional[int] = None
+    probes: Optional[int] = None
+
+
+@router.post("/reindex/evaluate")
+def evaluate_vector_db_index(
+    form_data: EvaluateIndexForm, user=Depends(get_admin_user)
+):
+    if not hasattr(VECTOR_DB_CLIENT, "evaluate"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.VECTOR_DB_NOT_SUPPORTED,
+        )
+
+    result = VECTOR_DB_CLIENT.evaluate(
+        form_data.collection_name,
+        sample_size=form_data.sample_size,
+        limit=form_data.k,
+        ef_search=form_data.ef_search,
+        probes=form_data.probes,
+    )
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=ERROR_MESSAGES.NOT_FOUND,
+        )
+    return result
+
+
 @router.post("/reset/uploads")
 def reset_upload_dir(user=Depends(get_admin_user)) -> bool:
     folder = f"{UPLOAD_DIR}"
@@ -1441,6 +1515,7 @@ if ENV == "dev":
 class BatchProcessFilesForm(BaseModel):
     files: List[FileModel]
     collection_name: str
+    job_id: Optional[str] = None
 
 
 class BatchProcessFilesResult(BaseModel):
@@ -1452,6 +1527,7 @@ class BatchProcessFilesResult(BaseModel):
 class BatchProcessFilesResponse(BaseModel):
     results: List[BatchProcessFilesResult]
     errors: List[BatchProcessFilesResult]
+    job_id: Optional[str] = None
 
 
 @router.post("/process/files/batch")
@@ -1462,68 +1538,114 @@ def process_files_batch(
 ) -> BatchProcessFilesResponse:
     """
     Process a batch of files and save them to the vector database.
+
+    Files go through an IngestionPipeline and their progress is sent to the
+    user as `ingest-events`. Passing the `job_id` of an earlier call resumes
+    it, skipping the files it already stored.
     """
     results: List[BatchProcessFilesResult] = []
     errors: List[BatchProcessFilesResult] = []
     collection_name = form_data.collection_name
+    files = {file.id: file for file in form_data.files}
+
+    job = INGEST_JOBS.get(form_data.job_id) if form_data.job_id else None
+    if job is None or job["collection_name"] != collection_name:
+        job_id = INGEST_JOBS.create(collection_name, list(files.keys()))
+        job = {"id": job_id, "collection_name": collection_name, "files": {}}
+    job_id = job["id"]
+
+    file_ids = []
+    for file_id in files.keys():
+        job_status = job["files"].get(file_id)
+        if job_status == "completed":
+            results.append(BatchProcessFilesResult(file_id=file_id, status="completed"))
+            continue
+
+        if job_status == "processing":
+            # Interrupted half way, drop what was stored of it
+            VECTOR_DB_CLIENT.delete(
+                collection_name=collection_name, filter={"file_id": file_id}
+            )
+            BM25_INDEXES.delete(collection_name, filter={"file_id": file_id})
+        file_ids.append(file_id)
 
-    # Prepare all documents first
-    all_docs: List[Document] = []
-    for file in form_data.files:
-        try:
-            text_content = file.data.get("content", "")
+    def load(file_id: str) -> List[Document]:
+        file = files[file_id]
+        text_content = file.data.get("content", "")
 
-            docs: List[Document] = [
-                Document(
-                    page_content=text_content.replace("<br/>", "\n"),
-                    metadata={
-                        **file.meta,
-                        "name": file.filename,
-                        "created_by": file.user_id,
-                        "file_id": file.id,
-                        "source": file.filename,
-                    },
-                )
-            ]
+        hash = calculate_sha256_string(text_content)
+        Files.update_file_hash_by_id(file.id, hash)
+        Files.update_file_data_by_id(file.id, {"content": text_content})
 
-            hash = calculate_sha256_string(text_content)
-            Files.update_file_hash_by_id(file.id, hash)
-            Files.update_file_data_by_id(file.id, {"content": text_content})
+        return [
+            Document(
+                page_content=text_content.replace("<br/>", "\n"),
+                metadata={
+                    **file.meta,
+                    "name": file.filename,
+                    "created_by": file.user_id,
+                    "file_id": file.id,
+                    "source": file.filename,
+                },
+            )
+        ]
 
-            all_docs.extend(docs)
-            results.append(BatchProcessFilesResult(file_id=file.id, status="prepared"))
+    text_splitter = get_text_splitter(request)
 
-        except Exception as e:
-            log.error(f"process_files_batch: Error processing file {file.id}: {str(e)}")
-            errors.append(
-                BatchProcessFilesResult(file_id=file.id, status="failed", error=str(e))
+    def split(docs: List[Document]) -> List[Document]:
+        chunks = text_splitter.split_documents(docs)
+        if len(chunks) == 0:
+            raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+
+        for chunk in chunks:
+            chunk.metadata = get_chunk_metadata(request, chunk.metadata)
+        return chunks
+
+    def on_progress(file_id: str, status: str, error: Optional[str]):
+        INGEST_JOBS.set_status(job_id, file_id, status)
+        if status == "completed":
+            Files.update_file_metadata_by_id(
+                file_id, {"collection_name": collection_name}
             )
 
-    # Save all documents in one batch
-    if all_docs:
         try:
-            save_docs_to_vector_db(
-                request=request,
-                docs=all_docs,
-                collection_name=collection_name,
-                add=True,
+            anyio.from_thread.run(
+                emit_to_user,
+                user.id,
+                "ingest-events",
+                {
+                    "job_id": job_id,
+                    "collection_name": collection_name,
+                    "file_id": file_id,
+                    "status": status,
+                    "error": error,
+                },
             )
+        except RuntimeError:
+            # Not called from a request worker thread, nobody to tell
+            pass
+
+    pipeline = IngestionPipeline(
+        collection_name=collection_name,
+        load=load,
+        split=split,
+        embedding_function=get_document_embedding_function(request),
+        on_progress=on_progress,
+        loader_workers=config.RAG_INGEST_LOADER_WORKERS,
+        embedding_workers=config.RAG_INGEST_EMBEDDING_WORKERS,
+        batch_size=config.RAG_INGEST_BATCH_SIZE,
+        queue_size=config.RAG_INGEST_QUEUE_SIZE,
+    )
 
-            # Update all files with collection name
-            for result in results:
-                Files.update_file_metadata_by_id(
-                    result.file_id, {"collection_name": collection_name}
-                )
-                result.status = "completed"
-
-        except Exception as e:
-            log.error(
-                f"process_files_batch: Error saving documents to vector DB: {str(e)}"
+    for file_id, error in pipeline.run(file_ids).items():
+        if error is None:
+            results.append(BatchProcessFilesResult(file_id=file_id, status="completed"))
+        else:
+            log.error(f"process_files_batch: Error processing file {file_id}: {error}")
+            result = BatchProcessFilesResult(
+                file_id=file_id, status="failed", error=error
             )
-            for result in results:
-                result.status = "failed"
-                errors.append(
-                    BatchProcessFilesResult(file_id=result.file_id, error=str(e))
-                )
+            results.append(result)
+            errors.append(result)
 
-    return BatchProcessFilesResponse(results=results, errors=errors)
+    return BatchProcessFilesResponse(results=results, errors=errors, job_id=job_id)
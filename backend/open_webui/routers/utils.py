@@ -10,6 +10,7 @@ from starlette.responses import FileResponse
 from open_webui.utils.misc import get_gravatar_url
 from open_webui.utils.pdf_generator import PDFGenerator
 from open_webui.utils.auth import get_admin_user
+from open_webui.utils.sessions import CLIENT_SESSIONS
 
 router = APIRouter()
 
@@ -97,3 +98,8 @@ async def download_litellm_config_yaml(user=Depends(get_admin_user)):
         media_type="application/octet-stream",
         filename="config.yaml",
     )
+
+
+@router.get("/connections")
+async def get_connection_pools(user=Depends(get_admin_user)):
+    return CLIENT_SESSIONS.stats()
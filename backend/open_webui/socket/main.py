@@ -14,7 +14,13 @@ from open_webui.env import (
     WEBSOCKET_REDIS_URL,
 )
 from open_webui.utils.auth import decode_token
-from open_webui.socket.utils import RedisDict, RedisLock
+from open_webui.socket.utils import (
+    PresenceBroadcaster,
+    RedisLock,
+    SessionPool,
+    UsagePool,
+    UserPool,
+)
 
 from open_webui.env import (
     GLOBAL_LOG_LEVEL,
@@ -50,13 +56,21 @@ else:
 # Timeout duration in seconds
 TIMEOUT_DURATION = 3
 
+# Presence and usage are only sent to sessions in this room, which clients
+# join with a `presence-subscribe` event
+PRESENCE_ROOM = "presence"
+# Seconds to collect joins and leaves before sending them as one delta
+PRESENCE_DEBOUNCE_DURATION = 1
+# Seconds between full user list snapshots, correcting any missed delta
+PRESENCE_SNAPSHOT_INTERVAL = 60
+
 # Dictionary to maintain the user pool
 
 if WEBSOCKET_MANAGER == "redis":
     log.debug("Using Redis to manage websockets.")
-    SESSION_POOL = RedisDict("open-webui:session_pool", redis_url=WEBSOCKET_REDIS_URL)
-    USER_POOL = RedisDict("open-webui:user_pool", redis_url=WEBSOCKET_REDIS_URL)
-    USAGE_POOL = RedisDict("open-webui:usage_pool", redis_url=WEBSOCKET_REDIS_URL)
+    SESSION_POOL = SessionPool("open-webui:session_pool", redis_url=WEBSOCKET_REDIS_URL)
+    USER_POOL = UserPool("open-webui:user_pool", redis_url=WEBSOCKET_REDIS_URL)
+    USAGE_POOL = UsagePool("open-webui:usage_pool", redis_url=WEBSOCKET_REDIS_URL)
 
     clean_up_lock = RedisLock(
         redis_url=WEBSOCKET_REDIS_URL,
@@ -67,9 +81,9 @@ if WEBSOCKET_MANAGER == "redis":
     renew_func = clean_up_lock.renew_lock
     release_func = clean_up_lock.release_lock
 else:
-    SESSION_POOL = {}
-    USER_POOL = {}
-    USAGE_POOL = {}
+    SESSION_POOL = SessionPool("open-webui:session_pool")
+    USER_POOL = UserPool("open-webui:user_pool")
+    USAGE_POOL = UsagePool("open-webui:usage_pool")
     aquire_func = release_func = renew_func = lambda: True
 
 
@@ -78,6 +92,7 @@ async def periodic_usage_pool_cleanup():
         log.debug("Usage pool cleanup lock already exists. Not running it.")
         return
     log.debug("Running periodic_usage_pool_cleanup")
+    last_snapshot_time = int(time.time())
     try:
         while True:
             if not renew_func():
@@ -85,29 +100,16 @@ async def periodic_usage_pool_cleanup():
                 raise Exception("Unable to renew usage pool cleanup lock.")
 
             now = int(time.time())
-            send_usage = False
-            for model_id, connections in list(USAGE_POOL.items()):
-                # Creating a list of sids to remove if they have timed out
-                expired_sids = [
-                    sid
-                    for sid, details in connections.items()
-                    if now - details["updated_at"] > TIMEOUT_DURATION
-                ]
-
-                for sid in expired_sids:
-                    del connections[sid]
-
-                if not connections:
-                    log.debug(f"Cleaning up model {model_id} from usage pool")
-                    del USAGE_POOL[model_id]
-                else:
-                    USAGE_POOL[model_id] = connections
-
-                send_usage = True
-
-            if send_usage:
-                # Emit updated usage information after cleaning
-                await sio.emit("usage", {"models": get_models_in_use()})
+            model_ids = await USAGE_POOL.get_model_ids()
+            # Remove sessions that haven't reported usage in time
+            removed = await USAGE_POOL.remove_expired(model_ids, now - TIMEOUT_DURATION)
+
+            if now - last_snapshot_time >= PRESENCE_SNAPSHOT_INTERVAL:
+                await emit_presence_snapshot()
+                last_snapshot_time = now
+            elif removed:
+                # Emit updated usage information only when it changed
+                await emit_usage()
 
             await asyncio.sleep(TIMEOUT_DURATION)
     finally:
@@ -120,12 +122,43 @@ app = socketio.ASGIApp(
 )
 
 
-def get_models_in_use():
+async def get_models_in_use():
     # List models that are currently in use
-    models_in_use = list(USAGE_POOL.keys())
+    models_in_use = await USAGE_POOL.get_model_ids()
     return models_in_use
 
 
+async def emit_usage(to=PRESENCE_ROOM):
+    await sio.emit("usage", {"models": await get_models_in_use()}, to=to)
+
+
+async def emit_presence_snapshot(to=PRESENCE_ROOM):
+    await sio.emit("user-list", {"user_ids": await USER_POOL.get_user_ids()}, to=to)
+    await emit_usage(to=to)
+
+
+async def emit_presence_delta(delta):
+    await sio.emit("user-presence", delta, to=PRESENCE_ROOM)
+
+
+presence_broadcaster = PresenceBroadcaster(
+    emit_presence_delta, delay=PRESENCE_DEBOUNCE_DURATION
+)
+
+
+def get_user_room(user_id):
+    # Every session of a user joins the user's room, so events for the user
+    # can be sent without looking up their sessions
+    return f"user:{user_id}"
+
+
+async def add_user_session(sid, user):
+    await SESSION_POOL.set(sid, user.model_dump())
+    if await USER_POOL.add(user.id, sid):
+        presence_broadcaster.joined(user.id)
+    await sio.enter_room(sid, get_user_room(user.id))
+
+
 @sio.on("usage")
 async def usage(sid, data):
     model_id = data["model"]
@@ -133,13 +166,9 @@ async def usage(sid, data):
     current_time = int(time.time())
 
     # Store the new usage data and task
-    USAGE_POOL[model_id] = {
-        **(USAGE_POOL[model_id] if model_id in USAGE_POOL else {}),
-        sid: {"updated_at": current_time},
-    }
-
-    # Broadcast the usage data to all clients
-    await sio.emit("usage", {"models": get_models_in_use()})
+    if await USAGE_POOL.update(model_id, sid, current_time):
+        # Broadcast the usage data when a model starts being used
+        await emit_usage()
 
 
 @sio.event
@@ -155,15 +184,9 @@ async def connect(sid, environ, auth):
             user = Users.get_user_by_id(data["id"])
 
         if user:
-            SESSION_POOL[sid] = user.model_dump()
-            if user.id in USER_POOL:
-                USER_POOL[user.id] = USER_POOL[user.id] + [sid]
-            else:
-                USER_POOL[user.id] = [sid]
+            await add_user_session(sid, user)
 
             # print(f"user {user.name}({user.id}) connected with session ID {sid}")
-            await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
-            await sio.emit("usage", {"models": get_models_in_use()})
 
 
 @sio.on("user-join")
@@ -183,11 +206,7 @@ async def user_join(sid, data):
     if not user:
         return
 
-    SESSION_POOL[sid] = user.model_dump()
-    if user.id in USER_POOL:
-        USER_POOL[user.id] = USER_POOL[user.id] + [sid]
-    else:
-        USER_POOL[user.id] = [sid]
+    await add_user_session(sid, user)
 
     # Join all the channels
     channels = Channels.get_channels_by_user_id(user.id)
@@ -197,7 +216,6 @@ async def user_join(sid, data):
 
     # print(f"user {user.name}({user.id}) connected with session ID {sid}")
 
-    await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
     return {"id": user.id, "name": user.name}
 
 
@@ -240,13 +258,17 @@ async def channel_events(sid, data):
     event_type = event_data["type"]
 
     if event_type == "typing":
+        user = await SESSION_POOL.get(sid)
+        if user is None:
+            return
+
         await sio.emit(
             "channel-events",
             {
                 "channel_id": data["channel_id"],
                 "message_id": data.get("message_id", None),
                 "data": event_data,
-                "user": UserNameResponse(**SESSION_POOL[sid]).model_dump(),
+                "user": UserNameResponse(**user).model_dump(),
             },
             room=room,
         )
@@ -254,45 +276,51 @@ async def channel_events(sid, data):
 
 @sio.on("user-list")
 async def user_list(sid):
-    await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
+    await sio.emit("user-list", {"user_ids": await USER_POOL.get_user_ids()}, to=sid)
 
 
-@sio.event
-async def disconnect(sid):
-    if sid in SESSION_POOL:
-        user = SESSION_POOL[sid]
-        del SESSION_POOL[sid]
+@sio.on("presence-subscribe")
+async def presence_subscribe(sid):
+    await sio.enter_room(sid, PRESENCE_ROOM)
+    await emit_presence_snapshot(to=sid)
+
 
-        user_id = user["id"]
-        USER_POOL[user_id] = [_sid for _sid in USER_POOL[user_id] if _sid != sid]
+@sio.on("presence-unsubscribe")
+async def presence_unsubscribe(sid):
+    await sio.leave_room(sid, PRESENCE_ROOM)
 
-        if len(USER_POOL[user_id]) == 0:
-            del USER_POOL[user_id]
 
-        await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
+@sio.event
+async def disconnect(sid):
+    user = await SESSION_POOL.pop(sid)
+    if user:
+        if await USER_POOL.remove(user["id"], sid) == 0:
+            presence_broadcaster.left(user["id"])
     else:
         pass
         # print(f"Unknown session ID {sid} disconnected")
 
 
+async def emit_to_user(user_id: str, event: str, data: dict):
+    await sio.emit(event, data, to=get_user_room(user_id))
+
+
 def get_event_emitter(request_info):
+    # The user's room reaches all their sessions on every worker; the request's
+    # own session is added in case it joined without authenticating
+    recipients = [get_user_room(request_info["user_id"]), request_info["session_id"]]
+
     async def __event_emitter__(event_data):
-        user_id = request_info["user_id"]
-        session_ids = list(
-            set(USER_POOL.get(user_id, []) + [request_info["session_id"]])
+        await sio.emit(
+            "chat-events",
+            {
+                "chat_id": request_info["chat_id"],
+                "message_id": request_info["message_id"],
+                "data": event_data,
+            },
+            to=recipients,
         )
 
-        for session_id in session_ids:
-            await sio.emit(
-                "chat-events",
-                {
-                    "chat_id": request_info["chat_id"],
-                    "message_id": request_info["message_id"],
-                    "data": event_data,
-                },
-                to=session_id,
-            )
-
         if "type" in event_data and event_data["type"] == "status":
             Chats.add_message_status_to_chat_by_id_and_message_id(
                 request_info["chat_id"],
@@ -347,28 +375,25 @@ def get_event_call(request_info):
     return __event_call__
 
 
-def get_user_id_from_session_pool(sid):
-    user = SESSION_POOL.get(sid)
+async def get_user_id_from_session_pool(sid):
+    user = await SESSION_POOL.get(sid)
     if user:
         return user["id"]
     return None
 
 
-def get_user_ids_from_room(room):
+async def get_user_ids_from_room(room):
     active_session_ids = sio.manager.get_participants(
         namespace="/",
         room=room,
     )
 
-    active_user_ids = list(
-        set(
-            [SESSION_POOL.get(session_id[0])["id"] for session_id in active_session_ids]
-        )
+    users = await SESSION_POOL.get_many(
+        [session_id[0] for session_id in active_session_ids]
     )
+    active_user_ids = list(set([user["id"] for user in users.values()]))
     return active_user_ids
 
 
-def get_active_status_by_user_id(user_id):
-    if user_id in USER_POOL:
-        return True
-    return False
+async def get_active_status_by_user_id(user_id):
+    return await USER_POOL.is_active(user_id)
@@ -1,6 +1,9 @@
+import asyncio
 import json
 import redis
+import redis.asyncio as aioredis
 import uuid
+from collections import OrderedDict
 
 
 class RedisLock:
@@ -85,3 +88,256 @@ class RedisDict:
         if key not in self:
             self[key] = default
         return self[key]
+
+
+class SessionPool:
+    """
+    Session id -> user dict of every connected socket. Stored in a Redis hash
+    when `redis_url` is given, in memory otherwise. Sessions don't change once
+    connected, so lookups are cached locally.
+    """
+
+    def __init__(self, name, redis_url=None, max_cached=10000):
+        self.name = name
+        self.redis = (
+            aioredis.Redis.from_url(redis_url, decode_responses=True)
+            if redis_url
+            else None
+        )
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+
+    def _cache_set(self, sid, user):
+        self._cache[sid] = user
+        self._cache.move_to_end(sid)
+        # Without Redis the cache is the only copy, so it is never trimmed
+        while self.redis is not None and len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def set(self, sid, user):
+        if self.redis is not None:
+            await self.redis.hset(self.name, sid, json.dumps(user))
+        self._cache_set(sid, user)
+
+    async def get(self, sid):
+        if sid in self._cache or self.redis is None:
+            return self._cache.get(sid)
+
+        value = await self.redis.hget(self.name, sid)
+        if value is None:
+            return None
+        user = json.loads(value)
+        self._cache_set(sid, user)
+        return user
+
+    async def get_many(self, sids):
+        """Returns the users of `sids` that are still connected, in one round trip."""
+        users = {sid: self._cache[sid] for sid in sids if sid in self._cache}
+        missing = [sid for sid in sids if sid not in users]
+        if missing and self.redis is not None:
+            for sid, value in zip(missing, await self.redis.hmget(self.name, missing)):
+                if value is not None:
+                    users[sid] = json.loads(value)
+                    self._cache_set(sid, users[sid])
+        return users
+
+    async def pop(self, sid):
+        user = self._cache.pop(sid, None)
+        if self.redis is None:
+            return user
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            value, _ = await pipe.hget(self.name, sid).hdel(self.name, sid).execute()
+        return json.loads(value) if value is not None else None
+
+
+class UserPool:
+    """
+    User id -> session ids of the user's connected sockets, kept as one Redis
+    set per user plus a set of the ids of all connected users, so sessions
+    are added and removed atomically instead of rewriting the whole list.
+    """
+
+    # Removes the session and, with the user's last session, the user
+    REMOVE_SCRIPT = """
+    redis.call("SREM", KEYS[1], ARGV[1])
+    local remaining = redis.call("SCARD", KEYS[1])
+    if remaining == 0 then
+        redis.call("SREM", KEYS[2], ARGV[2])
+    end
+    return remaining
+    """
+
+    def __init__(self, name, redis_url=None):
+        self.name = name
+        self.users_key = f"{name}:users"
+        self.redis = (
+            aioredis.Redis.from_url(redis_url, decode_responses=True)
+            if redis_url
+            else None
+        )
+        self._local = {}
+        if self.redis is not None:
+            self._remove = self.redis.register_script(self.REMOVE_SCRIPT)
+
+    def _sessions_key(self, user_id):
+        return f"{self.name}:user:{user_id}"
+
+    async def add(self, user_id, sid):
+        """Returns True if this is the user's first session."""
+        if self.redis is None:
+            joined = user_id not in self._local
+            self._local.setdefault(user_id, set()).add(sid)
+            return joined
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            _, joined = await (
+                pipe.sadd(self._sessions_key(user_id), sid)
+                .sadd(self.users_key, user_id)
+                .execute()
+            )
+        return bool(joined)
+
+    async def remove(self, user_id, sid):
+        """Returns the number of sessions the user has left."""
+        if self.redis is None:
+            sessions = self._local.get(user_id, set())
+            sessions.discard(sid)
+            if not sessions:
+                self._local.pop(user_id, None)
+            return len(sessions)
+
+        return await self._remove(
+            keys=[self._sessions_key(user_id), self.users_key], args=[sid, user_id]
+        )
+
+    async def get_sessions(self, user_id):
+        if self.redis is None:
+            return list(self._local.get(user_id, []))
+        return list(await self.redis.smembers(self._sessions_key(user_id)))
+
+    async def get_user_ids(self):
+        if self.redis is None:
+            return list(self._local.keys())
+        return list(await self.redis.smembers(self.users_key))
+
+    async def is_active(self, user_id):
+        if self.redis is None:
+            return user_id in self._local
+        return bool(await self.redis.sismember(self.users_key, user_id))
+
+
+class UsagePool:
+    """
+    Model id -> session ids that used the model, with the time of their last
+    usage event. Stored as one Redis sorted set per model, scored by time, so
+    expired sessions are removed with a single command per model.
+    """
+
+    # Removes expired sessions and, if none are left, the model
+    EXPIRE_SCRIPT = """
+    local removed = 0
+    for i = 2, #KEYS do
+        redis.call("ZREMRANGEBYSCORE", KEYS[i], "-inf", "(" .. ARGV[1])
+        if redis.call("ZCARD", KEYS[i]) == 0 then
+            removed = removed + redis.call("SREM", KEYS[1], ARGV[i])
+        end
+    end
+    return removed
+    """
+
+    def __init__(self, name, redis_url=None):
+        self.name = name
+        self.models_key = f"{name}:models"
+        self.redis = (
+            aioredis.Redis.from_url(redis_url, decode_responses=True)
+            if redis_url
+            else None
+        )
+        self._local = {}
+        if self.redis is not None:
+            self._expire = self.redis.register_script(self.EXPIRE_SCRIPT)
+
+    def _model_key(self, model_id):
+        return f"{self.name}:model:{model_id}"
+
+    async def update(self, model_id, sid, updated_at):
+        """Returns True if the model wasn't in use before."""
+        if self.redis is None:
+            added = model_id not in self._local
+            self._local.setdefault(model_id, {})[sid] = updated_at
+            return added
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            _, added = await (
+                pipe.zadd(self._model_key(model_id), {sid: updated_at})
+                .sadd(self.models_key, model_id)
+                .execute()
+            )
+        return bool(added)
+
+    async def get_model_ids(self):
+        if self.redis is None:
+            return list(self._local.keys())
+        return list(await self.redis.smembers(self.models_key))
+
+    async def remove_expired(self, model_ids, cutoff):
+        """
+        Removes sessions last updated before `cutoff`. Returns the number of
+        models no longer in use.
+        """
+        if self.redis is None:
+            removed = 0
+            for model_id in model_ids:
+                connections = self._local.get(model_id, {})
+                for sid in [s for s, t in connections.items() if t < cutoff]:
+                    del connections[sid]
+                if not connections and self._local.pop(model_id, None) is not None:
+                    removed += 1
+            return removed
+
+        if not model_ids:
+            return 0
+        return await self._expire(
+            keys=[self.models_key]
+            + [self._model_key(model_id) for model_id in model_ids],
+            args=[cutoff] + list(model_ids),
+        )
+
+
+class PresenceBroadcaster:
+    """
+    Collects users joining and leaving and sends them as one `user-presence`
+    delta after `delay` seconds, so a burst of reconnects results in a single
+    event. Only the net change per user within the delay is sent.
+    """
+
+    def __init__(self, emit, delay):
+        self.emit = emit
+        self.delay = delay
+        self._changes = {}
+        self._task = None
+
+    def joined(self, user_id):
+        self._changes[user_id] = True
+        self._schedule()
+
+    def left(self, user_id):
+        self._changes[user_id] = False
+        self._schedule()
+
+    def _schedule(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        changes, self._changes = self._changes, {}
+        self._task = None
+
+        await self.emit(
+            {
+                "joined": [user_id for user_id, joined in changes.items() if joined],
+                "left": [user_id for user_id, joined in changes.items() if not joined],
+            }
+        )
@@ -0,0 +1,121 @@
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from open_webui.retrieval import bm25
+from open_webui.retrieval.bm25 import BM25IndexCache
+
+
+class FakeVectorDB:
+    """Collections as lists of (id, text, metadata), `get` can be held up."""
+
+    def __init__(self):
+        self.collections: dict[str, list[tuple[str, str, dict]]] = {}
+        self.blocked: dict[str, threading.Event] = {}
+        self.gets = 0
+
+    def get(self, collection_name: str):
+        self.gets += 1
+        if collection_name in self.blocked:
+            self.blocked[collection_name].wait(timeout=5)
+        items = self.collections.get(collection_name)
+        if not items:
+            return None
+        ids, texts, metadatas = zip(*items)
+        return SimpleNamespace(
+            ids=[list(ids)], documents=[list(texts)], metadatas=[list(metadatas)]
+        )
+
+
+@pytest.fixture
+def vector_db(monkeypatch):
+    vector_db = FakeVectorDB()
+    monkeypatch.setattr(bm25, "VECTOR_DB_CLIENT", vector_db)
+    return vector_db
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return BM25IndexCache(max_documents=1000, cache_dir=str(tmp_path))
+
+
+def get_collection_name() -> str:
+    # Versions are kept in Redis, shared by all tests
+    return f"test-{uuid.uuid4()}"
+
+
+def search(cache, collection_name: str, query: str) -> list[str]:
+    index = cache.get(collection_name)
+    return [text for text, _, _ in index.search(query, k=10)] if index else []
+
+
+def test_writes_are_applied_in_place(vector_db, cache):
+    name = get_collection_name()
+    vector_db.collections[name] = [("1", "red apple", {})]
+    assert search(cache, name, "apple") == ["red apple"]
+
+    item = {"id": "2", "text": "green apple", "metadata": {}}
+    vector_db.collections[name].append(("2", "green apple", {}))
+    cache.add(name, [item])
+    assert sorted(search(cache, name, "apple")) == ["green apple", "red apple"]
+
+    vector_db.collections[name].pop(0)
+    cache.delete(name, ids=["1"])
+    assert search(cache, name, "apple") == ["green apple"]
+    assert vector_db.gets == 1
+
+
+def test_writes_from_other_workers_rebuild(vector_db, cache, tmp_path):
+    """
+    Ensure that an index is rebuilt after a write made by another worker.
+    """
+    other = BM25IndexCache(max_documents=1000, cache_dir=str(tmp_path / "other"))
+    name = get_collection_name()
+    vector_db.collections[name] = [("1", "red apple", {})]
+    assert search(cache, name, "apple") == ["red apple"]
+
+    vector_db.collections[name] = [("1", "red apple", {}), ("2", "green apple", {})]
+    other.add(name, [{"id": "2", "text": "green apple", "metadata": {}}])
+
+    assert sorted(search(cache, name, "apple")) == ["green apple", "red apple"]
+    assert vector_db.gets == 2
+
+
+def test_build_doesnt_hold_up_other_collections(vector_db, cache):
+    """
+    Ensure that lookups of other collections are served while one is built.
+    """
+    slow, fast = get_collection_name(), get_collection_name()
+    vector_db.collections[slow] = [("1", "slow", {})]
+    vector_db.collections[fast] = [("1", "fast", {})]
+    assert search(cache, fast, "fast") == ["fast"]
+
+    release = vector_db.blocked[slow] = threading.Event()
+    results = []
+    builders = [
+        threading.Thread(target=lambda: results.append(search(cache, slow, "slow")))
+        for _ in range(2)
+    ]
+    for builder in builders:
+        builder.start()
+
+    try:
+        # Wait for the build to be under way
+        while vector_db.gets < 2:
+            time.sleep(0.01)
+
+        lookup = threading.Thread(target=lambda: search(cache, fast, "fast"))
+        lookup.start()
+        lookup.join(timeout=1)
+        assert not lookup.is_alive()
+    finally:
+        release.set()
+        for builder in builders:
+            builder.join()
+
+    assert results == [["slow"], ["slow"]]
+    # Built once for both lookups
+    assert vector_db.gets == 2
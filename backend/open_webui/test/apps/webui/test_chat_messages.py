@@ -0,0 +1,155 @@
+import pytest
+
+from test.util.mock_db import mock_sqlite_db
+
+
+@pytest.fixture
+def chats(tmp_path):
+    from open_webui.models.chats import Chats
+
+    with mock_sqlite_db(
+        tmp_path / "webui.db",
+        ["open_webui.models.chats", "open_webui.models.tags"],
+        revisions=["4b5d2a3c8e91"],
+    ):
+        yield Chats
+
+
+def create_chat(chats, chat: dict) -> str:
+    from open_webui.models.chats import ChatForm
+
+    return chats.insert_new_chat("1", ChatForm(chat=chat)).id
+
+
+def get_history(chats, id: str) -> dict:
+    return chats.get_chat_by_id(id).chat["history"]
+
+
+# Keys that can't be part of an SQLite JSON path go through the rewrite
+SAFE_ID, UNSAFE_ID = "message-1", 'message "1": quoted'
+
+
+@pytest.mark.parametrize("message_id", [SAFE_ID, UNSAFE_ID])
+def test_upsert_message_merges_and_sets_current(chats, message_id):
+    """
+    Ensure that upserting merges into an existing message and makes it current.
+    """
+    id = create_chat(
+        chats,
+        {
+            "history": {
+                "currentId": None,
+                "messages": {
+                    message_id: {"role": "assistant", "content": "", "done": False}
+                },
+            }
+        },
+    )
+
+    assert chats.upsert_message_to_chat_by_id_and_message_id(
+        id, message_id, {"content": "Hello", "info": {"tokens": 2}}
+    )
+
+    history = get_history(chats, id)
+    assert history["currentId"] == message_id
+    assert history["messages"][message_id] == {
+        "role": "assistant",
+        "content": "Hello",
+        "done": False,
+        "info": {"tokens": 2},
+    }
+
+
+@pytest.mark.parametrize("message_id", [SAFE_ID, UNSAFE_ID])
+@pytest.mark.parametrize(
+    "chat",
+    [{}, {"history": {}}, {"history": {"messages": {}}}],
+    ids=["no history", "no messages", "empty"],
+)
+def test_upsert_message_creates_missing_parents(chats, message_id, chat):
+    """
+    Ensure that upserting into a chat without history or messages creates them.
+    """
+    id = create_chat(chats, chat)
+
+    assert chats.upsert_message_to_chat_by_id_and_message_id(
+        id, message_id, {"role": "user", "content": "Hi"}
+    )
+
+    history = get_history(chats, id)
+    assert history["currentId"] == message_id
+    assert history["messages"] == {message_id: {"role": "user", "content": "Hi"}}
+
+
+def test_upsert_message_with_unsafe_keys(chats):
+    """
+    Ensure that message keys that can't be part of a JSON path are written as is.
+    """
+    id = create_chat(chats, {"history": {"messages": {SAFE_ID: {"content": ""}}}})
+
+    assert chats.upsert_message_to_chat_by_id_and_message_id(
+        id, SAFE_ID, {'say "hi"': 1, "it's": 2, "a:b": 3}
+    )
+
+    assert get_history(chats, id)["messages"][SAFE_ID] == {
+        "content": "",
+        'say "hi"': 1,
+        "it's": 2,
+        "a:b": 3,
+    }
+
+
+def test_upsert_message_to_missing_chat(chats):
+    assert not chats.upsert_message_to_chat_by_id_and_message_id(
+        "missing", SAFE_ID, {"content": "Hi"}
+    )
+
+
+@pytest.mark.parametrize("message_id", [SAFE_ID, UNSAFE_ID])
+def test_add_message_status_appends(chats, message_id):
+    """
+    Ensure that statuses are appended in order, creating the list first.
+    """
+    id = create_chat(
+        chats, {"history": {"messages": {message_id: {"content": "Hello"}}}}
+    )
+
+    assert chats.add_message_status_to_chat_by_id_and_message_id(
+        id, message_id, {"action": "web_search", "done": False}
+    )
+    assert chats.add_message_status_to_chat_by_id_and_message_id(
+        id, message_id, {"action": "web_search", "done": True}
+    )
+
+    assert get_history(chats, id)["messages"][message_id] == {
+        "content": "Hello",
+        "statusHistory": [
+            {"action": "web_search", "done": False},
+            {"action": "web_search", "done": True},
+        ],
+    }
+
+
+def test_add_message_status_to_missing_message(chats):
+    """
+    Ensure that statuses of messages that don't exist are not added.
+    """
+    id = create_chat(chats, {"history": {"messages": {}}})
+
+    assert not chats.add_message_status_to_chat_by_id_and_message_id(
+        id, SAFE_ID, {"action": "web_search"}
+    )
+    assert get_history(chats, id)["messages"] == {}
+
+
+@pytest.mark.parametrize("message_id", [SAFE_ID, UNSAFE_ID])
+def test_get_message_by_id_and_message_id(chats, message_id):
+    id = create_chat(
+        chats, {"history": {"messages": {message_id: {"content": "Hello"}}}}
+    )
+
+    assert chats.get_message_by_id_and_message_id(id, message_id) == {
+        "content": "Hello"
+    }
+    assert chats.get_message_by_id_and_message_id(id, "other") == {}
+    assert chats.get_message_by_id_and_message_id("missing", message_id) is None
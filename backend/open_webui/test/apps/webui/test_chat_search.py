@@ -0,0 +1,183 @@
+import pytest
+from sqlalchemy import text
+
+from test.util.mock_db import mock_sqlite_db
+
+
+@pytest.fixture
+def engine(tmp_path):
+    # The tables are created from the models, which have to be imported first
+    import open_webui.models.chats  # noqa: F401
+
+    with mock_sqlite_db(
+        tmp_path / "webui.db",
+        ["open_webui.models.chats", "open_webui.models.tags"],
+        revisions=["4b5d2a3c8e91"],
+    ) as engine:
+        yield engine
+
+
+@pytest.fixture
+def chats(engine):
+    from open_webui.models.chats import Chats
+
+    return Chats
+
+
+def create_chat(chats, title: str, *contents: str, user_id: str = "1") -> str:
+    from open_webui.models.chats import ChatForm
+
+    chat = {
+        "title": title,
+        "messages": [{"role": "user", "content": content} for content in contents],
+    }
+    return chats.insert_new_chat(user_id, ChatForm(chat=chat)).id
+
+
+def search(chats, search_text: str, **kwargs) -> list[str]:
+    return [
+        result.id
+        for result in chats.get_chats_by_user_id_and_search_text(
+            "1", search_text, **kwargs
+        )
+    ]
+
+
+def count_indexed(engine) -> int:
+    with engine.connect() as connection:
+        return connection.execute(text("SELECT count(*) FROM chat_search")).scalar()
+
+
+def test_index_follows_chat_changes(engine, chats):
+    """
+    Ensure that inserted, updated and deleted chats are found accordingly.
+    """
+    id = create_chat(chats, "Trip to Paris", "Where to eat croissants?")
+    assert search(chats, "paris") == [id]
+    # Words match by prefix, in titles and messages
+    assert search(chats, "croiss") == [id]
+
+    chats.update_chat_by_id(
+        id, {"title": "Trip to Rome", "messages": [{"content": "Pizza?"}]}
+    )
+    assert search(chats, "paris") == []
+    assert search(chats, "croissants") == []
+    assert search(chats, "rome pizza") == [id]
+    assert count_indexed(engine) == 1
+
+    chats.delete_chat_by_id(id)
+    assert search(chats, "rome") == []
+    assert count_indexed(engine) == 0
+
+
+def test_search_only_returns_user_chats(engine, chats):
+    id = create_chat(chats, "Paris")
+    create_chat(chats, "Paris", user_id="2")
+
+    assert search(chats, "paris") == [id]
+    assert search(chats, "") == [id]
+
+    chats.delete_chats_by_user_id("2")
+    assert count_indexed(engine) == 1
+
+
+def test_search_matches_all_words(chats):
+    both = create_chat(chats, "Paris", "Rome")
+    create_chat(chats, "Paris")
+
+    assert search(chats, "paris rome") == [both]
+
+
+def test_search_archived(chats):
+    id = create_chat(chats, "Paris")
+    chats.toggle_chat_archive_by_id(id)
+
+    assert search(chats, "paris") == []
+    assert search(chats, "paris", include_archived=True) == [id]
+
+
+def test_search_snippet(chats):
+    """
+    Ensure that snippets are escaped, with the matches marked.
+    """
+    create_chat(chats, "Markup", "Make <b>bold</b> text")
+
+    (result,) = chats.get_chats_by_user_id_and_search_text("1", "bold")
+    assert result.snippet == "Make &lt;b&gt;<mark>bold</mark>&lt;/b&gt; text"
+
+    (result,) = chats.get_chats_by_user_id_and_search_text("1", "markup")
+    assert "<mark>" not in (result.snippet or "")
+
+
+def test_search_tags(chats):
+    """
+    Ensure that `tag:` keeps chats with all the tags, and `tag:none` untagged ones.
+    """
+    work = create_chat(chats, "Report")
+    urgent = create_chat(chats, "Report")
+    untagged = create_chat(chats, "Report")
+    chats.add_chat_tag_by_id_and_user_id_and_tag_name(work, "1", "Work")
+    chats.add_chat_tag_by_id_and_user_id_and_tag_name(urgent, "1", "Work")
+    chats.add_chat_tag_by_id_and_user_id_and_tag_name(urgent, "1", "Urgent")
+
+    assert sorted(search(chats, "tag:work")) == sorted([work, urgent])
+    assert search(chats, "report tag:work tag:urgent") == [urgent]
+    assert search(chats, "tag:none") == [untagged]
+    assert search(chats, "other tag:work") == []
+
+    chats.delete_tag_by_id_and_user_id_and_tag_name(urgent, "1", "Urgent")
+    assert search(chats, "tag:urgent") == []
+
+    chats.delete_all_tags_by_id_and_user_id(work, "1")
+    assert sorted(search(chats, "tag:none")) == sorted([work, untagged])
+
+
+def test_search_tags_with_punctuation(chats):
+    """
+    Ensure that tags only differing by punctuation are told apart.
+    """
+    cpp = create_chat(chats, "Code")
+    c = create_chat(chats, "Code")
+    chats.add_chat_tag_by_id_and_user_id_and_tag_name(cpp, "1", "C++")
+    chats.add_chat_tag_by_id_and_user_id_and_tag_name(c, "1", "C")
+
+    assert search(chats, "tag:c++") == [cpp]
+    assert search(chats, "tag:c") == [c]
+
+
+@pytest.mark.parametrize("search_text", ["report", "", "tag:none"])
+def test_search_cursor_walk(chats, search_text):
+    """
+    Ensure that following cursors returns every result once, in order, also
+    when scores and update times are tied.
+    """
+    ids = {
+        create_chat(chats, f"Report {i}", *["report"] * (i % 4), "notes")
+        for i in range(23)
+    }
+
+    everything = chats.get_chats_by_user_id_and_search_text("1", search_text)
+    assert {result.id for result in everything} == ids
+
+    walked, cursor = [], None
+    while True:
+        page = chats.get_chats_by_user_id_and_search_text(
+            "1", search_text, limit=4, cursor=cursor
+        )
+        if not page:
+            break
+        walked.extend(result.id for result in page)
+        cursor = page[-1].cursor
+
+    assert walked == [result.id for result in everything]
+
+
+@pytest.mark.parametrize("cursor", ["nope", "x:1:id", "1.0:x:id", "1.0:1"])
+def test_search_invalid_cursor(chats, cursor):
+    from open_webui.models.chats import parse_search_cursor
+
+    with pytest.raises(ValueError):
+        parse_search_cursor(cursor)
+
+    with pytest.raises(ValueError):
+        chats.get_chats_by_user_id_and_search_text("1", "report", cursor=cursor)
@@ -0,0 +1,52 @@
+import pytest
+
+from test.util.mock_db import mock_sqlite_db
+
+
+@pytest.fixture
+def users(tmp_path):
+    from open_webui.models.users import Users
+
+    with mock_sqlite_db(
+        tmp_path / "webui.db",
+        ["open_webui.models.users", "open_webui.models.chats"],
+        revisions=["4b5d2a3c8e91"],
+    ):
+        yield Users
+
+
+def test_flush_skips_deleted_users(users):
+    """
+    Ensure that a buffered user deleted before the flush doesn't hold back the
+    updates of others.
+    """
+    from open_webui.models.users import LastActiveBuffer, User
+    from open_webui.models import users as users_module
+
+    buffer = LastActiveBuffer(interval=60)
+    users.insert_new_user("1", "One", "one@example.com")
+    users.insert_new_user("2", "Two", "two@example.com")
+
+    buffer.touch("1")
+    buffer.touch("2")
+    with users_module.get_db() as db:
+        db.query(User).filter_by(id="2").delete()
+        db.commit()
+    buffer._pending["1"] = 1
+    buffer.flush()
+
+    assert users.get_user_by_id("1").last_active_at == 1
+    assert buffer._pending == {}
+
+
+def test_delete_user_discards_buffered_update(users, monkeypatch):
+    from open_webui.models import users as users_module
+    from open_webui.models.users import LastActiveBuffer
+
+    buffer = LastActiveBuffer(interval=60)
+    monkeypatch.setattr(users_module, "last_active_buffer", buffer)
+    users.insert_new_user("1", "One", "one@example.com")
+
+    buffer.touch("1")
+    assert users.delete_user_by_id("1")
+    assert buffer._pending == {}
@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from open_webui.routers import pipelines
+from open_webui.routers.pipelines import apply_pipeline_filters, group_filters
+
+
+def create_filter(id: str, priority: int = 0, parallel: bool = False) -> dict:
+    return {
+        "id": id,
+        "urlIdx": 0,
+        "pipeline": {"type": "filter", "priority": priority, "parallel": parallel},
+    }
+
+
+def create_request(urls: list[str]):
+    config = SimpleNamespace(
+        OPENAI_API_BASE_URLS=urls, OPENAI_API_KEYS=["key"] * len(urls)
+    )
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(config=config)))
+
+
+USER = SimpleNamespace(id="1", email="user@example.com", name="User", role="user")
+
+
+def test_group_filters():
+    """
+    Ensure that filters are chained unless they share a priority and opt in to
+    running in parallel.
+    """
+    a, b = create_filter("a"), create_filter("b")
+    c, d = create_filter("c", 1, True), create_filter("d", 1, True)
+    e = create_filter("e", 1)
+    f = create_filter("f", 2, True)
+
+    assert group_filters([a, b, c, d, e, f]) == [[a], [b], [c, d], [e], [f]]
+
+
+def test_filters_with_same_priority_are_chained(monkeypatch):
+    """
+    Ensure that filters see the output of the ones before them.
+    """
+
+    async def call_pipeline_filter(request, filter, user, payload, stage):
+        return {
+            **payload,
+            "messages": payload["messages"] + [{"content": filter["id"]}],
+        }
+
+    monkeypatch.setattr(pipelines, "call_pipeline_filter", call_pipeline_filter)
+
+    groups = group_filters([create_filter("a"), create_filter("b")])
+    payload = asyncio.run(
+        apply_pipeline_filters(
+            create_request([]), groups, USER, {"messages": []}, "inlet"
+        )
+    )
+
+    assert payload["messages"] == [{"content": "a"}, {"content": "b"}]
+
+
+def test_filter_without_connection_is_skipped():
+    filter = {**create_filter("a"), "urlIdx": 3}
+    payload = asyncio.run(
+        apply_pipeline_filters(
+            create_request(["http://localhost:9099"]),
+            [[filter]],
+            USER,
+            {"messages": []},
+            "inlet",
+        )
+    )
+
+    assert payload == {"messages": []}
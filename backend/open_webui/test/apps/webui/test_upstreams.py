@@ -0,0 +1,324 @@
+import asyncio
+import socket
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+from open_webui.utils import upstreams
+from open_webui.utils.upstreams import UpstreamRouter
+
+A, B, C = "http://a:11434", "http://b:11434", "http://c:11434"
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(1000)
+    monkeypatch.setattr(upstreams, "time", clock)
+    return clock
+
+
+def create_router(**kwargs) -> UpstreamRouter:
+    return UpstreamRouter(
+        **{
+            "eject_threshold": 2,
+            "eject_cooldown": 30,
+            "enable_affinity": False,
+            **kwargs,
+        }
+    )
+
+
+def test_select_prefers_lower_score(clock):
+    """
+    Ensure that of two upstreams the one with less load * latency is picked.
+    """
+    router = create_router()
+    router.record_success(A, 1.0)
+    router.record_success(B, 1.0)
+    router.start(A)
+
+    assert all(router.select([A, B]) == B for _ in range(20))
+
+    # A faster upstream takes more requests in flight before losing
+    router.record_success(B, 5.0)
+    assert all(router.select([A, B]) == A for _ in range(20))
+
+
+def test_select_tries_unmeasured_upstream(clock):
+    router = create_router()
+    router.record_success(A, 0.5)
+
+    assert all(router.select([A, B]) == B for _ in range(20))
+
+
+def test_eject_and_probe(clock):
+    """
+    Ensure that failing upstreams are ejected, and let a single probe through
+    once the cooldown is over.
+    """
+    router = create_router()
+    router.record_failure(A)
+    assert not router.is_ejected(A, clock.now)
+    router.record_failure(A)
+    assert router.is_ejected(A, clock.now)
+    assert all(router.select([A, B]) == B for _ in range(20))
+
+    clock.now += 31
+    assert not router.is_ejected(A, clock.now)
+    probe = router.start(A)
+
+    # Ejected again while the probe is in flight
+    assert router.is_ejected(A, clock.now)
+    assert all(router.select([A, B]) == B for _ in range(20))
+
+    clock.now += 10
+    probe.failed()
+    probe.release()
+
+    # A failed probe re-ejects for a full cooldown
+    clock.now += 29
+    assert router.is_ejected(A, clock.now)
+    assert router.get_stats(A).failures == 2
+    assert router.get_stats(A).in_flight == 0
+
+
+def test_probe_success_recovers(clock):
+    router = create_router()
+    router.record_failure(A)
+    router.record_failure(A)
+
+    clock.now += 31
+    probe = router.start(A)
+    clock.now += 0.5
+    probe.responded(200)
+
+    stats = router.get_stats(A)
+    assert not router.is_ejected(A, clock.now)
+    assert stats.failures == 0
+    assert stats.ejected_at is None
+    assert stats.latency == 0.5
+
+
+def test_select_with_all_ejected(clock):
+    """
+    Ensure that upstreams are still tried when every one of them is ejected.
+    """
+    router = create_router(eject_threshold=1)
+    router.record_failure(A)
+    router.record_failure(B)
+
+    assert router.select([A, B]) in (A, B)
+
+
+def test_affinity(clock):
+    """
+    Ensure that requests with the same affinity key stay on one upstream
+    while it's healthy.
+    """
+    router = create_router(enable_affinity=True)
+    url = router.select([A, B, C], affinity_key="chat")
+
+    assert all(router.select([A, B, C], affinity_key="chat") == url for _ in range(20))
+
+    router.record_failure(url)
+    router.record_failure(url)
+    other = router.select([A, B, C], affinity_key="chat")
+    assert other != url
+
+    # The new upstream is kept, even once the first one is healthy again
+    clock.now += 31
+    router.record_success(url, 0.1)
+    assert router.select([A, B, C], affinity_key="chat") == other
+
+
+def test_affinity_ttl_and_lru(clock):
+    router = create_router(enable_affinity=True, affinity_ttl=10, max_affinity_keys=2)
+    router.set_affinity("a", A, clock.now)
+    router.set_affinity("b", B, clock.now)
+
+    # Using a key refreshes it, so the least recently used one is evicted
+    router.select([A, B], affinity_key="a")
+    router.set_affinity("c", C, clock.now)
+    assert router.get_affinity("a", clock.now) == A
+    assert router.get_affinity("b", clock.now) is None
+    assert router.get_affinity("c", clock.now) == C
+
+    clock.now += 11
+    assert router.get_affinity("a", clock.now) is None
+    assert "a" not in router._affinity
+
+
+def test_affinity_prefers_loaded_models(clock):
+    router = create_router(enable_affinity=True)
+    router.set_loaded_models(B, ["llama3:latest"])
+
+    assert all(router.select([A, B, C], model="llama3:latest") == B for _ in range(20))
+    assert router.select([A, B, C], model="other") in (A, B, C)
+
+
+def test_request_is_recorded_and_released_once(clock):
+    router = create_router()
+    request = router.start(A)
+    request.responded(500)
+    request.failed()
+    request.release()
+    request.release()
+
+    stats = router.get_stats(A)
+    assert stats.failures == 1
+    assert stats.in_flight == 0
+
+
+def get_unused_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def run_send_post_request(monkeypatch, status: int, handler=None, **kwargs):
+    """
+    Sends a request to a local server answering with `status` (or `handler`)
+    through `send_post_request` and a fresh router, which is returned with the
+    result. Streamed responses are sent on, the result is then the in flight
+    count seen while sending them, or the error it failed with.
+    """
+    from open_webui.routers import ollama
+    from open_webui.utils.sessions import ClientSessionPool
+
+    router = create_router(eject_threshold=1)
+    sessions = ClientSessionPool(
+        limit=10, limit_per_host=10, keepalive_timeout=5, dns_cache_ttl=None
+    )
+    monkeypatch.setattr(ollama, "OLLAMA_UPSTREAMS", router)
+    monkeypatch.setattr(ollama, "CLIENT_SESSIONS", sessions)
+
+    async def json_handler(request):
+        return web.json_response(
+            {"error": "failed"} if status >= 400 else {"done": True}, status=status
+        )
+
+    app = web.Application()
+    app.router.add_post("/api/chat", handler or json_handler)
+    server = TestServer(app)
+    await server.start_server()
+    url = str(server.make_url(""))
+    try:
+        try:
+            result = await ollama.send_post_request(
+                f"{url}/api/chat", "{}", upstream=url, **kwargs
+            )
+        except HTTPException as e:
+            result = e
+
+        if isinstance(result, StreamingResponse):
+            in_flight = []
+
+            async def receive():
+                # The client never disconnects
+                await asyncio.Event().wait()
+
+            async def send(message):
+                in_flight.append(router.get_stats(url).in_flight)
+
+            try:
+                await result({"type": "http"}, receive, send)
+                result = in_flight
+            except Exception as e:
+                result = e
+        return router, url, result
+    finally:
+        await sessions.close()
+        await server.close()
+
+
+@pytest.mark.parametrize("status", [400, 500])
+def test_send_post_request_releases_on_error_status(monkeypatch, status):
+    """
+    Ensure that requests failing with an error status don't stay in flight.
+    """
+    router, url, result = asyncio.run(
+        run_send_post_request(monkeypatch, status, stream=False)
+    )
+
+    assert isinstance(result, HTTPException)
+    assert result.status_code == status
+
+    stats = router.get_stats(url)
+    assert stats.in_flight == 0
+    # Only server errors count against the upstream
+    assert router.is_ejected(url, upstreams.time.monotonic()) == (status >= 500)
+
+
+def test_send_post_request_releases_on_connection_error(monkeypatch):
+    from open_webui.routers import ollama
+
+    router = create_router(eject_threshold=1)
+    monkeypatch.setattr(ollama, "OLLAMA_UPSTREAMS", router)
+    url = f"http://127.0.0.1:{get_unused_port()}"
+
+    async def send():
+        try:
+            with pytest.raises(HTTPException):
+                await ollama.send_post_request(f"{url}/api/chat", "{}", upstream=url)
+        finally:
+            await ollama.CLIENT_SESSIONS.close()
+
+    asyncio.run(send())
+
+    stats = router.get_stats(url)
+    assert stats.in_flight == 0
+    assert stats.failures == 1
+
+
+def test_send_post_request_releases_once_streamed(monkeypatch):
+    """
+    Ensure that streamed requests stay in flight until the body is sent.
+    """
+    router, url, in_flight = asyncio.run(run_send_post_request(monkeypatch, 200))
+
+    assert in_flight and all(count == 1 for count in in_flight)
+    stats = router.get_stats(url)
+    assert stats.in_flight == 0
+    assert stats.failures == 0
+    assert stats.latency is not None
+
+
+def test_send_post_request_releases_when_stream_fails(monkeypatch):
+    """
+    Ensure that streams failing partway through don't stay in flight.
+    """
+
+    async def handler(request):
+        response = web.StreamResponse()
+        await response.prepare(request)
+        await response.write(b'{"done": false}\n')
+        # Drop the connection before the body is complete
+        request.transport.close()
+        return response
+
+    router, url, result = asyncio.run(
+        run_send_post_request(monkeypatch, 200, handler=handler)
+    )
+
+    assert isinstance(result, Exception)
+    assert router.get_stats(url).in_flight == 0
+
+
+def test_send_post_request_releases_without_stream(monkeypatch):
+    router, url, result = asyncio.run(
+        run_send_post_request(monkeypatch, 200, stream=False)
+    )
+
+    assert result == {"done": True}
+    assert router.get_stats(url).in_flight == 0
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Optional
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from open_webui.utils import webhook
+from open_webui.utils.sessions import ClientSessionPool
+from open_webui.utils.webhook import WebhookDispatcher
+
+
+HOOK_PATH = "/hook"
+# Chat webhooks are recognized by their URL, which this one contains
+CHAT_HOOK_PATH = "/https://hooks.slack.com/services/T000"
+
+
+class WebhookServer:
+    """Answers webhook posts with the given responses in turn, then with 200."""
+
+    def __init__(self, responses: list[web.Response] = ()):
+        self.responses = list(responses)
+        self.requests: list[tuple[float, dict]] = []
+
+        app = web.Application()
+        app.router.add_post("/{path:.*}", self.handle)
+        self.server = TestServer(app)
+
+    async def handle(self, request):
+        self.requests.append((time.monotonic(), await request.json()))
+        if self.responses:
+            return self.responses.pop(0)
+        return web.Response(text="ok")
+
+    def url(self, path: str) -> str:
+        return str(self.server.make_url(path))
+
+
+async def run_dispatcher(
+    monkeypatch,
+    server: WebhookServer,
+    notifications: list[tuple],
+    redis=None,
+    expected: Optional[int] = None,
+    setup: Optional[Callable] = None,
+    **kwargs,
+) -> WebhookDispatcher:
+    """
+    Enqueues the (path, message, event_data) notifications to the server and
+    waits until all of them, or `expected` ones, were delivered or dropped.
+    `setup` is awaited once the server is up, before the dispatcher starts.
+    """
+    sessions = ClientSessionPool(
+        limit=10, limit_per_host=10, keepalive_timeout=5, dns_cache_ttl=None
+    )
+    monkeypatch.setattr(webhook, "CLIENT_SESSIONS", sessions)
+
+    dispatcher = WebhookDispatcher(
+        **{
+            "concurrency": 2,
+            "timeout": 5,
+            "max_retries": 3,
+            "batch_window": 0,
+            "queue_size": 100,
+            **kwargs,
+        }
+    )
+    dispatcher.BACKOFF_BASE = 0.01
+    dispatcher.redis = redis
+    if expected is None:
+        expected = len(notifications)
+
+    await server.server.start_server()
+    if setup is not None:
+        await setup()
+    await dispatcher.start()
+    try:
+        for path, message, event_data in notifications:
+            assert dispatcher.enqueue(server.url(path), message, event_data)
+
+        async def wait():
+            while dispatcher.delivered + dispatcher.dead < expected:
+                await asyncio.sleep(0.01)
+
+        await asyncio.wait_for(wait(), timeout=10)
+        return dispatcher
+    finally:
+        await dispatcher.stop()
+        await sessions.close()
+        await server.server.close()
+
+
+def run(monkeypatch, server: WebhookServer, notifications: list[tuple], **kwargs):
+    return asyncio.run(run_dispatcher(monkeypatch, server, notifications, **kwargs))
+
+
+@pytest.mark.parametrize("status", [500, 502, 408, 429])
+def test_retry_on_retryable_status(monkeypatch, status):
+    """
+    Ensure that deliveries failing with 408, 429 or 5xx are retried.
+    """
+    server = WebhookServer([web.Response(status=status), web.Response(status=status)])
+    dispatcher = run(monkeypatch, server, [(HOOK_PATH, "Hi", {"action": "signup"})])
+
+    assert len(server.requests) == 3
+    assert all(payload == {"action": "signup"} for _, payload in server.requests)
+    assert dispatcher.delivered == 1
+    assert dispatcher.retried == 2
+    assert dispatcher.dead == 0
+
+
+def test_retry_after(monkeypatch):
+    """
+    Ensure that a longer Retry-After than the backoff is waited for.
+    """
+    server = WebhookServer([web.Response(status=429, headers={"Retry-After": "0.5"})])
+    dispatcher = run(monkeypatch, server, [(HOOK_PATH, "Hi", {})])
+
+    (first, _), (second, _) = server.requests
+    assert second - first >= 0.5
+    assert dispatcher.delivered == 1
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_no_retry_on_client_error(monkeypatch, status):
+    server = WebhookServer([web.Response(status=status)])
+    dispatcher = run(monkeypatch, server, [(HOOK_PATH, "Hi", {})])
+
+    assert len(server.requests) == 1
+    assert dispatcher.retried == 0
+    assert dispatcher.dead == 1
+
+
+def test_dead_after_max_retries(monkeypatch):
+    server = WebhookServer([web.Response(status=500) for _ in range(5)])
+    dispatcher = run(monkeypatch, server, [(HOOK_PATH, "Hi", {})], max_retries=2)
+
+    assert len(server.requests) == 3
+    assert dispatcher.retried == 2
+    assert dispatcher.delivered == 0
+    assert dispatcher.dead == 1
+
+
+def test_chat_webhook_batching(monkeypatch):
+    """
+    Ensure that notifications to a chat webhook within the batch window are
+    sent as one message, and others one by one.
+    """
+    server = WebhookServer()
+    dispatcher = run(
+        monkeypatch,
+        server,
+        [
+            (CHAT_HOOK_PATH, "New user: a", {"action": "signup"}),
+            (HOOK_PATH, "New user: a", {"action": "signup"}),
+            (CHAT_HOOK_PATH, "New user: b", {"action": "signup"}),
+            (HOOK_PATH, "New user: b", {"action": "signup"}),
+        ],
+        batch_window=0.2,
+    )
+
+    payloads = [payload for _, payload in server.requests]
+    assert payloads.count({"text": "New user: a\n\nNew user: b"}) == 1
+    assert payloads.count({"action": "signup"}) == 2
+    assert len(payloads) == 3
+    assert dispatcher.delivered == 4
+
+
+def test_retry_keeps_batch(monkeypatch):
+    """
+    Ensure that a batch that failed is retried as a whole.
+    """
+    server = WebhookServer([web.Response(status=503)])
+
+    dispatcher = run(
+        monkeypatch,
+        server,
+        [(CHAT_HOOK_PATH, "a", {}), (CHAT_HOOK_PATH, "b", {})],
+        batch_window=0.1,
+    )
+
+    assert [payload for _, payload in server.requests] == [{"text": "a\n\nb"}] * 2
+    assert dispatcher.retried == 1
+    assert dispatcher.delivered == 2
+
+
+def test_dead_letters_leave_out_user_details(monkeypatch, caplog):
+    server = WebhookServer([web.Response(status=400)])
+    user = {"id": "1", "email": "user@example.com", "api_key": "sk-secret"}
+    event_data = {"action": "signup", "message": "Hi", "user": json.dumps(user)}
+
+    with caplog.at_level(logging.ERROR, logger=webhook.__name__):
+        run(monkeypatch, server, [(HOOK_PATH, "Hi", event_data)])
+
+    assert '{"action": "signup", "user_id": "1"}' in caplog.text
+    assert "user@example.com" not in caplog.text
+    assert "sk-secret" not in caplog.text
+
+
+def create_redis(server):
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+
+
+def get_list(redis_server, key: str) -> list:
+    async def get():
+        redis = create_redis(redis_server)
+        try:
+            return await redis.lrange(key, 0, -1)
+        finally:
+            await redis.aclose()
+
+    return asyncio.run(get())
+
+
+def test_redis_processing_list_is_emptied(monkeypatch):
+    """
+    Ensure that notifications taken from the Redis queue are removed from the
+    processing list once delivered or dead.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_server = fakeredis.FakeServer()
+    server = WebhookServer([web.Response(status=400)])
+
+    dispatcher = run(
+        monkeypatch,
+        server,
+        [(HOOK_PATH, "a", {}), (HOOK_PATH, "b", {})],
+        redis=create_redis(redis_server),
+    )
+
+    assert dispatcher.delivered == 1
+    assert dispatcher.dead == 1
+    assert get_list(redis_server, dispatcher.processing_key) == []
+    assert get_list(redis_server, WebhookDispatcher.REDIS_QUEUE_KEY) == []
+
+
+def test_redis_requeues_notifications_of_gone_instances(monkeypatch):
+    """
+    Ensure that notifications held by an instance without a heartbeat are
+    delivered, and those of live instances left alone.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    redis_server = fakeredis.FakeServer()
+    server = WebhookServer()
+    gone_key = f"{WebhookDispatcher.REDIS_PROCESSING_KEY_PREFIX}gone"
+    alive_key = f"{WebhookDispatcher.REDIS_PROCESSING_KEY_PREFIX}alive"
+
+    async def setup():
+        redis = create_redis(redis_server)
+        for key, message in [(gone_key, "gone"), (alive_key, "alive")]:
+            notification = {
+                "url": server.url(HOOK_PATH),
+                "message": message,
+                "event_data": {"message": message},
+            }
+            await redis.rpush(key, json.dumps(notification))
+        await redis.set(f"{WebhookDispatcher.REDIS_HEARTBEAT_KEY_PREFIX}alive", 1)
+        await redis.aclose()
+
+    dispatcher = run(
+        monkeypatch,
+        server,
+        [],
+        redis=create_redis(redis_server),
+        expected=1,
+        setup=setup,
+    )
+
+    assert [payload for _, payload in server.requests] == [{"message": "gone"}]
+    assert dispatcher.delivered == 1
+    assert get_list(redis_server, gone_key) == []
+    assert len(get_list(redis_server, alive_key)) == 1
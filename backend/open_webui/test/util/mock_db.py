@@ -0,0 +1,54 @@
+import importlib.util
+from contextlib import ExitStack, contextmanager
+from unittest.mock import patch
+
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def load_migration(revision: str):
+    from open_webui.env import OPEN_WEBUI_DIR
+
+    (path,) = (OPEN_WEBUI_DIR / "migrations" / "versions").glob(f"{revision}_*.py")
+    spec = importlib.util.spec_from_file_location(f"migration_{revision}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@contextmanager
+def mock_sqlite_db(path, modules: list[str], revisions: list[str] = ()):
+    """
+    Points `get_db` of the given model modules to a new SQLite database, with
+    the tables of the models and those added by the given migrations.
+    """
+    from open_webui.internal.db import Base
+
+    engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        with Operations.context(MigrationContext.configure(connection)):
+            for revision in revisions:
+                load_migration(revision).upgrade()
+
+    SessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=engine, expire_on_commit=False
+    )
+
+    @contextmanager
+    def get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    with ExitStack() as stack:
+        for module in modules:
+            stack.enter_context(patch(f"{module}.get_db", get_db))
+        yield engine
+    engine.dispose()
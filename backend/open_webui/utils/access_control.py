@@ -1,4 +1,4 @@
-from typing import Optional, Union, List, Dict, Any
+from typing import Optional, Union, List, Dict, Any, Set
 from open_webui.models.users import Users, UserModel
 from open_webui.models.groups import Groups
 import json
@@ -81,21 +81,44 @@ def has_access(
     user_id: str,
     type: str = "write",
     access_control: Optional[dict] = None,
+    user_group_ids: Optional[Set[str]] = None,
 ) -> bool:
+    """
+    Pass `user_group_ids` (see `Groups.get_group_ids_by_member_id`) when checking
+    many resources for the same user, so the groups are only looked up once.
+    """
     if access_control is None:
         return type == "read"
 
-    user_groups = Groups.get_groups_by_member_id(user_id)
-    user_group_ids = [group.id for group in user_groups]
+    if user_group_ids is None:
+        user_group_ids = Groups.get_group_ids_by_member_id(user_id)
     permission_access = access_control.get(type, {})
     permitted_group_ids = permission_access.get("group_ids", [])
     permitted_user_ids = permission_access.get("user_ids", [])
 
     return user_id in permitted_user_ids or any(
-        group_id in permitted_group_ids for group_id in user_group_ids
+        group_id in user_group_ids for group_id in permitted_group_ids
     )
 
 
+def has_access_many(
+    user_id: str,
+    resources: List[Any],
+    type: str = "write",
+) -> List[Any]:
+    """
+    Filter `resources` (anything with `user_id` and `access_control`
+    attributes) down to the ones the user owns or has `type` access to.
+    """
+    user_group_ids = Groups.get_group_ids_by_member_id(user_id)
+    return [
+        resource
+        for resource in resources
+        if resource.user_id == user_id
+        or has_access(user_id, type, resource.access_control, user_group_ids)
+    ]
+
+
 # Get all users with access to a resource
 def get_users_with_access(
     type: str = "write", access_control: Optional[dict] = None
@@ -9,7 +9,6 @@ import random
 import json
 import inspect
 from uuid import uuid4
-from concurrent.futures import ThreadPoolExecutor
 
 
 from fastapi import Request
@@ -66,6 +65,9 @@ from open_webui.env import (
     GLOBAL_LOG_LEVEL,
     BYPASS_MODEL_ACCESS_CONTROL,
     ENABLE_REALTIME_CHAT_SAVE,
+    REALTIME_CHAT_SAVE_INTERVAL_MS,
+    REALTIME_CHAT_SAVE_TOKENS,
+    CHAT_COMPLETION_EMIT_INTERVAL_MS,
 )
 from open_webui.constants import TASKS
 
@@ -416,20 +418,16 @@ async def chat_web_search_handler(
     try:
 
         # Offload process_web_search to a separate thread
-        loop = asyncio.get_running_loop()
-        with ThreadPoolExecutor() as executor:
-            results = await loop.run_in_executor(
-                executor,
-                lambda: process_web_search(
-                    request,
-                    SearchForm(
-                        **{
-                            "query": searchQuery,
-                        }
-                    ),
-                    user,
-                ),
-            )
+        results = await asyncio.to_thread(
+            process_web_search,
+            request,
+            SearchForm(
+                **{
+                    "query": searchQuery,
+                }
+            ),
+            user,
+        )
 
         if results:
             await event_emitter(
@@ -522,7 +520,8 @@ async def chat_completion_files_handler(
         if len(queries) == 0:
             queries = [get_last_user_message(body["messages"])]
 
-        sources = get_sources_from_files(
+        sources = await asyncio.to_thread(
+            get_sources_from_files,
             files=files,
             queries=queries,
             embedding_function=request.app.state.EMBEDDING_FUNCTION,
@@ -745,6 +744,181 @@ async def process_chat_payload(request, form_data, metadata, user, model):
     return form_data, events
 
 
+# Keys of a streamed chunk that carries nothing but a content delta
+COALESCABLE_CHUNK_KEYS = {
+    "id",
+    "object",
+    "created",
+    "model",
+    "system_fingerprint",
+    "choices",
+}
+
+
+class ChatCompletionStreamBuffer:
+    """
+    Write-behind buffer for a single streamed response.
+
+    Content deltas are coalesced and sent to the client as one `chat:completion`
+    event at most every CHAT_COMPLETION_EMIT_INTERVAL_MS, and the accumulated
+    content is saved at most every REALTIME_CHAT_SAVE_INTERVAL_MS or
+    REALTIME_CHAT_SAVE_TOKENS deltas. `flush()` must be called when the stream
+    ends and `save()` when it is cancelled, so at most one flush window of
+    content is lost if the worker dies mid-response.
+    """
+
+    def __init__(self, event_emitter, chat_id: str, message_id: str, content: str):
+        self.event_emitter = event_emitter
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.content = content
+
+        self.emit_interval = CHAT_COMPLETION_EMIT_INTERVAL_MS / 1000
+        self.save_interval = REALTIME_CHAT_SAVE_INTERVAL_MS / 1000
+        self.save_tokens = REALTIME_CHAT_SAVE_TOKENS
+
+        self._lock = asyncio.Lock()
+        self._pending_delta = ""
+        self._pending_chunk = None
+        self._unsaved_tokens = 0
+        self._saved_content = content
+        self._last_emit = self._last_save = time.monotonic()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_task: Optional[asyncio.Task] = None
+
+    async def add_delta(self, chunk: dict, value: str):
+        """Buffer a chunk whose only payload is a content delta."""
+        async with self._lock:
+            self.content = f"{self.content}{value}"
+            self._pending_delta = f"{self._pending_delta}{value}"
+            self._pending_chunk = chunk
+            self._unsaved_tokens += 1
+            await self._flush(force=False)
+
+    async def emit(self, data: dict, value: Optional[str] = None):
+        """
+        Send an event immediately, after any buffered content so ordering is
+        preserved. If the event carries a content delta, buffered deltas are
+        folded into it.
+        """
+        async with self._lock:
+            if value:
+                self.content = f"{self.content}{value}"
+                self._unsaved_tokens += 1
+                if ENABLE_REALTIME_CHAT_SAVE:
+                    data = self._with_delta(data, f"{self._pending_delta}{value}")
+                else:
+                    data = {**data, "content": self.content}
+                self._pending_delta = ""
+                self._pending_chunk = None
+                self._last_emit = time.monotonic()
+            else:
+                await self._emit_pending()
+            await self.event_emitter({"type": "chat:completion", "data": data})
+            self._maybe_save(force=False)
+
+    async def flush(self):
+        self._cancel_timer()
+        async with self._lock:
+            await self._flush(force=True)
+
+    def save(self):
+        """Synchronously persist any unsaved content, e.g. on cancellation."""
+        self._cancel_timer()
+        self._maybe_save(force=True)
+
+    @staticmethod
+    def _with_delta(chunk: dict, content: str) -> dict:
+        choice = (chunk.get("choices") or [{}])[0]
+        return {
+            **chunk,
+            "choices": [
+                {**choice, "delta": {**choice.get("delta", {}), "content": content}}
+            ],
+        }
+
+    async def _emit_pending(self):
+        if not self._pending_delta:
+            return
+        if ENABLE_REALTIME_CHAT_SAVE:
+            data = self._with_delta(self._pending_chunk, self._pending_delta)
+        else:
+            data = {"content": self.content}
+        self._pending_delta = ""
+        self._pending_chunk = None
+        self._last_emit = time.monotonic()
+        await self.event_emitter({"type": "chat:completion", "data": data})
+
+    def _has_unsaved_content(self) -> bool:
+        return ENABLE_REALTIME_CHAT_SAVE and self.content != self._saved_content
+
+    def _maybe_save(self, force: bool):
+        if not self._has_unsaved_content():
+            return
+        if not force and (
+            self._unsaved_tokens < self.save_tokens
+            and time.monotonic() - self._last_save < self.save_interval
+        ):
+            return
+
+        Chats.upsert_message_to_chat_by_id_and_message_id(
+            self.chat_id,
+            self.message_id,
+            {
+                "content": self.content,
+            },
+        )
+        self._saved_content = self.content
+        self._unsaved_tokens = 0
+        self._last_save = time.monotonic()
+
+    async def _flush(self, force: bool):
+        if force or time.monotonic() - self._last_emit >= self.emit_interval:
+            await self._emit_pending()
+        self._maybe_save(force=force)
+
+        if not force and (self._pending_delta or self._has_unsaved_content()):
+            self._schedule_timer()
+
+    def _schedule_timer(self):
+        if self._timer is not None:
+            return
+
+        now = time.monotonic()
+        delay = self.emit_interval - (now - self._last_emit)
+        if not self._pending_delta:
+            delay = self.save_interval - (now - self._last_save)
+
+        def on_timer():
+            self._timer = None
+            self._timer_task = asyncio.create_task(self._on_timer())
+            self._timer_task.add_done_callback(self._on_timer_done)
+
+        self._timer = asyncio.get_running_loop().call_later(max(delay, 0), on_timer)
+
+    async def _on_timer(self):
+        async with self._lock:
+            await self._flush(force=False)
+
+    def _on_timer_done(self, task: asyncio.Task):
+        if task is self._timer_task:
+            self._timer_task = None
+        if not task.cancelled() and task.exception() is not None:
+            log.error(
+                f"Error flushing buffered content of message {self.message_id}",
+                exc_info=task.exception(),
+            )
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        # A flush that already started must not emit after the stream ended
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            self._timer_task = None
+
+
 async def process_chat_response(
     request, response, form_data, user, events, metadata, tasks
 ):
@@ -896,7 +1070,7 @@ async def process_chat_response(
                     )
 
                     # Send a webhook notification if the user is not active
-                    if get_active_status_by_user_id(user.id) is None:
+                    if not await get_active_status_by_user_id(user.id):
                         webhook_url = Users.get_user_webhook_url_by_id(user.id)
                         if webhook_url:
                             post_webhook(
@@ -931,7 +1105,12 @@ async def process_chat_response(
             message = Chats.get_message_by_id_and_message_id(
                 metadata["chat_id"], metadata["message_id"]
             )
-            content = message.get("content", "") if message else ""
+            buffer = ChatCompletionStreamBuffer(
+                event_emitter,
+                metadata["chat_id"],
+                metadata["message_id"],
+                message.get("content", "") if message else "",
+            )
 
             try:
                 for event in events:
@@ -977,37 +1156,22 @@ async def process_chat_response(
                                     "selectedModelId": data["selected_model_id"],
                                 },
                             )
+                            await buffer.emit(data)
 
                         else:
-                            value = (
-                                data.get("choices", [])[0]
-                                .get("delta", {})
-                                .get("content")
-                            )
-
-                            if value:
-                                content = f"{content}{value}"
-
-                                if ENABLE_REALTIME_CHAT_SAVE:
-                                    # Save message in the database
-                                    Chats.upsert_message_to_chat_by_id_and_message_id(
-                                        metadata["chat_id"],
-                                        metadata["message_id"],
-                                        {
-                                            "content": content,
-                                        },
-                                    )
-                                else:
-                                    data = {
-                                        "content": content,
-                                    }
-
-                        await event_emitter(
-                            {
-                                "type": "chat:completion",
-                                "data": data,
-                            }
-                        )
+                            choice = data.get("choices", [])[0]
+                            value = choice.get("delta", {}).get("content")
+
+                            # Plain content deltas are coalesced; anything else
+                            # (usage, finish_reason, errors, ...) is sent right away.
+                            if (
+                                value
+                                and choice.get("finish_reason") is None
+                                and data.keys() <= COALESCABLE_CHUNK_KEYS
+                            ):
+                                await buffer.add_delta(data, value)
+                            else:
+                                await buffer.emit(data, value)
 
                     except Exception as e:
                         done = "data: [DONE]" in line
@@ -1017,6 +1181,9 @@ async def process_chat_response(
                         else:
                             continue
 
+                await buffer.flush()
+                content = buffer.content
+
                 title = Chats.get_chat_title_by_id(metadata["chat_id"])
                 data = {"done": True, "content": content, "title": title}
 
@@ -1031,7 +1198,7 @@ async def process_chat_response(
                     )
 
                 # Send a webhook notification if the user is not active
-                if get_active_status_by_user_id(user.id) is None:
+                if not await get_active_status_by_user_id(user.id):
                     webhook_url = Users.get_user_webhook_url_by_id(user.id)
                     if webhook_url:
                         post_webhook(
@@ -1057,6 +1224,7 @@ async def process_chat_response(
                 log.info(
                     f"Task '{task_id}' was cancelled, saving messages up to this point"
                 )
+                buffer.save()
                 await event_emitter({"type": "task-cancelled"})
 
                 if not ENABLE_REALTIME_CHAT_SAVE:
@@ -1065,7 +1233,7 @@ async def process_chat_response(
                         metadata["chat_id"],
                         metadata["message_id"],
                         {
-                            "content": content,
+                            "content": buffer.content,
                         },
                     )
 
@@ -1,6 +1,11 @@
+import asyncio
+import hashlib
+import json
 import time
 import logging
 import sys
+from collections import OrderedDict
+from typing import Optional
 
 from aiocache import cached
 from fastapi import Request
@@ -10,7 +15,8 @@ from open_webui.functions import get_function_models
 
 
 from open_webui.models.functions import Functions
-from open_webui.models.models import Models
+from open_webui.models.groups import Groups
+from open_webui.models.models import MODEL_LIST_VERSION, ModelModel, Models
 
 
 from open_webui.utils.plugin import load_function_module_by_id
@@ -19,9 +25,10 @@ from open_webui.utils.access_control import has_access
 
 from open_webui.config import (
     config,
+    config_cache,
 )
 
-from open_webui.env import SRC_LOG_LEVELS, GLOBAL_LOG_LEVEL
+from open_webui.env import SRC_LOG_LEVELS, GLOBAL_LOG_LEVEL, BYPASS_MODEL_ACCESS_CONTROL
 
 
 logging.basicConfig(stream=sys.stdout, level=GLOBAL_LOG_LEVEL)
@@ -58,12 +65,13 @@ async def get_all_base_models(request: Request):
     return models
 
 
-async def get_all_models(request):
+async def build_all_models(request) -> tuple[list[dict], list[ModelModel]]:
+    """Returns the merged model list and the custom models it was built from."""
     models = await get_all_base_models(request)
 
     # If there are no models, return an empty list
     if len(models) == 0:
-        return []
+        return [], []
 
     # Add arena models
     if request.app.state.config.ENABLE_EVALUATION_ARENA_MODELS:
@@ -100,71 +108,80 @@ async def get_all_models(request):
             ]
         models = models + arena_models
 
-    global_action_ids = [
-        function.id for function in Functions.get_global_action_functions()
-    ]
-    enabled_action_ids = [
-        function.id
-        for function in Functions.get_functions_by_type("action", active_only=True)
-    ]
+    # Custom models apply to the model with the same id, or the same id
+    # without the ":tag" suffix
+    def get_model_index(models):
+        index = {}
+        for model in models:
+            add_to_model_index(index, model)
+        return index
+
+    def add_to_model_index(index, model):
+        index.setdefault(model["id"], []).append(model)
+        base_id = model["id"].split(":")[0]
+        if base_id != model["id"]:
+            index.setdefault(base_id, []).append(model)
 
     custom_models = Models.get_all_models()
+
+    index = get_model_index(models)
+    removed = set()
+    for custom_model in custom_models:
+        if custom_model.base_model_id is not None:
+            continue
+
+        for model in index.get(custom_model.id, []):
+            if custom_model.is_active:
+                model["name"] = custom_model.name
+                model["info"] = custom_model.model_dump()
+                model["action_ids"] = list(
+                    model["info"].get("meta", {}).get("actionIds", [])
+                )
+            else:
+                removed.add(model["id"])
+
+    if removed:
+        models = [model for model in models if model["id"] not in removed]
+        index = get_model_index(models)
+
+    model_ids = {model["id"] for model in models}
     for custom_model in custom_models:
-        if custom_model.base_model_id is None:
-            for model in models:
-                if (
-                    custom_model.id == model["id"]
-                    or custom_model.id == model["id"].split(":")[0]
-                ):
-                    if custom_model.is_active:
-                        model["name"] = custom_model.name
-                        model["info"] = custom_model.model_dump()
-
-                        action_ids = []
-                        if "info" in model and "meta" in model["info"]:
-                            action_ids.extend(
-                                model["info"]["meta"].get("actionIds", [])
-                            )
-
-                        model["action_ids"] = action_ids
-                    else:
-                        models.remove(model)
-
-        elif custom_model.is_active and (
-            custom_model.id not in [model["id"] for model in models]
+        if (
+            custom_model.base_model_id is None
+            or not custom_model.is_active
+            or custom_model.id in model_ids
         ):
-            owned_by = "openai"
-            pipe = None
-            action_ids = []
-
-            for model in models:
-                if (
-                    custom_model.base_model_id == model["id"]
-                    or custom_model.base_model_id == model["id"].split(":")[0]
-                ):
-                    owned_by = model["owned_by"]
-                    if "pipe" in model:
-                        pipe = model["pipe"]
-                    break
-
-            if custom_model.meta:
-                meta = custom_model.meta.model_dump()
-                if "actionIds" in meta:
-                    action_ids.extend(meta["actionIds"])
-
-            models.append(
-                {
-                    "id": f"{custom_model.id}",
-                    "name": custom_model.name,
-                    "object": "model",
-                    "created": custom_model.created_at,
-                    "owned_by": owned_by,
-                    "info": custom_model.model_dump(),
-                    "preset": True,
-                    **({"pipe": pipe} if pipe is not None else {}),
-                    "action_ids": action_ids,
-                }
-            )
+            continue
+
+        owned_by = "openai"
+        pipe = None
+        action_ids = []
+
+        base_models = index.get(custom_model.base_model_id)
+        if base_models:
+            owned_by = base_models[0]["owned_by"]
+            if "pipe" in base_models[0]:
+                pipe = base_models[0]["pipe"]
+
+        if custom_model.meta:
+            meta = custom_model.meta.model_dump()
+            if "actionIds" in meta:
+                action_ids.extend(meta["actionIds"])
+
+        model = {
+            "id": f"{custom_model.id}",
+            "name": custom_model.name,
+            "object": "model",
+            "created": custom_model.created_at,
+            "owned_by": owned_by,
+            "info": custom_model.model_dump(),
+            "preset": True,
+            **({"pipe": pipe} if pipe is not None else {}),
+            "action_ids": action_ids,
+        }
+        models.append(model)
+        model_ids.add(model["id"])
+        add_to_model_index(index, model)
 
     # Process action_ids to get the actions
     def get_action_items_from_module(function, module):
@@ -198,48 +215,217 @@ async def get_all_models(request):
         else:
             function_module, _, _ = load_function_module_by_id(function_id)
             request.app.state.FUNCTIONS[function_id] = function_module
+        return function_module
+
+    global_action_ids = {
+        function.id for function in Functions.get_global_action_functions()
+    }
+    enabled_actions = {
+        function.id: function
+        for function in Functions.get_functions_by_type("action", active_only=True)
+    }
+    action_items = {}
 
     for model in models:
         action_ids = [
             action_id
-            for action_id in list(set(model.pop("action_ids", []) + global_action_ids))
-            if action_id in enabled_action_ids
+            for action_id in set(model.pop("action_ids", [])) | global_action_ids
+            if action_id in enabled_actions
         ]
 
         model["actions"] = []
         for action_id in action_ids:
-            action_function = Functions.get_function_by_id(action_id)
-            if action_function is None:
-                raise Exception(f"Action not found: {action_id}")
+            if action_id not in action_items:
+                action_function = enabled_actions[action_id]
+                function_module = get_function_module_by_id(action_id)
+                action_items[action_id] = get_action_items_from_module(
+                    action_function, function_module
+                )
+            model["actions"].extend(action_items[action_id])
+
+    log.debug(f"build_all_models() returned {len(models)} models")
+    return models, custom_models
+
+
+class ModelCatalog:
+    """
+    The merged model list, built once and reused until its version stamp
+    changes, plus a per-user view of the models each user may see.
+
+    The stamp combines `MODEL_LIST_VERSION` (bumped on model, function and
+    upstream model changes) with the config version. Upstream servers can also
+    change their model lists without telling us, so the list is rebuilt once
+    it is older than `max_age` seconds; the per-user views are only dropped if
+    the rebuilt list actually differs.
+    """
+
+    def __init__(self, max_age: float, max_users: int):
+        self.max_age = max_age
+        self.max_users = max_users
+
+        self._lock = asyncio.Lock()
+        self._stamp: Optional[tuple[int, int]] = None
+        self._built_at = 0.0
+        self._fingerprint: Optional[str] = None
+        self.generation = 0
+
+        self.models: list[dict] = []
+        self.models_by_id: dict[str, dict] = {}
+        # Owner and access control of every custom model, by model id
+        self.access: dict[str, tuple[str, Optional[dict]]] = {}
+        self.model_order_list: list[str] = []
+        self._views: OrderedDict[str, tuple[tuple, dict[str, dict], list]] = (
+            OrderedDict()
+        )
+
+    @staticmethod
+    def get_stamp() -> tuple[int, int]:
+        return MODEL_LIST_VERSION.get(), config_cache.version
+
+    @staticmethod
+    def get_fingerprint(models: list[dict]) -> str:
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    {key: value for key, value in model.items() if key != "created"}
+                    for model in models
+                ],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+
+    def _is_current(self, stamp: tuple[int, int]) -> bool:
+        return self._stamp == stamp and time.monotonic() - self._built_at < self.max_age
+
+    async def get(self, request) -> list[dict]:
+        stamp = self.get_stamp()
+        if not self._is_current(stamp):
+            async with self._lock:
+                # Someone else may have rebuilt it while we were waiting
+                stamp = self.get_stamp()
+                if not self._is_current(stamp):
+                    models, custom_models = await build_all_models(request)
+                    self._install(
+                        stamp,
+                        models,
+                        custom_models,
+                        request.app.state.config.MODEL_ORDER_LIST,
+                    )
+
+        request.app.state.MODELS = self.models_by_id
+        return self.models
+
+    def _install(
+        self,
+        stamp: tuple[int, int],
+        models: list[dict],
+        custom_models: list[ModelModel],
+        model_order_list: list[str],
+    ):
+        fingerprint = self.get_fingerprint(models)
+        if stamp != self._stamp or fingerprint != self._fingerprint:
+            self.generation += 1
+            self._views.clear()
+
+        self._stamp = stamp
+        self._built_at = time.monotonic()
+        self._fingerprint = fingerprint
+        self.models = models
+        self.models_by_id = {model["id"]: model for model in models}
+        self.access = {
+            custom_model.id: (custom_model.user_id, custom_model.access_control)
+            for custom_model in custom_models
+        }
+        self.model_order_list = model_order_list
+
+    def _has_access(self, user_id: str, user_group_ids: set[str], model: dict):
+        if model.get("arena"):
+            return has_access(
+                user_id,
+                type="read",
+                access_control=model.get("info", {})
+                .get("meta", {})
+                .get("access_control", {}),
+                user_group_ids=user_group_ids,
+            )
 
-            function_module = get_function_module_by_id(action_id)
-            model["actions"].extend(
-                get_action_items_from_module(action_function, function_module)
+        # Models without a custom model entry are only visible to admins
+        if model["id"] not in self.access:
+            return False
+        owner_id, access_control = self.access[model["id"]]
+        return user_id == owner_id or has_access(
+            user_id,
+            type="read",
+            access_control=access_control,
+            user_group_ids=user_group_ids,
+        )
+
+    def _get_view(self, user) -> tuple[dict[str, dict], list]:
+        if user.role == "user" and not BYPASS_MODEL_ACCESS_CONTROL:
+            user_group_ids = Groups.get_group_ids_by_member_id(user.id)
+        else:
+            user_group_ids = None
+
+        key = (
+            self.generation,
+            frozenset(user_group_ids) if user_group_ids is not None else None,
+        )
+        view = self._views.get(user.id)
+        if view is not None and view[0] == key:
+            self._views.move_to_end(user.id)
+            return view[1], view[2]
+
+        if user_group_ids is None:
+            models = self.models_by_id
+        else:
+            models = {
+                model["id"]: model
+                for model in self.models
+                if self._has_access(user.id, user_group_ids, model)
+            }
+
+        # The list served by /api/models: without filter pipelines, ordered
+        # by the admin-defined model order
+        model_list = [
+            model
+            for model in models.values()
+            if "pipeline" not in model
+            or model["pipeline"].get("type", None) != "filter"
+        ]
+        if self.model_order_list:
+            model_order_dict = {
+                model_id: i for i, model_id in enumerate(self.model_order_list)
+            }
+            # Sort models by order list priority, with fallback for those not in the list
+            model_list.sort(
+                key=lambda x: (model_order_dict.get(x["id"], float("inf")), x["name"])
             )
-    log.debug(f"get_all_models() returned {len(models)} models")
 
-    request.app.state.MODELS = {model["id"]: model for model in models}
-    return models
+        self._views[user.id] = (key, models, model_list)
+        while len(self._views) > self.max_users:
+            self._views.popitem(last=False)
+        return models, model_list
+
+    def get_user_models(self, user) -> dict[str, dict]:
+        """The models the user may use, by id."""
+        return self._get_view(user)[0]
+
+    def get_user_model_list(self, user) -> list[dict]:
+        """The models the user may see in the model selector, in order."""
+        return self._get_view(user)[1]
+
+
+MODEL_CATALOG = ModelCatalog(
+    max_age=config.MODEL_LIST_CACHE_MAX_AGE,
+    max_users=config.MODEL_LIST_CACHE_MAX_USERS,
+)
+
+
+async def get_all_models(request) -> list[dict]:
+    return await MODEL_CATALOG.get(request)
 
 
 def check_model_access(user, model):
-    if model.get("arena"):
-        if not has_access(
-            user.id,
-            type="read",
-            access_control=model.get("info", {})
-            .get("meta", {})
-            .get("access_control", {}),
-        ):
-            raise Exception("Model not found")
-    else:
-        model_info = Models.get_model_by_id(model.get("id"))
-        if not model_info:
-            raise Exception("Model not found")
-        elif not (
-            user.id == model_info.user_id
-            or has_access(
-                user.id, type="read", access_control=model_info.access_control
-            )
-        ):
-            raise Exception("Model not found")
+    if model.get("id") not in MODEL_CATALOG.get_user_models(user):
+        raise Exception("Model not found")
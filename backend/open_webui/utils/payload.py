@@ -187,4 +187,8 @@ def convert_payload_openai_to_ollama(openai_payload: dict) -> dict:
     if ollama_options:
         ollama_payload["options"] = ollama_options
 
+    # Not sent to Ollama, but used to route requests of a chat to one upstream
+    if "metadata" in openai_payload:
+        ollama_payload["metadata"] = openai_payload["metadata"]
+
     return ollama_payload
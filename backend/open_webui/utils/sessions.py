@@ -0,0 +1,99 @@
+import logging
+from typing import Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from open_webui.env import (
+    AIOHTTP_CLIENT_DNS_CACHE_TTL,
+    AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT,
+    AIOHTTP_CLIENT_POOL_LIMIT,
+    AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+
+class ClientSessionPool:
+    """
+    Long-lived aiohttp sessions keyed by upstream base URL (scheme://host:port),
+    so requests to the same upstream reuse keep-alive connections, TLS sessions
+    and cached DNS lookups instead of paying for them on every call.
+
+    Sessions carry no default timeout; pass `timeout=` per request. Responses
+    must be closed (or fully read) to hand their connection back to the pool.
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        limit_per_host: int,
+        keepalive_timeout: float,
+        dns_cache_ttl: Optional[int],
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._sessions: dict[str, aiohttp.ClientSession] = {}
+
+    @staticmethod
+    def get_base_url(url: str) -> str:
+        parsed_url = urlparse(url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc}"
+
+    def get(self, url: str) -> aiohttp.ClientSession:
+        base_url = self.get_base_url(url)
+        session = self._sessions.get(base_url)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                use_dns_cache=True,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            session = aiohttp.ClientSession(connector=connector, trust_env=True)
+            self._sessions[base_url] = session
+            log.debug(f"Opened client session for {base_url}")
+        return session
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+    def stats(self) -> dict:
+        pools = {}
+        for base_url, session in self._sessions.items():
+            connector = session.connector
+            if connector is None or session.closed:
+                continue
+
+            # aiohttp doesn't expose these publicly
+            acquired = len(getattr(connector, "_acquired", ()))
+            idle = sum(
+                len(conns) for conns in getattr(connector, "_conns", {}).values()
+            )
+            pools[base_url] = {
+                "active": acquired,
+                "idle": idle,
+                "limit": connector.limit,
+                "limit_per_host": connector.limit_per_host,
+            }
+
+        return {
+            "keepalive_timeout": self.keepalive_timeout,
+            "dns_cache_ttl": self.dns_cache_ttl,
+            "pools": pools,
+        }
+
+
+CLIENT_SESSIONS = ClientSessionPool(
+    limit=AIOHTTP_CLIENT_POOL_LIMIT,
+    limit_per_host=AIOHTTP_CLIENT_POOL_LIMIT_PER_HOST,
+    keepalive_timeout=AIOHTTP_CLIENT_KEEPALIVE_TIMEOUT,
+    dns_cache_ttl=AIOHTTP_CLIENT_DNS_CACHE_TTL,
+)
@@ -0,0 +1,335 @@
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+
+import aiofiles
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from open_webui.config import config
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["AUDIO"])
+
+
+class SpeechSynthesis:
+    """
+    Audio of a synthesis in progress. It is kept in memory until the cache
+    file is complete, so every request for the same speech can stream it as
+    it is generated.
+    """
+
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.done = False
+        self.error: Optional[Exception] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def append(self, chunk: bytes):
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+
+    async def finish(self, error: Optional[Exception] = None):
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+
+    async def wait_started(self):
+        """Raises the synthesis error if it failed before producing audio."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.chunks or self.done)
+            if self.error is not None and not self.chunks:
+                raise self.error
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: sent < len(self.chunks) or self.done
+                )
+                chunks = self.chunks[sent:]
+                sent = len(self.chunks)
+                finished = self.done and sent == len(self.chunks)
+
+            for chunk in chunks:
+                yield chunk
+            if finished:
+                return
+
+
+class SpeechCache:
+    """
+    Disk cache of synthesized speech, `{key}.mp3` in `directory`.
+
+    Entries beyond `max_size` bytes are evicted least recently used first,
+    and entries older than `max_age` seconds are synthesized again. Concurrent
+    requests for the same speech share one synthesis, streamed to all of them
+    while the file is being written.
+
+    With `use_s3`, entries are also shared through the S3 bucket of the
+    storage provider, so replicas don't synthesize what another one already
+    has.
+    """
+
+    S3_KEY_PREFIX = "speech-cache/"
+    # Other workers add files too, pick them up for size accounting
+    RESCAN_INTERVAL = 300
+
+    def __init__(self, directory: Path, max_size: int, max_age: int, use_s3: bool):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_age = max_age
+        self.use_s3 = use_s3
+        self._s3_client = None
+
+        # key -> (size, created at)
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._size = 0
+        self._scanned_at: Optional[float] = None
+        self._inflight: dict[str, SpeechSynthesis] = {}
+
+        self.hits = 0
+        self.s3_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_path(self, key: str) -> Path:
+        return self.directory.joinpath(f"{key}.mp3")
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".mp3") and entry.is_file():
+                stat = entry.stat()
+                entries.append(
+                    (
+                        stat.st_atime,
+                        entry.name[: -len(".mp3")],
+                        stat.st_size,
+                        stat.st_mtime,
+                    )
+                )
+
+        self._entries = OrderedDict(
+            (key, (size, created_at)) for _, key, size, created_at in sorted(entries)
+        )
+        self._size = sum(size for size, _ in self._entries.values())
+        self._scanned_at = time.monotonic()
+        self._evict()
+
+    def _ensure_scanned(self):
+        if (
+            self._scanned_at is None
+            or time.monotonic() - self._scanned_at > self.RESCAN_INTERVAL
+        ):
+            self._scan()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= entry[0]
+        for path in (self.get_path(key), self.directory.joinpath(f"{key}.json")):
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                log.warning(f"Failed to remove {path} from the speech cache: {e}")
+
+    def _add(self, key: str, size: int, created_at: float):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= previous[0]
+        self._entries[key] = (size, created_at)
+        self._size += size
+        self._evict()
+
+    def _evict(self):
+        now = time.time()
+        for key in [
+            key
+            for key, (_, created_at) in self._entries.items()
+            if now - created_at > self.max_age
+        ]:
+            self._remove(key)
+            self.evictions += 1
+
+        while self._size > self.max_size and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[Path]:
+        self._ensure_scanned()
+        path = self.get_path(key)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            if not path.is_file():
+                return None
+            # Written by another worker since the last scan
+            stat = path.stat()
+            self._add(key, stat.st_size, stat.st_mtime)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+        if time.time() - entry[1] > self.max_age:
+            self._remove(key)
+            return None
+        if not path.is_file():
+            # Evicted by another worker
+            self._entries.pop(key, None)
+            self._size -= entry[0]
+            return None
+
+        self._entries.move_to_end(key)
+        return path
+
+    def get_cached_response(self, key: str) -> Optional[FileResponse]:
+        path = self.get(key)
+        if path is None:
+            return None
+        self.hits += 1
+        return FileResponse(path)
+
+    async def get_response(
+        self,
+        key: str,
+        synthesize: Callable[[], AsyncIterator[bytes]],
+        payload: dict,
+    ):
+        """
+        Returns the cached speech for `key`, or streams it from `synthesize()`
+        (joining a synthesis of the same speech that is already running) and
+        caches it. Errors raised by `synthesize()` before it produces any audio
+        are raised here.
+        """
+        response = self.get_cached_response(key)
+        if response is not None:
+            return response
+
+        synthesis = self._inflight.get(key)
+        if synthesis is not None:
+            self.coalesced += 1
+        else:
+            synthesis = SpeechSynthesis()
+            self._inflight[key] = synthesis
+            # Runs to completion even if the client goes away, so it is cached
+            synthesis.task = asyncio.create_task(
+                self._synthesize(key, synthesis, synthesize, payload)
+            )
+
+        await synthesis.wait_started()
+        return StreamingResponse(synthesis.stream(), media_type="audio/mpeg")
+
+    async def _synthesize(
+        self,
+        key: str,
+        synthesis: SpeechSynthesis,
+        synthesize: Callable[[], AsyncIterator[bytes]],
+        payload: dict,
+    ):
+        path = self.get_path(key)
+        temp_path = self.directory.joinpath(f"{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            data = await run_in_threadpool(self._s3_get, key) if self.use_s3 else None
+            if data is not None:
+                self.s3_hits += 1
+                source = self._iterate(data)
+            else:
+                self.misses += 1
+                source = synthesize()
+
+            size = 0
+            async with aiofiles.open(temp_path, "wb") as f:
+                async for chunk in source:
+                    if not chunk:
+                        continue
+                    await f.write(chunk)
+                    await synthesis.append(chunk)
+                    size += len(chunk)
+
+            os.replace(temp_path, path)
+            async with aiofiles.open(self.directory.joinpath(f"{key}.json"), "w") as f:
+                await f.write(json.dumps(payload))
+            self._add(key, size, time.time())
+
+            await synthesis.finish()
+
+            if self.use_s3 and data is None:
+                await run_in_threadpool(self._s3_put, key, path)
+        except Exception as e:
+            log.exception(e)
+            try:
+                temp_path.unlink(missing_ok=True)
+            except OSError:
+                pass
+            await synthesis.finish(e)
+        finally:
+            self._inflight.pop(key, None)
+
+    @staticmethod
+    async def _iterate(data: bytes) -> AsyncIterator[bytes]:
+        yield data
+
+    def _get_s3_client(self):
+        if self._s3_client is None:
+            import boto3
+
+            self._s3_client = boto3.client(
+                "s3",
+                region_name=config.S3_REGION_NAME,
+                endpoint_url=config.S3_ENDPOINT_URL,
+                aws_access_key_id=os.environ.get("AWS_ACCESS_KEY_ID"),
+                aws_secret_access_key=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+            )
+        return self._s3_client
+
+    def _s3_get(self, key: str) -> Optional[bytes]:
+        try:
+            response = self._get_s3_client().get_object(
+                Bucket=config.S3_BUCKET_NAME, Key=f"{self.S3_KEY_PREFIX}{key}.mp3"
+            )
+            return response["Body"].read()
+        except Exception as e:
+            code = getattr(e, "response", {}).get("Error", {}).get("Code")
+            if code not in ("NoSuchKey", "404"):
+                log.warning(f"Failed to read speech from S3: {e}")
+            return None
+
+    def _s3_put(self, key: str, path: Path):
+        try:
+            self._get_s3_client().upload_file(
+                str(path), config.S3_BUCKET_NAME, f"{self.S3_KEY_PREFIX}{key}.mp3"
+            )
+        except Exception as e:
+            log.warning(f"Failed to write speech to S3: {e}")
+
+    def stats(self) -> dict:
+        requests = self.hits + self.s3_hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self._size,
+            "max_size": self.max_size,
+            "max_age": self.max_age,
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "s3_hits": self.s3_hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (
+                round((requests - self.misses) / requests, 4) if requests else None
+            ),
+        }
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from open_webui.config import CACHE_DIR, config
+from open_webui.env import DEVICE_TYPE, SRC_LOG_LEVELS
+from open_webui.utils import whisper_worker
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["AUDIO"])
+
+
+class TranscriptionQueueFull(Exception):
+    pass
+
+
+class TranscriptionPool:
+    """
+    Local faster-whisper transcription in a pool of worker processes, each
+    keeping the model loaded. Long audio is split on silence into chunks that
+    are transcribed in parallel.
+
+    At most `max_queue` transcriptions are accepted at a time, further ones
+    raise `TranscriptionQueueFull`. Changing the model replaces the pool;
+    transcriptions already running on the old one finish there.
+    """
+
+    def __init__(self, workers: int, max_queue: int, chunk_length: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.chunk_length = chunk_length
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._model_args: Optional[tuple] = None
+        self._pending = 0
+
+    def get_executor(self, model: str, auto_update: bool) -> ProcessPoolExecutor:
+        model_args = (
+            model,
+            auto_update,
+            config.WHISPER_MODEL_DIR,
+            DEVICE_TYPE if DEVICE_TYPE and DEVICE_TYPE == "cuda" else "cpu",
+        )
+        if self._executor is None or model_args != self._model_args:
+            self.shutdown()
+            # Spawned rather than forked, the app process has threads and
+            # possibly CUDA initialized
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=whisper_worker.init_worker,
+                initargs=model_args,
+            )
+            self._model_args = model_args
+            log.info(f"Started {self.workers} transcription workers for {model}")
+        return self._executor
+
+    def is_full(self) -> bool:
+        return self._pending >= self.max_queue
+
+    async def transcribe(
+        self, file_path: str, model: str, auto_update: bool = False
+    ) -> AsyncIterator[dict]:
+        """
+        Yields the transcript of each chunk, in order, as
+        `{"index", "count", "text"}`.
+        """
+        if self.is_full():
+            raise TranscriptionQueueFull()
+
+        self._pending += 1
+        loop = asyncio.get_running_loop()
+        chunk_paths = []
+        futures = []
+        try:
+            executor = self.get_executor(model, auto_update)
+            chunk_paths = await loop.run_in_executor(
+                executor,
+                whisper_worker.split_audio,
+                file_path,
+                os.path.dirname(file_path),
+                self.chunk_length,
+            )
+            futures = [
+                loop.run_in_executor(executor, whisper_worker.transcribe_file, path)
+                for path in chunk_paths
+            ]
+
+            for index, future in enumerate(futures):
+                result = await future
+                yield {"index": index, "count": len(futures), "text": result["text"]}
+        except BrokenProcessPool:
+            # A worker died (e.g. the model failed to load), start over next time
+            self._executor = None
+            raise
+        finally:
+            self._pending -= 1
+            for future in futures:
+                future.cancel()
+            for path in chunk_paths:
+                if path != file_path:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "model": self._model_args[0] if self._model_args else None,
+            "pending": self._pending,
+            "max_queue": self.max_queue,
+        }
+
+
+class TranscriptCache:
+    """Transcripts stored as JSON files, keyed by audio content, engine and model."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def get_key(contents: bytes, engine: str, model: str) -> str:
+        hash = hashlib.sha256(contents)
+        hash.update(f"\0{engine}\0{model}".encode())
+        return hash.hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        try:
+            with open(self.directory.joinpath(f"{key}.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, data: dict):
+        path = self.directory.joinpath(f"{key}.json")
+        temp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+
+TRANSCRIPTION_POOL = TranscriptionPool(
+    workers=config.WHISPER_WORKERS,
+    max_queue=config.WHISPER_MAX_QUEUE,
+    chunk_length=config.WHISPER_CHUNK_LENGTH,
+)
+
+TRANSCRIPT_CACHE = TranscriptCache(
+    Path(CACHE_DIR).joinpath("audio/transcriptions/cache")
+)
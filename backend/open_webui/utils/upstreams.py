@@ -0,0 +1,248 @@
+import logging
+import random
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from open_webui.env import (
+    ENABLE_OLLAMA_UPSTREAM_AFFINITY,
+    OLLAMA_UPSTREAM_EJECT_COOLDOWN,
+    OLLAMA_UPSTREAM_EJECT_THRESHOLD,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["OLLAMA"])
+
+
+class UpstreamStats:
+    def __init__(self):
+        self.in_flight = 0
+        # Exponentially weighted moving average of the time to response headers
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.ejected_at: Optional[float] = None
+
+
+class UpstreamRequest:
+    """One request routed to an upstream, see `UpstreamRouter.start`."""
+
+    def __init__(self, router: "UpstreamRouter", url: str):
+        self.router = router
+        self.url = url
+        self.start_time = time.monotonic()
+        self.recorded = False
+        self.released = False
+
+    def responded(self, status: int):
+        if self.recorded:
+            return
+        self.recorded = True
+        if status >= 500:
+            self.router.record_failure(self.url)
+        else:
+            self.router.record_success(self.url, time.monotonic() - self.start_time)
+
+    def failed(self):
+        if self.recorded:
+            return
+        self.recorded = True
+        self.router.record_failure(self.url)
+
+    def release(self):
+        # Streams release from their background task, once the body is sent
+        if self.released:
+            return
+        self.released = True
+        self.router.get_stats(self.url).in_flight -= 1
+
+
+class UpstreamRouter:
+    """
+    Picks which upstream serves a request among the ones that have the model.
+
+    Of two randomly drawn upstreams, the one with the lower
+    (requests in flight + 1) * average latency is used ("power of two
+    choices"). Upstreams failing `eject_threshold` times in a row (connection
+    errors or 5xx) are ejected for `eject_cooldown` seconds, after which a
+    single request is let through to probe them again.
+
+    With affinity enabled, upstreams that already have the model loaded are
+    preferred, and requests with the same affinity key (a chat id) stick to
+    the upstream that served the previous one while it stays healthy.
+    """
+
+    def __init__(
+        self,
+        eject_threshold: int,
+        eject_cooldown: float,
+        enable_affinity: bool,
+        ewma_alpha: float = 0.3,
+        affinity_ttl: float = 600,
+        max_affinity_keys: int = 10000,
+        loaded_models_ttl: float = 10,
+    ):
+        self.eject_threshold = eject_threshold
+        self.eject_cooldown = eject_cooldown
+        self.enable_affinity = enable_affinity
+        self.ewma_alpha = ewma_alpha
+        self.affinity_ttl = affinity_ttl
+        self.max_affinity_keys = max_affinity_keys
+        self.loaded_models_ttl = loaded_models_ttl
+
+        self._stats: dict[str, UpstreamStats] = {}
+        self.loaded_models: dict[str, set[str]] = {}
+        self.loaded_models_updated_at: Optional[float] = None
+        self._affinity: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get_stats(self, url: str) -> UpstreamStats:
+        stats = self._stats.get(url)
+        if stats is None:
+            stats = self._stats[url] = UpstreamStats()
+        return stats
+
+    def is_ejected(self, url: str, now: float) -> bool:
+        ejected_at = self.get_stats(url).ejected_at
+        return ejected_at is not None and now - ejected_at < self.eject_cooldown
+
+    def get_score(self, url: str) -> float:
+        stats = self.get_stats(url)
+        # Upstreams without a measurement yet are tried first
+        return (stats.in_flight + 1) * (stats.latency or 0.0)
+
+    def get_affinity(self, key: str, now: float) -> Optional[str]:
+        entry = self._affinity.get(key)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at < now:
+            del self._affinity[key]
+            return None
+        return url
+
+    def set_affinity(self, key: str, url: str, now: float):
+        self._affinity[key] = (url, now + self.affinity_ttl)
+        self._affinity.move_to_end(key)
+        while len(self._affinity) > self.max_affinity_keys:
+            self._affinity.popitem(last=False)
+
+    def select(
+        self,
+        urls: Iterable[str],
+        model: Optional[str] = None,
+        affinity_key: Optional[str] = None,
+    ) -> str:
+        urls = list(dict.fromkeys(urls))
+        if len(urls) == 1:
+            return urls[0]
+
+        now = time.monotonic()
+        # If every upstream is ejected, try them anyway rather than fail
+        candidates = [url for url in urls if not self.is_ejected(url, now)] or urls
+
+        url = None
+        if self.enable_affinity:
+            if affinity_key:
+                pinned = self.get_affinity(affinity_key, now)
+                if pinned in candidates:
+                    url = pinned
+
+            if url is None and model:
+                loaded = [
+                    url
+                    for url in candidates
+                    if model in self.loaded_models.get(url, ())
+                ]
+                candidates = loaded or candidates
+
+        if url is None:
+            if len(candidates) == 1:
+                url = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                url = (
+                    first if self.get_score(first) <= self.get_score(second) else second
+                )
+
+        if self.enable_affinity and affinity_key:
+            self.set_affinity(affinity_key, url, now)
+        return url
+
+    def start(self, url: str) -> UpstreamRequest:
+        stats = self.get_stats(url)
+        stats.in_flight += 1
+        if stats.ejected_at is not None and not self.is_ejected(url, time.monotonic()):
+            # Probe: re-eject straight away if it fails
+            stats.ejected_at = time.monotonic()
+            stats.failures = self.eject_threshold - 1
+        return UpstreamRequest(self, url)
+
+    def record_success(self, url: str, latency: float):
+        stats = self.get_stats(url)
+        if stats.ejected_at is not None:
+            log.info(f"Upstream {url} recovered")
+        stats.failures = 0
+        stats.ejected_at = None
+        stats.latency = (
+            latency
+            if stats.latency is None
+            else self.ewma_alpha * latency + (1 - self.ewma_alpha) * stats.latency
+        )
+
+    def record_failure(self, url: str):
+        stats = self.get_stats(url)
+        stats.failures += 1
+        if stats.failures >= self.eject_threshold:
+            if stats.ejected_at is None:
+                log.warning(
+                    f"Upstream {url} failed {stats.failures} times, "
+                    f"ejecting it for {self.eject_cooldown}s"
+                )
+            stats.ejected_at = time.monotonic()
+
+    def should_refresh_loaded_models(self) -> bool:
+        """
+        Returns True at most once every `loaded_models_ttl` seconds; the caller
+        is then expected to call `set_loaded_models` for each upstream.
+        """
+        if not self.enable_affinity:
+            return False
+
+        now = time.monotonic()
+        if (
+            self.loaded_models_updated_at is not None
+            and now - self.loaded_models_updated_at < self.loaded_models_ttl
+        ):
+            return False
+        self.loaded_models_updated_at = now
+        return True
+
+    def set_loaded_models(self, url: str, models: Optional[Iterable[str]]):
+        if models is None:
+            self.loaded_models.pop(url, None)
+        else:
+            self.loaded_models[url] = set(models)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            url: {
+                "in_flight": stats.in_flight,
+                "latency_ms": (
+                    round(stats.latency * 1000, 1)
+                    if stats.latency is not None
+                    else None
+                ),
+                "failures": stats.failures,
+                "ejected": self.is_ejected(url, now),
+                "loaded_models": sorted(self.loaded_models.get(url, ())),
+            }
+            for url, stats in self._stats.items()
+        }
+
+
+OLLAMA_UPSTREAMS = UpstreamRouter(
+    eject_threshold=OLLAMA_UPSTREAM_EJECT_THRESHOLD,
+    eject_cooldown=OLLAMA_UPSTREAM_EJECT_COOLDOWN,
+    enable_affinity=ENABLE_OLLAMA_UPSTREAM_AFFINITY,
+)
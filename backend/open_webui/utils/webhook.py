@@ -1,60 +1,500 @@
+import asyncio
+import itertools
 import json
 import logging
+import random
+import uuid
+from typing import Optional
+
+import aiohttp
+import redis.asyncio as aioredis
 
-import requests
 from open_webui.config import WEBUI_FAVICON_URL, WEBUI_NAME
-from open_webui.env import SRC_LOG_LEVELS, VERSION
+from open_webui.env import (
+    ENABLE_WEBHOOK_REDIS_QUEUE,
+    SRC_LOG_LEVELS,
+    VERSION,
+    WEBHOOK_BATCH_WINDOW,
+    WEBHOOK_CONCURRENCY,
+    WEBHOOK_MAX_RETRIES,
+    WEBHOOK_QUEUE_SIZE,
+    WEBHOOK_REDIS_URL,
+    WEBHOOK_TIMEOUT,
+)
+from open_webui.utils.sessions import CLIENT_SESSIONS, ClientSessionPool
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["WEBHOOK"])
 
 
-def post_webhook(url: str, message: str, event_data: dict) -> bool:
+def is_chat_webhook(url: str) -> bool:
+    """Slack, Google Chat and Discord webhooks, which take a plain text message."""
+    return (
+        "https://hooks.slack.com" in url
+        or "https://chat.googleapis.com" in url
+        or "https://discord.com/api/webhooks" in url
+    )
+
+
+def get_webhook_payload(url: str, message: str, event_data: dict) -> dict:
+    payload = {}
+
+    # Slack and Google Chat Webhooks
+    if "https://hooks.slack.com" in url or "https://chat.googleapis.com" in url:
+        payload["text"] = message
+    # Discord Webhooks
+    elif "https://discord.com/api/webhooks" in url:
+        payload["content"] = (
+            message if len(message) < 2000 else f"{message[: 2000 - 20]}... (truncated)"
+        )
+    # Microsoft Teams Webhooks
+    elif "webhook.office.com" in url:
+        action = event_data.get("action", "undefined")
+        facts = [
+            {"name": name, "value": value}
+            for name, value in json.loads(event_data.get("user", "{}")).items()
+        ]
+        payload = {
+            "@type": "MessageCard",
+            "@context": "http://schema.org/extensions",
+            "themeColor": "0076D7",
+            "summary": message,
+            "sections": [
+                {
+                    "activityTitle": message,
+                    "activitySubtitle": f"{WEBUI_NAME} ({VERSION}) - {action}",
+                    "activityImage": WEBUI_FAVICON_URL,
+                    "facts": facts,
+                    "markdown": True,
+                }
+            ],
+        }
+    # Default Payload
+    else:
+        payload = {**event_data}
+
+    return payload
+
+
+def get_event_summary(event_data: dict) -> dict:
+    """The action and ids of an event, without the user details it may carry."""
+    summary = {"action": event_data.get("action")}
     try:
-        log.debug(f"post_webhook: {url}, {message}, {event_data}")
-        payload = {}
-
-        # Slack and Google Chat Webhooks
-        if "https://hooks.slack.com" in url or "https://chat.googleapis.com" in url:
-            payload["text"] = message
-        # Discord Webhooks
-        elif "https://discord.com/api/webhooks" in url:
-            payload["content"] = (
-                message
-                if len(message) < 2000
-                else f"{message[: 2000 - 20]}... (truncated)"
+        user_id = json.loads(event_data.get("user") or "{}").get("id")
+    except (TypeError, ValueError, AttributeError):
+        user_id = None
+    if user_id is not None:
+        summary["user_id"] = user_id
+    if event_data.get("url"):
+        summary["url"] = event_data["url"]
+    return summary
+
+
+class WebhookError(Exception):
+    def __init__(self, status: int, retry_after: Optional[float], text: str):
+        super().__init__(f"{status}: {text[:200]}")
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status >= 500 or self.status in (408, 429)
+
+
+class WebhookDispatcher:
+    """
+    Delivers webhook notifications in the background, so slow or unreachable
+    endpoints don't hold up requests.
+
+    `concurrency` workers post notifications with a `timeout` each. Failed
+    deliveries (connection errors, timeouts, 408, 429 and 5xx responses) are
+    retried up to `max_retries` times with exponential backoff, then logged as
+    dead letters. Notifications to the same chat webhook within `batch_window`
+    seconds are sent together as one message.
+
+    Notifications wait in memory, up to `queue_size`, or with `redis_url` in a
+    Redis list shared by all instances. Each instance moves the notifications
+    it takes into its own processing list until they are delivered or dead, so
+    the ones held by an instance that crashed are requeued by the next one to
+    start once its heartbeat has expired.
+    """
+
+    REDIS_QUEUE_KEY = "open-webui:webhooks"
+    REDIS_PROCESSING_KEY_PREFIX = "open-webui:webhooks:processing:"
+    REDIS_HEARTBEAT_KEY_PREFIX = "open-webui:webhooks:heartbeat:"
+    HEARTBEAT_INTERVAL = 10
+    HEARTBEAT_TTL = 30
+    BACKOFF_BASE = 1
+    BACKOFF_MAX = 60
+
+    def __init__(
+        self,
+        concurrency: int,
+        timeout: float,
+        max_retries: int,
+        batch_window: float,
+        queue_size: int,
+        redis_url: Optional[str] = None,
+    ):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.batch_window = batch_window
+        self.queue_size = queue_size
+        self.redis = (
+            aioredis.from_url(redis_url, decode_responses=True) if redis_url else None
+        )
+        self.instance_id = uuid.uuid4().hex
+        self.processing_key = f"{self.REDIS_PROCESSING_KEY_PREFIX}{self.instance_id}"
+        self.heartbeat_key = f"{self.REDIS_HEARTBEAT_KEY_PREFIX}{self.instance_id}"
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: list[asyncio.Task] = []
+        self._pushes: set[asyncio.Task] = set()
+        # Notifications received, in memory mode
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=queue_size)
+        # (url, notifications, attempt) due for delivery
+        self._ready: asyncio.Queue[tuple[str, list[dict], int]] = asyncio.Queue()
+        # url -> notifications waiting for the batch window to close
+        self._batches: dict[str, list[dict]] = {}
+        self._retries: dict[int, tuple[str, list[dict]]] = {}
+        self._retry_ids = itertools.count()
+        self._delivering: dict[int, list[dict]] = {}
+        # id(notification) -> its item in the processing list, in Redis mode
+        self._received: dict[int, str] = {}
+
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.dropped = 0
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._tasks = [asyncio.create_task(self._collect())] + [
+            asyncio.create_task(self._deliver_worker(index))
+            for index in range(self.concurrency)
+        ]
+        if self.redis is not None:
+            try:
+                await self._beat()
+                await self._recover()
+            except Exception as e:
+                log.error(f"Failed to recover webhook notifications from Redis: {e}")
+            self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, *self._pushes, return_exceptions=True)
+        self._loop = None
+
+        undelivered = [
+            notification
+            for notifications in itertools.chain(
+                self._delivering.values(),
+                (notifications for _, notifications in self._retries.values()),
+                self._batches.values(),
+            )
+            for notification in notifications
+        ]
+        while not self._ready.empty():
+            undelivered.extend(self._ready.get_nowait()[1])
+        while not self._queue.empty():
+            undelivered.append(self._queue.get_nowait())
+        self._delivering.clear()
+        self._retries.clear()
+        self._batches.clear()
+        self._received.clear()
+
+        if self.redis is not None:
+            try:
+                # The undelivered notifications are all in the processing list
+                await self._requeue(self.processing_key)
+                await self.redis.delete(self.heartbeat_key)
+                await self.redis.aclose()
+            except Exception as e:
+                log.error(
+                    f"Failed to requeue {len(undelivered)} webhook notifications: {e}"
+                )
+        elif undelivered:
+            log.warning(
+                f"Dropping {len(undelivered)} undelivered webhook notifications"
+            )
+
+    def enqueue(self, url: str, message: str, event_data: dict) -> bool:
+        notification = {"url": url, "message": message, "event_data": event_data}
+
+        loop = self._loop
+        if loop is None:
+            log.warning("Webhook dispatcher is not running, dropping notification")
+            self.dropped += 1
+            return False
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is loop:
+            if self.redis is None:
+                return self._put_nowait(notification)
+            task = loop.create_task(self._push(notification))
+            self._pushes.add(task)
+            task.add_done_callback(self._pushes.discard)
+        else:
+            # Called from a thread
+            asyncio.run_coroutine_threadsafe(self._put(notification), loop)
+        return True
+
+    def _put_nowait(self, notification: dict) -> bool:
+        try:
+            self._queue.put_nowait(notification)
+            return True
+        except asyncio.QueueFull:
+            log.error(
+                "Webhook queue is full, dropping notification to "
+                f"{ClientSessionPool.get_base_url(notification['url'])}"
             )
-        # Microsoft Teams Webhooks
-        elif "webhook.office.com" in url:
-            action = event_data.get("action", "undefined")
-            facts = [
-                {"name": name, "value": value}
-                for name, value in json.loads(event_data.get("user", {})).items()
+            self.dropped += 1
+            return False
+
+    async def _put(self, notification: dict):
+        if self.redis is None:
+            self._put_nowait(notification)
+        else:
+            await self._push(notification)
+
+    async def _push(self, notification: dict):
+        try:
+            if await self.redis.llen(self.REDIS_QUEUE_KEY) >= self.queue_size:
+                log.error("Webhook queue is full, dropping notification")
+                self.dropped += 1
+                return
+            await self.redis.rpush(self.REDIS_QUEUE_KEY, json.dumps(notification))
+        except Exception as e:
+            log.error(f"Failed to queue webhook notification in Redis: {e}")
+            self.dropped += 1
+
+    async def _receive(self) -> dict:
+        if self.redis is None:
+            return await self._queue.get()
+
+        while True:
+            try:
+                item = await self.redis.blmove(
+                    self.REDIS_QUEUE_KEY, self.processing_key, 1, "LEFT", "RIGHT"
+                )
+            except Exception as e:
+                log.error(f"Failed to read webhook notifications from Redis: {e}")
+                await asyncio.sleep(1)
+                continue
+            if item is not None:
+                notification = json.loads(item)
+                self._received[id(notification)] = item
+                return notification
+
+    async def _done(self, notifications: list[dict]):
+        """Removes delivered or dead notifications from the processing list."""
+        # Only notifications received from Redis are in there
+        items = [
+            item
+            for item in (self._received.pop(id(n), None) for n in notifications)
+            if item is not None
+        ]
+        if not items:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for item in items:
+                    pipe.lrem(self.processing_key, 1, item)
+                await pipe.execute()
+        except Exception as e:
+            log.error(f"Failed to remove webhook notifications from Redis: {e}")
+
+    async def _beat(self):
+        await self.redis.set(self.heartbeat_key, 1, ex=self.HEARTBEAT_TTL)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+            try:
+                await self._beat()
+                await self._recover()
+            except Exception as e:
+                log.error(f"Failed to update webhook heartbeat in Redis: {e}")
+
+    async def _recover(self):
+        """Requeues the processing lists of instances that are gone."""
+        prefix = self.REDIS_PROCESSING_KEY_PREFIX
+        async for key in self.redis.scan_iter(match=f"{prefix}*"):
+            instance_id = key[len(prefix) :]
+            if instance_id == self.instance_id or await self.redis.exists(
+                f"{self.REDIS_HEARTBEAT_KEY_PREFIX}{instance_id}"
+            ):
+                continue
+            count = await self._requeue(key)
+            if count:
+                log.warning(
+                    f"Requeued {count} webhook notifications of instance {instance_id}"
+                )
+
+    async def _requeue(self, key: str) -> int:
+        # One at a time from the end, back in front of the queue in order
+        count = 0
+        while (
+            await self.redis.lmove(key, self.REDIS_QUEUE_KEY, "RIGHT", "LEFT")
+            is not None
+        ):
+            count += 1
+        return count
+
+    async def _collect(self):
+        while True:
+            # Leave the backlog in the queue (shared by all instances, with
+            # Redis) until a worker is about to be free
+            while self._ready.qsize() >= self.concurrency:
+                await asyncio.sleep(0.1)
+
+            notification = await self._receive()
+            url = notification["url"]
+
+            if not is_chat_webhook(url) or self.batch_window <= 0:
+                self._ready.put_nowait((url, [notification], 0))
+                continue
+
+            batch = self._batches.get(url)
+            if batch is None:
+                self._batches[url] = [notification]
+                self._loop.call_later(self.batch_window, self._flush, url)
+            else:
+                batch.append(notification)
+
+    def _flush(self, url: str):
+        batch = self._batches.pop(url, None)
+        if batch:
+            self._ready.put_nowait((url, batch, 0))
+
+    async def _deliver_worker(self, index: int):
+        while True:
+            url, notifications, attempt = await self._ready.get()
+            self._delivering[index] = notifications
+            try:
+                await self._deliver(url, notifications, attempt)
+            except Exception as e:
+                log.exception(e)
+            finally:
+                self._delivering.pop(index, None)
+
+    async def _deliver(self, url: str, notifications: list[dict], attempt: int):
+        if is_chat_webhook(url):
+            # One message for the whole batch
+            groups = [
+                (
+                    get_webhook_payload(
+                        url,
+                        "\n\n".join(n["message"] for n in notifications),
+                        notifications[-1]["event_data"],
+                    ),
+                    notifications,
+                )
             ]
-            payload = {
-                "@type": "MessageCard",
-                "@context": "http://schema.org/extensions",
-                "themeColor": "0076D7",
-                "summary": message,
-                "sections": [
-                    {
-                        "activityTitle": message,
-                        "activitySubtitle": f"{WEBUI_NAME} ({VERSION}) - {action}",
-                        "activityImage": WEBUI_FAVICON_URL,
-                        "facts": facts,
-                        "markdown": True,
-                    }
-                ],
-            }
-        # Default Payload
         else:
-            payload = {**event_data}
+            groups = [
+                (get_webhook_payload(url, n["message"], n["event_data"]), [n])
+                for n in notifications
+            ]
+
+        for index, (payload, covered) in enumerate(groups):
+            try:
+                await self._post(url, payload)
+            except Exception as e:
+                remaining = [n for _, group in groups[index:] for n in group]
+                if not self._retry(url, remaining, attempt, e):
+                    await self._done(remaining)
+                return
+            self.delivered += len(covered)
+            await self._done(covered)
+
+    async def _post(self, url: str, payload: dict):
+        log.debug(f"post_webhook: {url}, {payload}")
+        async with CLIENT_SESSIONS.get(url).post(
+            url,
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        ) as r:
+            text = await r.text()
+            if r.status >= 400:
+                try:
+                    retry_after = float(r.headers.get("Retry-After", ""))
+                except ValueError:
+                    retry_after = None
+                raise WebhookError(r.status, retry_after, text)
+            log.debug(f"r.text: {text}")
+
+    def _retry(
+        self, url: str, notifications: list[dict], attempt: int, error: Exception
+    ) -> bool:
+        """Schedules another attempt, returns False if the notifications are dead."""
+        # Webhook URLs often carry a secret, only the host is logged
+        destination = ClientSessionPool.get_base_url(url)
+        retryable = not isinstance(error, WebhookError) or error.retryable
+        if not retryable or attempt >= self.max_retries:
+            self.dead += len(notifications)
+            # Events can carry user details, only what identifies them is logged
+            events = [get_event_summary(n["event_data"]) for n in notifications]
+            log.error(
+                f"Webhook delivery to {destination} failed after {attempt + 1} "
+                f"attempts ({error}), dropping {len(notifications)} notifications: "
+                f"{json.dumps(events)}"
+            )
+            return False
+
+        delay = self.BACKOFF_BASE * 2**attempt * random.uniform(1, 1.5)
+        if isinstance(error, WebhookError) and error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        delay = min(delay, self.BACKOFF_MAX)
 
-        log.debug(f"payload: {payload}")
-        r = requests.post(url, json=payload)
-        r.raise_for_status()
-        log.debug(f"r.text: {r.text}")
+        log.warning(
+            f"Webhook delivery to {destination} failed ({error}), "
+            f"retrying in {delay:.1f}s"
+        )
+        self.retried += 1
+        retry_id = next(self._retry_ids)
+        self._retries[retry_id] = (url, notifications)
+        self._loop.call_later(delay, self._schedule_retry, retry_id, attempt + 1)
         return True
-    except Exception as e:
-        log.exception(e)
-        return False
+
+    def _schedule_retry(self, retry_id: int, attempt: int):
+        entry = self._retries.pop(retry_id, None)
+        if entry is not None:
+            self._ready.put_nowait((*entry, attempt))
+
+    def stats(self) -> dict:
+        return {
+            "queue": "redis" if self.redis is not None else "memory",
+            "queued": self._queue.qsize(),
+            "batching": sum(len(batch) for batch in self._batches.values()),
+            "ready": self._ready.qsize(),
+            "delivering": sum(len(n) for n in self._delivering.values()),
+            "retrying": sum(len(n) for _, n in self._retries.values()),
+            "delivered": self.delivered,
+            "retried": self.retried,
+            "dead": self.dead,
+            "dropped": self.dropped,
+        }
+
+
+WEBHOOK_DISPATCHER = WebhookDispatcher(
+    concurrency=WEBHOOK_CONCURRENCY,
+    timeout=WEBHOOK_TIMEOUT,
+    max_retries=WEBHOOK_MAX_RETRIES,
+    batch_window=WEBHOOK_BATCH_WINDOW,
+    queue_size=WEBHOOK_QUEUE_SIZE,
+    redis_url=WEBHOOK_REDIS_URL if ENABLE_WEBHOOK_REDIS_QUEUE else None,
+)
+
+
+def post_webhook(url: str, message: str, event_data: dict) -> bool:
+    """Queues the notification for delivery, returns False if it was dropped."""
+    return WEBHOOK_DISPATCHER.enqueue(url, message, event_data)
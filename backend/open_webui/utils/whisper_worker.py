@@ -0,0 +1,100 @@
+"""
+Functions run in the transcription worker processes (see
+`open_webui.utils.transcription`). Kept free of other open_webui imports so
+that starting a worker doesn't load the whole app.
+"""
+
+import logging
+import os
+
+log = logging.getLogger(__name__)
+
+# The model of this worker process, loaded once by `init_worker`
+whisper_model = None
+
+
+def load_whisper_model(
+    model: str, auto_update: bool, download_root: str, device: str = "cpu"
+):
+    from faster_whisper import WhisperModel
+
+    faster_whisper_kwargs = {
+        "model_size_or_path": model,
+        "device": device,
+        "compute_type": "int8",
+        "download_root": download_root,
+        "local_files_only": not auto_update,
+    }
+
+    try:
+        return WhisperModel(**faster_whisper_kwargs)
+    except Exception:
+        log.warning(
+            "WhisperModel initialization failed, attempting download with local_files_only=False"
+        )
+        faster_whisper_kwargs["local_files_only"] = False
+        return WhisperModel(**faster_whisper_kwargs)
+
+
+def init_worker(model: str, auto_update: bool, download_root: str, device: str):
+    global whisper_model
+    whisper_model = load_whisper_model(model, auto_update, download_root, device)
+
+
+def split_audio(file_path: str, output_dir: str, chunk_length: int) -> list[str]:
+    """
+    Splits audio longer than 1.5 * `chunk_length` seconds into chunks of
+    about `chunk_length` seconds, cut in silences where possible, so they can
+    be transcribed in parallel. Returns the paths of the chunks in order, or
+    just `file_path` if it is short enough.
+    """
+    from pydub import AudioSegment
+    from pydub.silence import detect_silence
+
+    audio = AudioSegment.from_file(file_path)
+    chunk_ms = chunk_length * 1000
+    if len(audio) <= chunk_ms * 1.5:
+        return [file_path]
+
+    audio = audio.set_frame_rate(16000).set_channels(1)
+    silence_thresh = audio.dBFS - 16 if audio.dBFS != float("-inf") else -50
+    # Midpoints of silences of at least half a second, looked for every 50ms
+    cut_points = [
+        (start + end) // 2
+        for start, end in detect_silence(
+            audio, min_silence_len=500, silence_thresh=silence_thresh, seek_step=50
+        )
+    ]
+
+    boundaries = [0]
+    while len(audio) - boundaries[-1] > chunk_ms * 1.5:
+        start = boundaries[-1]
+        target = start + chunk_ms
+        candidates = [
+            point
+            for point in cut_points
+            if start + chunk_ms // 2 <= point <= start + chunk_ms * 1.5
+        ]
+        boundaries.append(
+            min(candidates, key=lambda point: abs(point - target))
+            if candidates
+            else target
+        )
+    boundaries.append(len(audio))
+
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    paths = []
+    for index, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+        path = os.path.join(output_dir, f"{stem}_chunk{index}.wav")
+        audio[start:end].export(path, format="wav")
+        paths.append(path)
+    return paths
+
+
+def transcribe_file(file_path: str) -> dict:
+    segments, info = whisper_model.transcribe(file_path, beam_size=5)
+    return {
+        "text": "".join(segment.text for segment in segments),
+        "language": info.language,
+        "language_probability": info.language_probability,
+    }
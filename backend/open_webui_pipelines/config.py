@@ -13,3 +13,11 @@ except ImportError:
 
 API_KEY = os.getenv("PIPELINES_API_KEY", "0p3n-w3bu!")
 PIPELINES_DIR = os.getenv("PIPELINES_DIR", "./pipelines")
+
+# Maximum number of concurrent chat completions per pipeline model, 0 for no
+# limit. Pipelines can override it with a MAX_CONCURRENT_REQUESTS valve.
+PIPELINES_MAX_CONCURRENT_REQUESTS = int(
+    os.getenv("PIPELINES_MAX_CONCURRENT_REQUESTS", "0")
+)
+# How long a request waits for a free slot before it is rejected with a 429
+PIPELINES_CONCURRENCY_TIMEOUT = float(os.getenv("PIPELINES_CONCURRENCY_TIMEOUT", "30"))
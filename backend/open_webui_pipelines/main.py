@@ -5,19 +5,22 @@ from fastapi.concurrency import run_in_threadpool
 
 from starlette.responses import StreamingResponse, Response
 from pydantic import BaseModel, ConfigDict
-from typing import List, Union, Generator, Iterator
+from typing import List, Union, Generator, Iterator, AsyncIterator
 
 
 from utils.pipelines.auth import bearer_security, get_current_user
 from utils.pipelines.main import get_last_user_message, stream_message_template
 from utils.pipelines.misc import convert_to_raw_url
 from utils.pipelines.custom_exceptions import RateLimitException
+from utils.pipelines.concurrency import ConcurrencyLimiter, SlotStreamingResponse
 
 from contextlib import asynccontextmanager
 from concurrent.futures import ThreadPoolExecutor
 from schemas import FilterForm, OpenAIChatCompletionForm
 from urllib.parse import urlparse
 
+import asyncio
+import inspect
 import shutil
 import aiohttp
 import os
@@ -29,7 +32,12 @@ import uuid
 import sys
 
 
-from config import API_KEY, PIPELINES_DIR
+from config import (
+    API_KEY,
+    PIPELINES_DIR,
+    PIPELINES_MAX_CONCURRENT_REQUESTS,
+    PIPELINES_CONCURRENCY_TIMEOUT,
+)
 
 if not os.path.exists(PIPELINES_DIR):
     os.makedirs(PIPELINES_DIR)
@@ -102,6 +110,11 @@ def get_all_pipelines():
                         and hasattr(pipeline.valves, "priority")
                         else 0
                     ),
+                    # Filters that don't depend on the output of the filters
+                    # sharing their priority can be run together with them
+                    "parallel": (
+                        pipeline.parallel if hasattr(pipeline, "parallel") else False
+                    ),
                     "valves": pipeline.valves if hasattr(pipeline, "valves") else None,
                 }
         else:
@@ -276,6 +289,7 @@ async def get_models():
                                 else []
                             ),
                             "priority": pipeline.get("priority", 0),
+                            "parallel": pipeline.get("parallel", False),
                         }
                         if pipeline.get("type", "pipe") == "filter"
                         else {}
@@ -596,7 +610,9 @@ async def filter_inlet(pipeline_id: str, form_data: FilterForm):
         # Filter out None values
         error_detail = {k: v for k, v in error_detail.items() if v is not None}
         raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=error_detail
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=error_detail,
+            headers=e.headers,
         )
     except Exception as e:
         logger.error(e)
@@ -638,6 +654,76 @@ async def filter_outlet(pipeline_id: str, form_data: FilterForm):
         )
 
 
+def get_finish_message(model: str) -> dict:
+    return {
+        "id": f"{model}-{str(uuid.uuid4())}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "delta": {},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+def get_completion_message(model: str, message: str) -> dict:
+    return {
+        "id": f"{model}-{str(uuid.uuid4())}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "message": {
+                    "role": "assistant",
+                    "content": message,
+                },
+                "logprobs": None,
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+def format_stream_line(model: str, line) -> Union[str, bytes]:
+    # Already a complete server-sent event, e.g. from utils.pipelines.bedrock
+    if isinstance(line, bytes) and line.endswith(b"\n\n"):
+        return line
+
+    if isinstance(line, BaseModel):
+        line = line.model_dump_json()
+        line = f"data: {line}"
+
+    try:
+        line = line.decode("utf-8")
+    except:
+        pass
+
+    logger.debug(f"stream_content:Generator:{line}")
+
+    if line.startswith("data:"):
+        return f"{line}\n\n"
+    else:
+        line = stream_message_template(model, line)
+        return f"data: {json.dumps(line)}\n\n"
+
+
+def is_async_pipe(pipe) -> bool:
+    return inspect.iscoroutinefunction(pipe) or inspect.isasyncgenfunction(pipe)
+
+
+PIPELINE_CONCURRENCY = ConcurrencyLimiter(
+    default_limit=PIPELINES_MAX_CONCURRENT_REQUESTS,
+    timeout=PIPELINES_CONCURRENCY_TIMEOUT,
+)
+
+
 @app.post("/v1/chat/completions")
 @app.post("/chat/completions")
 async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
@@ -653,20 +739,20 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
             detail=f"Pipeline {form_data.model} not found",
         )
 
-    def job():
-        print(form_data.model)
+    pipeline = app.state.PIPELINES[form_data.model]
+    pipeline_id = form_data.model
 
-        pipeline = app.state.PIPELINES[form_data.model]
-        pipeline_id = form_data.model
+    if pipeline["type"] == "manifold":
+        manifold_id, pipeline_id = pipeline_id.split(".", 1)
+        module = PIPELINE_MODULES[manifold_id]
+    else:
+        module = PIPELINE_MODULES[pipeline_id]
+    pipe = module.pipe
 
+    def job():
+        print(form_data.model)
         print(pipeline_id)
 
-        if pipeline["type"] == "manifold":
-            manifold_id, pipeline_id = pipeline_id.split(".", 1)
-            pipe = PIPELINE_MODULES[manifold_id].pipe
-        else:
-            pipe = PIPELINE_MODULES[pipeline_id].pipe
-
         if form_data.stream:
 
             def stream_content():
@@ -686,43 +772,18 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
 
                 if isinstance(res, Iterator):
                     for line in res:
-                        if isinstance(line, BaseModel):
-                            line = line.model_dump_json()
-                            line = f"data: {line}"
-
-                        try:
-                            line = line.decode("utf-8")
-                        except:
-                            pass
-
-                        logger.debug(f"stream_content:Generator:{line}")
-
-                        if line.startswith("data:"):
-                            yield f"{line}\n\n"
-                        else:
-                            line = stream_message_template(form_data.model, line)
-                            yield f"data: {json.dumps(line)}\n\n"
+                        yield format_stream_line(form_data.model, line)
 
                 if isinstance(res, str) or isinstance(res, Generator):
-                    finish_message = {
-                        "id": f"{form_data.model}-{str(uuid.uuid4())}",
-                        "object": "chat.completion.chunk",
-                        "created": int(time.time()),
-                        "model": form_data.model,
-                        "choices": [
-                            {
-                                "index": 0,
-                                "delta": {},
-                                "logprobs": None,
-                                "finish_reason": "stop",
-                            }
-                        ],
-                    }
-
+                    finish_message = get_finish_message(form_data.model)
                     yield f"data: {json.dumps(finish_message)}\n\n"
                     yield f"data: [DONE]"
 
-            return StreamingResponse(stream_content(), media_type="text/event-stream")
+            return SlotStreamingResponse(
+                stream_content(),
+                media_type="text/event-stream",
+                slot=slot,
+            )
         else:
             res = pipe(
                 user_message=user_message,
@@ -748,22 +809,80 @@ async def generate_openai_chat_completion(form_data: OpenAIChatCompletionForm):
                         message = f"{message}{stream}"
 
                 logger.debug(f"stream:false:{message}")
-                return {
-                    "id": f"{form_data.model}-{str(uuid.uuid4())}",
-                    "object": "chat.completion",
-                    "created": int(time.time()),
-                    "model": form_data.model,
-                    "choices": [
-                        {
-                            "index": 0,
-                            "message": {
-                                "role": "assistant",
-                                "content": message,
-                            },
-                            "logprobs": None,
-                            "finish_reason": "stop",
-                        }
-                    ],
-                }
+                return get_completion_message(form_data.model, message)
+
+    async def async_job():
+        """
+        Same as `job` for async pipes: `async def pipe` returning a string,
+        dict or model, or an async generator of chunks. These run on the event
+        loop, so a stream does not occupy a worker thread.
+        """
+        res = pipe(
+            user_message=user_message,
+            model_id=pipeline_id,
+            messages=messages,
+            body=form_data.model_dump(),
+        )
+        if inspect.isawaitable(res):
+            res = await res
+
+        if form_data.stream:
+
+            async def stream_content():
+                logger.debug(f"stream:true:{res}")
 
-    return await run_in_threadpool(job)
+                if isinstance(res, str):
+                    message = stream_message_template(form_data.model, res)
+                    yield f"data: {json.dumps(message)}\n\n"
+                elif isinstance(res, AsyncIterator):
+                    async for line in res:
+                        yield format_stream_line(form_data.model, line)
+
+                finish_message = get_finish_message(form_data.model)
+                yield f"data: {json.dumps(finish_message)}\n\n"
+                yield f"data: [DONE]"
+
+            return SlotStreamingResponse(
+                stream_content(),
+                media_type="text/event-stream",
+                slot=slot,
+            )
+
+        logger.debug(f"stream:false:{res}")
+
+        if isinstance(res, dict):
+            return res
+        elif isinstance(res, BaseModel):
+            return res.model_dump()
+
+        message = ""
+        if isinstance(res, str):
+            message = res
+        elif isinstance(res, AsyncIterator):
+            async for stream in res:
+                message = f"{message}{stream}"
+
+        logger.debug(f"stream:false:{message}")
+        return get_completion_message(form_data.model, message)
+
+    try:
+        slot = await PIPELINE_CONCURRENCY.acquire(form_data.model, module)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Pipeline {form_data.model} is at capacity, please try again later",
+        )
+
+    try:
+        if is_async_pipe(pipe):
+            response = await async_job()
+        else:
+            response = await run_in_threadpool(job)
+    except:
+        slot.release()
+        raise
+
+    # Streams release their slot once they are done
+    if not isinstance(response, SlotStreamingResponse):
+        slot.release()
+    return response
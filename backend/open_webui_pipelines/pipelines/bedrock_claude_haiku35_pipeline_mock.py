@@ -1,7 +1,7 @@
 # import datetime
-import time
+import asyncio
 import os
-from typing import Generator, Iterator, List, Optional, Union
+from typing import AsyncIterator, List, Optional
 
 # import requests
 from pydantic import BaseModel
@@ -37,9 +37,9 @@ class Pipeline:
         print(f"on_shutdown:{__name__}")
         pass
 
-    def pipe(
+    async def pipe(
         self, user_message: str, model_id: str, messages: List[dict], body: dict
-    ) -> Union[str, Generator, Iterator]:
+    ) -> AsyncIterator[str]:
 
         model_id = self.valves.BEDROCK_CLAUDE_HAIKU_ARN
 
@@ -53,7 +53,7 @@ class Pipeline:
                     # check if the request is for a title
                     if user_msg.startswith("Create a concise, 3-5 word title"):
                         yield "🖋Poem about New Jersey"
-                        return ""
+                        return
                 if message["role"] == "system":
                     system_msg = message["content"]
                     body["system"] = system_msg
@@ -133,7 +133,7 @@ class Pipeline:
             delays = [1, 1, 1, 5, 5, 5, 25, 25, 75, 300]
             while index < len(words):
                 delay = random.choice(delays) / 1000
-                time.sleep(delay)
+                await asyncio.sleep(delay)
                 chunk_size = random.randint(1, 4)
                 chunk = " ".join(words[index : index + chunk_size])
                 yield chunk
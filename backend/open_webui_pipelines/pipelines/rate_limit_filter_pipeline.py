@@ -1,13 +1,14 @@
+import math
 import os
 import time
 import json
 import sys
 from typing import List, Optional
 from urllib.parse import urlparse
-import asyncio
 
 from pydantic import BaseModel
-import redis
+from starlette.responses import JSONResponse
+import redis.asyncio
 import logging
 
 from utils.pipelines.custom_exceptions import RateLimitException
@@ -40,6 +41,86 @@ DEFAULT_REQUEST_LIMITS = {
 }
 
 
+WINDOW_SECONDS = 60
+# Users may go over their own limit by this share of the unused global quota
+FREE_QUOTA_SHARE = 0.25
+LOCAL_CACHE_MAX_SIZE = 10000
+
+# Sliding window counter: the count over the last window is estimated from the
+# current fixed window plus the previous one, weighted by how much of it still
+# overlaps. Checks and increments both the user and global counters at once.
+#
+# KEYS: user current, user previous, global current, global previous
+# ARGV: now (ms), window (ms), user limit, global limit, free quota share
+# Returns: {allowed, scope, limit, remaining, reset after (ms)}
+#
+# When rejected, "reset after" is the time until the estimate drops below the
+# limit (if nothing else is counted), otherwise the time until the window ends.
+RATE_LIMIT_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local user_limit = tonumber(ARGV[3])
+local global_limit = tonumber(ARGV[4])
+local share = tonumber(ARGV[5])
+
+local elapsed = now % window
+local weight = (window - elapsed) / window
+local reset_after = window - elapsed
+
+local function get_counts(current_key, previous_key)
+    local current = tonumber(redis.call("GET", current_key) or "0")
+    local previous = tonumber(redis.call("GET", previous_key) or "0")
+    return current, previous
+end
+
+local function get_wait(current, previous, limit)
+    if current < limit then
+        -- Later in this window, as the previous one slides out
+        local wait = reset_after - (limit - current) * window / previous
+        return math.max(math.ceil(wait), 0)
+    end
+    if limit <= 0 then
+        return reset_after + window
+    end
+    -- In the next window, where this one is the previous one
+    return reset_after + math.ceil(window - limit * window / current)
+end
+
+local user_current, user_previous = get_counts(KEYS[1], KEYS[2])
+local global_current, global_previous = get_counts(KEYS[3], KEYS[4])
+local user_count = user_current + user_previous * weight
+local global_count = global_current + global_previous * weight
+
+if global_count >= global_limit then
+    local wait = get_wait(global_current, global_previous, global_limit)
+    return {0, "global", global_limit, 0, wait}
+end
+
+local limit = math.max(user_limit, math.floor((global_limit - global_count) * share))
+if user_count >= limit then
+    return {0, "user", limit, 0, get_wait(user_current, user_previous, limit)}
+end
+
+for _, key in ipairs({KEYS[1], KEYS[3]}) do
+    redis.call("INCR", key)
+    redis.call("PEXPIRE", key, window * 2)
+end
+
+return {1, "user", limit, math.floor(limit - user_count - 1), reset_after}
+"""
+
+
+def get_rate_limit_headers(result: dict) -> dict:
+    headers = {
+        "X-RateLimit-Limit": str(result["limit"]),
+        "X-RateLimit-Remaining": str(max(result["remaining"], 0)),
+        "X-RateLimit-Reset": str(math.ceil(result["reset_after"])),
+    }
+    if not result["allowed"]:
+        headers["Retry-After"] = headers["X-RateLimit-Reset"]
+    return headers
+
+
 class Pipeline:
     class Valves(BaseModel):
         pipelines: List[str] = []
@@ -103,212 +184,133 @@ class Pipeline:
         if not parsed_url.hostname:
             logger.error("Invalid RATE_LIMIT_REDIS_URL: missing hostname")
             raise ValueError("Invalid RATE_LIMIT_REDIS_URL: missing hostname")
-        try:
-            verify_ssl = os.getenv("DEV", "false").lower() == "false"
-            logger.info("Redis SSL verification: " + str(verify_ssl))
-            self.redis_client = redis.Redis(
-                host=parsed_url.hostname,
-                port=parsed_url.port if parsed_url.port else 6379,
-                db=0,
-                password=parsed_url.password,
-                decode_responses=True,
-                socket_timeout=1.0,  # Add timeout
-                socket_connect_timeout=1.0,  # Add connection timeout
-                ssl=verify_ssl,  # Enable SSL/TLS
-                ssl_cert_reqs=None,  # Skip certificate validation, or use 'required' for validation
-            )
 
-            # Test Redis connection with simple get/set operations
-            test_key = "connection_test_key"
-            test_value = "connection_test_value"
-
-            # Test set operation
-            set_result = self.redis_client.set(
-                test_key, test_value, ex=60
-            )  # Set with 60 second expiration
-            if not set_result:
-                logger.warning("Redis SET test failed")
-
-            # Test get operation
-            get_result = self.redis_client.get(test_key)
-            if get_result != test_value:
-                logger.warning(
-                    f"Redis GET test failed. Expected '{test_value}', got '{get_result}'"
-                )
-            else:
-                logger.info(
-                    "Redis connection test successful: SET/GET operations working"
-                )
+        verify_ssl = os.getenv("DEV", "false").lower() == "false"
+        logger.info("Redis SSL verification: " + str(verify_ssl))
+        # The client keeps a pool of connections shared by all requests
+        self.redis_client = redis.asyncio.Redis(
+            host=parsed_url.hostname,
+            port=parsed_url.port if parsed_url.port else 6379,
+            db=0,
+            password=parsed_url.password,
+            decode_responses=True,
+            socket_timeout=1.0,  # Add timeout
+            socket_connect_timeout=1.0,  # Add connection timeout
+            ssl=verify_ssl,  # Enable SSL/TLS
+            ssl_cert_reqs=None,  # Skip certificate validation, or use 'required' for validation
+            max_connections=int(os.getenv("RATE_LIMIT_REDIS_MAX_CONNECTIONS", "50")),
+        )
+        self.rate_limit_script = self.redis_client.register_script(RATE_LIMIT_SCRIPT)
 
-            # Clean up test key
-            self.redis_client.delete(test_key)
+        # Users known to be over their limit, rejected without asking Redis
+        self.local_cache_enabled = (
+            os.getenv("RATE_LIMIT_LOCAL_CACHE", "true").lower() == "true"
+        )
+        self.blocked_until: dict[tuple[str, str], tuple[float, dict]] = {}
 
+    async def on_startup(self):
+        print(f"on_startup:{__name__}")
+        if self.type is None:
+            return
+
+        try:
+            await self.redis_client.ping()
             logger.info("Successfully connected to Redis")
-        except redis.exceptions.TimeoutError as e:
-            logger.error(
-                f"Redis timed out when checking simple get set operation: {str(e)}"
-            )
-            raise ConnectionError(f"Initial Redis connection timed out: {str(e)}")
         except Exception as e:
+            # Requests are let through while Redis is unavailable
             logger.error(f"Failed to connect to Redis: {str(e)}")
-            raise ConnectionError(f"Failed to connect to Redis: {str(e)}")
-
-    async def on_startup(self):
-        print(f"on_startup:{__name__}")
-        pass
 
     async def on_shutdown(self):
         print(f"on_shutdown:{__name__}")
-        pass
-
-    def get_global_redis_key(self, model_id: str):
-        """Generate Redis keys for global rate limits."""
-        now = int(time.time())
-        key = f"global:{model_id}:rate:minute:{now // 60}"
-        logger.debug(f"get_global_redis_key: {key}")
-        return key
-
-    def get_user_redis_key(self, user_id: str, model_id: str):
-        """Generate Redis keys for user rate limits."""
-        now = int(time.time())
-        key = f"user:{user_id}:{model_id}:rate:minute:{now // 60}"
-        logger.debug(f"get_user_redis_key: {key}")
-        return key
-
-    def get_user_last_blocked_redis_key(self, user_id: str, model_id: str):
-        """Generate Redis keys for user rate limits."""
-        key = f"user:{user_id}:{model_id}:last_blocked"
-        logger.debug(f"get_user_last_blocked_redis_key: {key}")
-        return key
-
-    def get_rate_limit_info(self, user_id: str, model_id: str):
-        """Get both the current count and remaining TTL for a rate limit key in one request."""
-        user_minute_key = self.get_user_redis_key(user_id, model_id)
-        global_minute_key = self.get_global_redis_key(model_id)
-
-        # Using a pipeline to keep redis traffic down
-        pipe = self.redis_client.pipeline()
-        pipe.get(user_minute_key)
-        pipe.ttl(user_minute_key)
-        pipe.get(global_minute_key)
-        pipe.ttl(global_minute_key)
-        user_count, user_ttl, global_count, global_ttl = pipe.execute()
-
-        user_count = int(user_count or 0)
-        user_key_expires_at = int(time.time()) + user_ttl if user_ttl else None
-        global_count = int(global_count or 0)
-        global_key_expires_at = int(time.time()) + global_ttl if global_ttl else None
-
-        return {
-            "user_count": user_count,
-            "user_key_expires_at": user_key_expires_at,
-            "global_count": global_count,
-            "global_key_expires_at": global_key_expires_at,
-        }
-
-    def set_last_blocked_time(self, user_id: str, model_id: str):
-
-        user_last_blocked_key = self.get_user_last_blocked_redis_key(user_id, model_id)
-
-        rate_limit_info = self.get_rate_limit_info(user_id, model_id)
-        logger.debug(f"Rate limit info: {rate_limit_info}")
-
-        global_current_count = rate_limit_info["global_count"]
-        user_current_count = rate_limit_info["user_count"]
-        user_key_expires_at = rate_limit_info["user_key_expires_at"]
-
-        global_limit = self.request_limits_dict[model_id].get("global_limit", 2000)
-        logger.debug(
-            f"Global model: {model_id}, current count: {global_current_count}/{global_limit}"
-        )
-        safe_free_quota = (global_limit - global_current_count) * 0.25
-        logger.debug(f"safe_free_quota: {safe_free_quota}")
-
-        user_limit = self.request_limits_dict[model_id].get("user_limit", 50)
-        logger.debug(
-            f"User: {user_id}, model: {model_id}, current count:"
-            + f"{user_current_count}/{user_limit}"
-        )
-
-        original_user_limit = user_limit
-        if user_limit < safe_free_quota:
-            user_limit = safe_free_quota
-        logger.debug(f"Adjusted user limit: {user_limit}")
-
-        if user_current_count >= user_limit:
-            logger.warning(
-                f"User {user_id} rate limit exceeded for model {model_id}: "
-                + f"{user_current_count}/{user_limit}"
-            )
-            current_time = int(time.time())
-            self.redis_client.set(user_last_blocked_key, current_time)
-            last_period_start_time = user_key_expires_at - 60
-            return (
-                True,
-                f"You've exceeded your limit of {original_user_limit}"
-                + f" requests since {last_period_start_time}",
-                last_period_start_time,
-            )
-
-        return False, None, None
+        if self.type is None:
+            return
+        await self.redis_client.aclose()
+
+    def get_redis_keys(self, user_id: str, model_id: str, window: int) -> list[str]:
+        """Current and previous window keys for the user and global counters."""
+        return [
+            f"ratelimit:user:{user_id}:{model_id}:{window}",
+            f"ratelimit:user:{user_id}:{model_id}:{window - 1}",
+            f"ratelimit:global:{model_id}:{window}",
+            f"ratelimit:global:{model_id}:{window - 1}",
+        ]
+
+    def get_cached_block(self, user_id: str, model_id: str) -> Optional[dict]:
+        if not self.local_cache_enabled:
+            return None
+
+        entry = self.blocked_until.get((user_id, model_id))
+        if entry is None:
+            return None
+
+        blocked_until, result = entry
+        remaining_time = blocked_until - time.monotonic()
+        if remaining_time <= 0:
+            del self.blocked_until[(user_id, model_id)]
+            return None
+        return {**result, "reset_after": remaining_time}
+
+    def cache_block(self, user_id: str, model_id: str, result: dict):
+        if not self.local_cache_enabled:
+            return
 
-    def is_rate_limited(self, user_id: str, model_id: str) -> bool:
-        logger.debug(f"Checking rate limits for user: {user_id}, model: {model_id}")
+        now = time.monotonic()
+        if len(self.blocked_until) >= LOCAL_CACHE_MAX_SIZE:
+            self.blocked_until = {
+                key: entry
+                for key, entry in self.blocked_until.items()
+                if entry[0] > now
+            }
+        self.blocked_until[(user_id, model_id)] = (now + result["reset_after"], result)
+
+    async def check_rate_limit(self, user_id: str, model_id: str) -> Optional[dict]:
+        """
+        Counts the request against the user and global limits of the model,
+        unless that would exceed either of them, in one atomic Redis call.
+
+        Returns None for models without limits or when Redis is unavailable,
+        otherwise a dict with `allowed`, `scope` ("user" or "global"), `limit`,
+        `remaining` and `reset_after` (seconds).
+        """
         if model_id not in self.models:
             logger.warning(f"Model {model_id} not found in request limits")
-            return False, None
+            return None
 
-        logger.debug(
-            f"Model {model_id} found, checking rate limits for user: {user_id}"
-        )
-        user_last_blocked_key = self.get_user_last_blocked_redis_key(user_id, model_id)
+        cached = self.get_cached_block(user_id, model_id)
+        if cached is not None:
+            return cached
+
+        limits = self.request_limits_dict[model_id]
+        now_ms = int(time.time() * 1000)
+        window_ms = WINDOW_SECONDS * 1000
 
         try:
-            user_last_blocked_time = self.redis_client.get(user_last_blocked_key)
-            logger.debug(f"User {user_id} last blocked time: {user_last_blocked_time}")
-        except redis.exceptions.TimeoutError as e:
-            logger.error(
-                f"Redis operation timed out when checking last blocked time: {str(e)}"
+            allowed, scope, limit, remaining, reset_after_ms = (
+                await self.rate_limit_script(
+                    keys=self.get_redis_keys(user_id, model_id, now_ms // window_ms),
+                    args=[
+                        now_ms,
+                        window_ms,
+                        limits.get("user_limit", 50),
+                        limits.get("global_limit", 2000),
+                        FREE_QUOTA_SHARE,
+                    ],
+                )
             )
-            # Return a default/safe value instead of failing
-            return False, None, None
         except Exception as e:
-            logger.error(f"Redis error when checking last blocked time: {str(e)}")
-            return False, None, None
-
-        if (
-            user_last_blocked_time
-            and int(user_last_blocked_time) > int(time.time()) - 60
-        ):
-            logger.warning(
-                f"User {user_id} was blocked less than 60 seconds ago for model {model_id}"
-            )
-            return self.set_last_blocked_time(user_id, model_id)
-
-        logger.debug(f"Proceeding without blocking user {user_id} for model {model_id}")
-        return False, None, None
-
-    async def log_request(self, user_id: str, model_id: str):
-        logger.debug(f"Logging request for user: {user_id}, model: {model_id}")
-        minute_key = self.get_user_redis_key(user_id, model_id)
-        new_user_count = self.redis_client.incr(minute_key)
-        logger.debug(
-            f"Incremented user request count to {new_user_count} at key {minute_key}"
-        )
-
-        expiry_result = self.redis_client.expire(minute_key, 60, nx=True)
-        logger.debug(f"Set expiry on user key {minute_key}: {expiry_result}")
-
-        # Log global request
-        global_key = self.get_global_redis_key(model_id)
-        new_global_count = self.redis_client.incr(global_key)
-        logger.debug(
-            f"Incremented global request count to {new_global_count} at key {global_key}"
-        )
-
-        expiry_result = self.redis_client.expire(global_key, 60, nx=True)
-        logger.debug(f"Set expiry on global key {global_key}: {expiry_result}")
-        _, _, _ = self.set_last_blocked_time(user_id, model_id)
+            logger.error(f"Redis error when checking rate limits: {str(e)}")
+            return None
+
+        result = {
+            "allowed": bool(allowed),
+            "scope": scope,
+            "limit": int(limit),
+            "remaining": int(remaining),
+            "reset_after": int(reset_after_ms) / 1000,
+        }
+        if not result["allowed"]:
+            self.cache_block(user_id, model_id, result)
+        return result
 
     async def inlet(self, body: dict, user: Optional[dict] = None) -> dict:
 
@@ -319,17 +321,24 @@ class Pipeline:
         logger.debug(
             f"Processing inlet request with User ID: {user_id}, Model ID: {model_id}"
         )
-        limited, msg, last_period_start_time = self.is_rate_limited(user_id, model_id)
-        if limited:
-            logger.error(f"Rate limit check failed with msg: {msg}")
+        result = await self.check_rate_limit(user_id, model_id)
+        if result is None:
+            return body
+
+        headers = get_rate_limit_headers(result)
+        if not result["allowed"]:
+            if result["scope"] == "global":
+                msg = "This model is receiving too many requests right now"
+            else:
+                msg = f"You've exceeded your limit of {result['limit']} requests per minute"
+            logger.warning(
+                f"Rate limit exceeded for user {user_id}, model {model_id}: {msg}"
+            )
             raise RateLimitException(
                 msg,
-                requests_limit=self.request_limits_dict[model_id].get("user_limit", 50),
-                requests_period=60,
-                last_period_start_time=last_period_start_time,
+                requests_limit=result["limit"],
+                requests_period=WINDOW_SECONDS,
+                headers=headers,
             )
 
-        logger.debug("Logging request in bg task...")
-        asyncio.create_task(self.log_request(user_id, model_id))
-
-        return body
+        return JSONResponse(content=body, headers=headers)
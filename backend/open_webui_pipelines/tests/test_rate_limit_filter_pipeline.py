@@ -0,0 +1,190 @@
+import asyncio
+import json
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+# The rate limit script runs on fakeredis' Lua support
+pytest.importorskip("lupa")
+
+from pipelines import rate_limit_filter_pipeline  # noqa: E402
+from utils.pipelines.custom_exceptions import RateLimitException  # noqa: E402
+
+MODEL = "test_model"
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # 10s into a window
+    clock = FakeClock(1_000_000 * 60 + 10)
+    monkeypatch.setattr(rate_limit_filter_pipeline, "time", clock)
+    return clock
+
+
+def create_pipeline(monkeypatch, user_limit: int, global_limit: int):
+    monkeypatch.setenv("REDIS_URL", "redis://localhost:6379")
+    monkeypatch.setenv("DEV", "true")
+    monkeypatch.setenv(
+        "REQUEST_LIMITS",
+        json.dumps({MODEL: {"user_limit": user_limit, "global_limit": global_limit}}),
+    )
+    pipeline = rate_limit_filter_pipeline.Pipeline()
+    pipeline.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    pipeline.rate_limit_script = pipeline.redis_client.register_script(
+        rate_limit_filter_pipeline.RATE_LIMIT_SCRIPT
+    )
+    return pipeline
+
+
+def check(pipeline, user_id: str = "user") -> dict:
+    return asyncio.run(pipeline.check_rate_limit(user_id, MODEL))
+
+
+def test_window_boundary_burst(monkeypatch, clock):
+    """
+    Ensure that a burst at the end of a window still counts after the boundary.
+    """
+    pipeline = create_pipeline(monkeypatch, user_limit=5, global_limit=20)
+
+    clock.now += 49.9
+    assert all(check(pipeline)["allowed"] for _ in range(5))
+    result = check(pipeline)
+    assert not result["allowed"]
+    # Blocked until the burst starts sliding out, right after the boundary
+    assert result["reset_after"] == pytest.approx(0.1)
+
+    # A fixed window would hand out 5 more right after the boundary, the
+    # previous window still counts almost fully
+    clock.now += 0.2
+    assert sum(check(pipeline)["allowed"] for _ in range(5)) == 1
+    result = check(pipeline)
+    assert result["scope"] == "user"
+    # 1 + 5 * (60 - 12) / 60 reaches 5 at 12s into the window
+    assert result["reset_after"] == pytest.approx(11.9)
+
+    clock.now += 11.8
+    assert not check(pipeline)["allowed"]
+    clock.now += 0.2
+    assert check(pipeline)["allowed"]
+
+    # The previous window weighs less as it slides out
+    clock.now += 18
+    assert sum(check(pipeline)["allowed"] for _ in range(5)) == 1
+
+
+def test_block_ends_when_estimate_drops(monkeypatch, clock):
+    """
+    Ensure that users are let through again as soon as the estimate allows,
+    rather than at the end of the window.
+    """
+    pipeline = create_pipeline(monkeypatch, user_limit=10, global_limit=20)
+
+    # 10 in the previous window and 5 in this one, the estimate is 5 + 10 / 2
+    # at 30s in
+    window = int(clock.now * 1000) // 60_000
+    keys = pipeline.get_redis_keys("user", MODEL, window)
+    asyncio.run(pipeline.redis_client.mset({keys[0]: 5, keys[1]: 10}))
+    clock.now += 19
+
+    result = check(pipeline)
+    assert not result["allowed"]
+    assert result["reset_after"] == pytest.approx(1)
+
+    clock.now += 1.1
+    assert check(pipeline)["allowed"]
+
+
+def test_global_limit(monkeypatch, clock):
+    """
+    Ensure that the global limit rejects users still under their own limit.
+    """
+    pipeline = create_pipeline(monkeypatch, user_limit=10, global_limit=4)
+
+    for user_id in ["a", "b", "c", "d"]:
+        assert check(pipeline, user_id)["allowed"]
+
+    result = check(pipeline, "e")
+    assert not result["allowed"]
+    assert result["scope"] == "global"
+    assert result["limit"] == 4
+
+
+def test_free_quota_share(monkeypatch, clock):
+    """
+    Ensure that a user may borrow a share of the unused global quota.
+    """
+    pipeline = create_pipeline(monkeypatch, user_limit=2, global_limit=100)
+
+    # Allowed while the user's count is below a quarter of what's left
+    assert sum(check(pipeline)["allowed"] for _ in range(25)) == 20
+
+    result = check(pipeline, "other")
+    assert result["allowed"]
+    assert result["limit"] == 20
+
+
+def test_headers(monkeypatch, clock):
+    """
+    Ensure that responses and rejections carry the rate limit headers.
+    """
+    pipeline = create_pipeline(monkeypatch, user_limit=2, global_limit=2)
+    body = {"model": MODEL}
+
+    response = asyncio.run(pipeline.inlet(body, {"id": "user"}))
+    assert response.headers["X-RateLimit-Limit"] == "2"
+    assert response.headers["X-RateLimit-Remaining"] == "1"
+    assert response.headers["X-RateLimit-Reset"] == "50"
+    assert "Retry-After" not in response.headers
+
+    asyncio.run(pipeline.inlet(body, {"id": "user"}))
+    with pytest.raises(RateLimitException) as e:
+        asyncio.run(pipeline.inlet(body, {"id": "user"}))
+    assert e.value.requests_limit == 2
+    assert e.value.headers == {
+        "X-RateLimit-Limit": "2",
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset": "50",
+        "Retry-After": "50",
+    }
+
+
+def test_cached_block_expires(monkeypatch, clock):
+    """
+    Ensure that rejected users are rejected locally until the window resets.
+    """
+    pipeline = create_pipeline(monkeypatch, user_limit=1, global_limit=1)
+    assert check(pipeline)["allowed"]
+    assert not check(pipeline)["allowed"]
+
+    calls = 0
+    script = pipeline.rate_limit_script
+
+    async def counting_script(**kwargs):
+        nonlocal calls
+        calls += 1
+        return await script(**kwargs)
+
+    pipeline.rate_limit_script = counting_script
+
+    clock.now += 20
+    result = check(pipeline)
+    assert not result["allowed"]
+    assert result["reset_after"] == pytest.approx(30)
+    assert calls == 0
+
+    # Past the reset the block is dropped and Redis asked again
+    clock.now += 31
+    check(pipeline)
+    assert calls == 1
+    assert ("user", MODEL) not in pipeline.blocked_until
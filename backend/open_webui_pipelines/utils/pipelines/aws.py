@@ -1,4 +1,9 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator
+
 import boto3
 from botocore.credentials import RefreshableCredentials
 from botocore.session import get_session
@@ -10,6 +15,8 @@ load_dotenv()
 
 AWS_DEFAULT_REGION = os.getenv("AWS_DEFAULT_REGION", "us-east-1")
 ROLE_ARN = os.getenv("BEDROCK_ASSUME_ROLE", None)
+# Every open stream holds a worker while it waits for its next event
+BEDROCK_STREAM_WORKERS = int(os.getenv("BEDROCK_STREAM_WORKERS", "256"))
 
 
 def refreshable_session(
@@ -52,3 +59,38 @@ retry_config = Config(
 
 session = refreshable_session(ROLE_ARN)
 bedrock_client = session.client("bedrock-runtime", config=retry_config)
+
+
+bedrock_executor = ThreadPoolExecutor(
+    max_workers=BEDROCK_STREAM_WORKERS, thread_name_prefix="bedrock"
+)
+
+
+async def invoke_model_with_response_stream(
+    body: str, model_id: str, client=bedrock_client
+) -> AsyncIterator[bytes]:
+    """
+    Async version of `invoke_model_with_response_stream` that yields the raw
+    bytes of each chunk, leaving decoding to the caller. boto3 is blocking, so
+    the call and each read from the event stream run on `bedrock_executor`
+    instead of tying up a thread of the server's thread pool for the whole
+    generation.
+    """
+    loop = asyncio.get_running_loop()
+    response = await loop.run_in_executor(
+        bedrock_executor,
+        partial(client.invoke_model_with_response_stream, body=body, modelId=model_id),
+    )
+
+    stream = response["body"]
+    events = iter(stream)
+    try:
+        while True:
+            event = await loop.run_in_executor(bedrock_executor, next, events, None)
+            if event is None:
+                break
+            if "chunk" in event:
+                yield event["chunk"]["bytes"]
+    finally:
+        # Hand the connection back if the client went away mid-stream
+        stream.close()
@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import AsyncIterator, List, Optional, Union
+
+from pydantic import create_model
+
+from utils.pipelines.aws import bedrock_client, invoke_model_with_response_stream
+from utils.pipelines.metrics import StreamMetrics
+
+logger = logging.getLogger("pipelines.bedrock")
+
+GENERIC_ERROR_MESSAGE = "## Oops! 🤖💔\n\n ### GSA Chat is having some trouble.\n\nPlease try another model _or_ wait a minute and try again."  # noqa E501
+RATE_LIMIT_ERROR_MESSAGE = "## Oops! 🤖💔\n\n ### Looks like GSA Chat has hit a service limit.\n\nPlease try another model _or_ wait a minute and try again."  # noqa E501
+
+# Bedrock errors that mean "try again later" rather than "something broke"
+RATE_LIMIT_ERRORS = {"ThrottlingException", "ServiceQuotaExceededException"}
+
+
+####################
+# Request formats
+####################
+
+
+class ClaudeFormat:
+    """Anthropic Messages API on Bedrock."""
+
+    allowed_params = {
+        "anthropic_version",
+        "messages",
+        "temperature",
+        "role",
+        "content",
+        "contentPart",
+        "contentPartImage",
+        "enhancements",
+        "dataSources",
+        "n",
+        "stop",
+        "max_tokens",
+        "presence_penalty",
+        "frequency_penalty",
+        "logit_bias",
+        "function_call",
+        "functions",
+        "tools",
+        "tool_choice",
+        "top_p",
+        "log_probs",
+        "top_logprobs",
+        "response_format",
+        "seed",
+        "system",
+    }
+    defaults = {"anthropic_version": "bedrock-2023-05-31", "max_tokens": 4000}
+    # Only these chunks carry anything we use, the rest aren't decoded
+    chunk_markers = (b"content_block_delta", b"amazon-bedrock-invocationMetrics")
+
+    @staticmethod
+    def convert_content(content):
+        # Claude takes base64 image sources instead of OpenAI's data URLs
+        if not isinstance(content, list) or not any(
+            part.get("type") == "image_url" for part in content
+        ):
+            return content
+
+        converted = []
+        for part in content:
+            if part.get("type") != "image_url":
+                converted.append(part)
+                continue
+
+            url = part["image_url"]["url"]
+            header, _, data = url.partition(",")
+            converted.append(
+                {
+                    "type": "image",
+                    "source": {
+                        "type": "base64",
+                        "media_type": f"image/{header.split(';')[0].split('/')[1]}",
+                        "data": data,
+                    },
+                }
+            )
+        return converted
+
+    def build_request(self, body: dict) -> dict:
+        request = {}
+        for key, value in body.items():
+            if key == "messages":
+                messages = []
+                for message in value:
+                    if message["role"] == "system":
+                        request["system"] = message["content"]
+                    elif message["role"] == "user":
+                        content = self.convert_content(message["content"])
+                        if content is not message["content"]:
+                            message = {**message, "content": content}
+                        messages.append(message)
+                    else:
+                        messages.append(message)
+                request["messages"] = messages
+            elif key in self.allowed_params:
+                request.setdefault(key, value)
+
+        for key, value in self.defaults.items():
+            request.setdefault(key, value)
+        return request
+
+    @staticmethod
+    def get_text(chunk: dict) -> str:
+        if chunk.get("type") == "content_block_delta":
+            return chunk["delta"].get("text", "")
+        return ""
+
+
+class LlamaFormat:
+    """Meta Llama 3 prompt format on Bedrock."""
+
+    allowed_params = {"temperature", "top_p", "max_gen_len"}
+    defaults = {"max_gen_len": 2048}
+    chunk_markers = (b'"generation"', b"amazon-bedrock-invocationMetrics")
+
+    @staticmethod
+    def format_prompt(messages: List[dict]) -> str:
+        parts = ["<|begin_of_text|>"]
+        for message in messages:
+            role = message.get("role", "")
+            content = message.get("content", "")
+            parts.append(
+                f"<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>"
+            )
+        parts.append("<|start_header_id|>assistant<|end_header_id|>")
+        return "".join(parts)
+
+    def build_request(self, body: dict) -> dict:
+        request = {
+            key: value for key, value in body.items() if key in self.allowed_params
+        }
+        for key, value in self.defaults.items():
+            request.setdefault(key, value)
+        request["prompt"] = self.format_prompt(body.get("messages", []))
+        return request
+
+    @staticmethod
+    def get_text(chunk: dict) -> str:
+        return chunk.get("generation") or ""
+
+
+CLAUDE = ClaudeFormat()
+LLAMA = LlamaFormat()
+
+
+####################
+# Streaming
+####################
+
+
+class ChunkEncoder:
+    """
+    Encodes text deltas as complete OpenAI `chat.completion.chunk` server-sent
+    events. Everything but the text is the same for every chunk of a stream,
+    so it is serialized once up front.
+    """
+
+    def __init__(self, model: str):
+        prefix = json.dumps(
+            {
+                "id": f"{model}-{uuid.uuid4()}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+            }
+        )
+        self.prefix = f'data: {prefix[:-1]}, "choices": [{{"index": 0, "delta": {{"content": '.encode()
+        self.suffix = b'}, "logprobs": null, "finish_reason": null}]}\n\n'
+
+    def encode(self, text: str) -> bytes:
+        return self.prefix + json.dumps(text).encode() + self.suffix
+
+
+async def stream_chunks(
+    body: str, model_id: str, format, client=bedrock_client, metrics=None
+) -> AsyncIterator[dict]:
+    """Yields the decoded Bedrock chunks that `format` cares about."""
+    async for raw in invoke_model_with_response_stream(
+        body=body, model_id=model_id, client=client
+    ):
+        if not any(marker in raw for marker in format.chunk_markers):
+            continue
+
+        chunk = json.loads(raw)
+        usage = chunk.get("amazon-bedrock-invocationMetrics")
+        if usage and metrics is not None:
+            metrics.set_usage(
+                input_tokens=usage.get("inputTokenCount"),
+                output_tokens=usage.get("outputTokenCount"),
+            )
+        yield chunk
+
+
+def get_error_message(e: Exception) -> str:
+    response = getattr(e, "response", None)
+    error_code = (
+        response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+    )
+    if error_code in RATE_LIMIT_ERRORS:
+        return RATE_LIMIT_ERROR_MESSAGE
+    return GENERIC_ERROR_MESSAGE
+
+
+class BedrockPipeline:
+    """
+    Base for pipelines that serve one Bedrock model. Subclasses only pass
+    their name, request format and the valve/environment variable holding the
+    model ARN:
+
+        class Pipeline(BedrockPipeline):
+            def __init__(self):
+                super().__init__(
+                    name="Claude Sonnet 3.7",
+                    format=CLAUDE,
+                    arn_valve="BEDROCK_CLAUDE_ARN",
+                    arn_env="BEDROCK_CLAUDE_SONNET_37_ARN",
+                )
+
+    Streaming responses are yielded as ready-made OpenAI SSE events.
+    """
+
+    def __init__(self, name: str, format, arn_valve: str, arn_env: str):
+        self.name = name
+        self.format = format
+        self.arn_valve = arn_valve
+
+        Valves = create_model(
+            "Valves",
+            AWS_REGION=(Optional[str], None),
+            MAX_CONCURRENT_REQUESTS=(Optional[int], None),
+            **{arn_valve: (Optional[str], None)},
+        )
+        self.valves = Valves(
+            **{
+                "AWS_REGION": os.getenv("AWS_REGION", "us-east-1"),
+                arn_valve: os.getenv(arn_env, None),
+            }
+        )
+        self.bedrock_client = bedrock_client
+
+    async def on_startup(self):
+        logger.info(f"on_startup:{self.name}")
+
+    async def on_shutdown(self):
+        logger.info(f"on_shutdown:{self.name}")
+
+    async def pipe(
+        self, user_message: str, model_id: str, messages: List[dict], body: dict
+    ) -> AsyncIterator[Union[str, bytes]]:
+        model_arn = getattr(self.valves, self.arn_valve)
+        encoder = (
+            ChunkEncoder(body.get("model", model_id)) if body.get("stream") else None
+        )
+
+        metrics = StreamMetrics(self.name, model_arn)
+        metrics_status = "incomplete"
+
+        try:
+            request = json.dumps(self.format.build_request(body))
+            async for chunk in stream_chunks(
+                request,
+                model_arn,
+                self.format,
+                client=self.bedrock_client,
+                metrics=metrics,
+            ):
+                text = self.format.get_text(chunk)
+                if not text:
+                    continue
+                metrics.record(text)
+                yield encoder.encode(text) if encoder else text
+            metrics_status = "ok"
+        except Exception as e:
+            logger.error(f"{self.name}: {type(e).__name__}: {e}")
+            metrics_status = "error"
+            message = get_error_message(e)
+            yield encoder.encode(message) if encoder else message
+        finally:
+            metrics.finish(metrics_status)
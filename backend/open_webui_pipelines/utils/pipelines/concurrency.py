@@ -0,0 +1,74 @@
+import asyncio
+from typing import Optional
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class ConcurrencySlot:
+    def __init__(self, semaphore: Optional[asyncio.Semaphore]):
+        self.semaphore = semaphore
+        self.released = False
+
+    def release(self):
+        # Error paths may release a slot that was already released
+        if self.released:
+            return
+        self.released = True
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the number of concurrent requests per pipeline model. The limit is
+    taken from the pipeline's MAX_CONCURRENT_REQUESTS valve if it has one, or
+    `default_limit` otherwise; 0 means unlimited.
+    """
+
+    def __init__(self, default_limit: int, timeout: float):
+        self.default_limit = default_limit
+        self.timeout = timeout
+        self._semaphores: dict[str, tuple[int, asyncio.Semaphore]] = {}
+
+    def get_limit(self, pipeline) -> int:
+        valves = getattr(pipeline, "valves", None)
+        limit = getattr(valves, "MAX_CONCURRENT_REQUESTS", None)
+        return limit if limit is not None else self.default_limit
+
+    def get_semaphore(self, model: str, limit: int) -> asyncio.Semaphore:
+        entry = self._semaphores.get(model)
+        # A changed valve gets a new semaphore; requests holding the old one
+        # release into it as before
+        if entry is None or entry[0] != limit:
+            entry = (limit, asyncio.Semaphore(limit))
+            self._semaphores[model] = entry
+        return entry[1]
+
+    async def acquire(self, model: str, pipeline) -> ConcurrencySlot:
+        """Raises `asyncio.TimeoutError` if no slot frees up in time."""
+        limit = self.get_limit(pipeline)
+        if limit <= 0:
+            return ConcurrencySlot(None)
+
+        semaphore = self.get_semaphore(model, limit)
+        await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        return ConcurrencySlot(semaphore)
+
+
+class SlotStreamingResponse(StreamingResponse):
+    """
+    Streaming response holding a concurrency slot until it is done, however
+    it ends: completed, failed, or cancelled when the client disconnects.
+    """
+
+    def __init__(self, *args, slot: ConcurrencySlot, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # On the event loop; sync generators are iterated in a thread
+            self.slot.release()
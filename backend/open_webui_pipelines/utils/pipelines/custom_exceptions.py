@@ -5,9 +5,12 @@ class RateLimitException(Exception):
         requests_limit=None,
         requests_period=None,
         last_period_start_time=None,
+        headers=None,
     ):
         self.message = message
         self.requests_limit = requests_limit
         self.requests_period = requests_period
         self.last_period_start_time = last_period_start_time
+        # Sent with the 429 response, e.g. X-RateLimit-* and Retry-After
+        self.headers = headers
         super().__init__(message)
@@ -0,0 +1,71 @@
+import json
+import logging
+import time
+from typing import Optional
+
+logger = logging.getLogger("pipelines.metrics")
+
+
+class StreamMetrics:
+    """
+    Timing of one streamed generation: time to first token, total duration
+    and output tokens per second. `finish()` logs them as a single JSON
+    object, so they can be picked up by log-based metrics.
+    """
+
+    def __init__(self, pipeline: str, model_id: Optional[str]):
+        self.pipeline = pipeline
+        self.model_id = model_id
+        self.start_time = time.monotonic()
+        self.first_token_time: Optional[float] = None
+        self.chunks = 0
+        self.input_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+
+    def record(self, text: str):
+        if not text:
+            return
+        if self.first_token_time is None:
+            self.first_token_time = time.monotonic()
+        self.chunks += 1
+
+    def set_usage(
+        self, input_tokens: Optional[int] = None, output_tokens: Optional[int] = None
+    ):
+        if input_tokens is not None:
+            self.input_tokens = input_tokens
+        if output_tokens is not None:
+            self.output_tokens = output_tokens
+
+    def to_dict(self, status: str) -> dict:
+        end_time = time.monotonic()
+        duration = end_time - self.start_time
+
+        ttft = None
+        tokens_per_second = None
+        # Without usage from the model, count streamed chunks
+        output_tokens = (
+            self.output_tokens if self.output_tokens is not None else self.chunks
+        )
+        if self.first_token_time is not None:
+            ttft = self.first_token_time - self.start_time
+            generation_time = end_time - self.first_token_time
+            if generation_time > 0:
+                tokens_per_second = output_tokens / generation_time
+
+        return {
+            "event": "pipeline_stream",
+            "status": status,
+            "pipeline": self.pipeline,
+            "model_id": self.model_id,
+            "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+            "duration_ms": round(duration * 1000, 1),
+            "input_tokens": self.input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_per_second": (
+                round(tokens_per_second, 2) if tokens_per_second is not None else None
+            ),
+        }
+
+    def finish(self, status: str = "ok"):
+        logger.info(json.dumps(self.to_dict(status)))
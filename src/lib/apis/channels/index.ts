@@ -37,13 +37,20 @@ export const deleteChannelById = async (channel_id: string) => {
 	});
 };
 
+// Pass the created_at of the oldest message loaded as `before` to get the next page
 export const getChannelMessages = async (
 	channel_id: string,
 	skip: number = 0,
-	limit: number = 50
+	limit: number = 50,
+	before?: number
 ) => {
+	const searchParams = new URLSearchParams({ skip: `${skip}`, limit: `${limit}` });
+	if (before !== undefined) {
+		searchParams.append('before', `${before}`);
+	}
+
 	return await apiFetch(
-		`${WEBUI_API_BASE_URL}/channels/${channel_id}/messages?skip=${skip}&limit=${limit}`,
+		`${WEBUI_API_BASE_URL}/channels/${channel_id}/messages?${searchParams.toString()}`,
 		{
 			method: 'GET'
 		}
@@ -54,10 +61,16 @@ export const getChannelThreadMessages = async (
 	channel_id: string,
 	message_id: string,
 	skip: number = 0,
-	limit: number = 50
+	limit: number = 50,
+	before?: number
 ) => {
+	const searchParams = new URLSearchParams({ skip: `${skip}`, limit: `${limit}` });
+	if (before !== undefined) {
+		searchParams.append('before', `${before}`);
+	}
+
 	return await apiFetch(
-		`${WEBUI_API_BASE_URL}/channels/${channel_id}/messages/${message_id}/thread?skip=${skip}&limit=${limit}`,
+		`${WEBUI_API_BASE_URL}/channels/${channel_id}/messages/${message_id}/thread?${searchParams.toString()}`,
 		{
 			method: 'GET'
 		}
@@ -64,22 +64,23 @@ export const getAllChats = async () => {
 	return await apiFetch(`${WEBUI_API_BASE_URL}/chats/all`, { method: 'GET' });
 };
 
-export const getChatListBySearchText = async (text: string, page: number = 1) => {
+export const getChatListBySearchText = async (
+	text: string,
+	page: number = 1,
+	cursor: string | null = null
+) => {
 	const searchParams = new URLSearchParams();
 	searchParams.append('text', text);
 	searchParams.append('page', `${page}`);
+	if (cursor) {
+		// Continues after the last result, pages stay stable while chats change
+		searchParams.append('cursor', cursor);
+	}
 
-	const res = await apiFetch<any[]>(
-		`${WEBUI_API_BASE_URL}/chats/search?${searchParams.toString()}`,
-		{
-			method: 'GET'
-		}
-	);
-
-	return res.map((chat) => ({
-		...chat,
-		time_range: getTimeRange(chat.updated_at)
-	}));
+	// Ordered by relevance, so not grouped by time range
+	return await apiFetch<any[]>(`${WEBUI_API_BASE_URL}/chats/search?${searchParams.toString()}`, {
+		method: 'GET'
+	});
 };
 
 export const getChatsByFolderId = async (folderId: string) => {
@@ -205,6 +205,7 @@ type Config = {
 		default_show_changelog: boolean;
 		enable_set_as_default_model: boolean;
 		enable_active_users_count: boolean;
+		enable_channels?: boolean;
 		enable_admin_feedbacks: boolean;
 		enable_more_inputs: boolean;
 		default_show_version_update: boolean;